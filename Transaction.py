@@ -1,23 +1,36 @@
 from datetime import datetime
+from sqlalchemy import BigInteger, Index
 from sqlmodel import Field, SQLModel
 from uuid import UUID, uuid4
 
 class Transaction(SQLModel, table=True):
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    amount: float
+    # amount in the currency's minor units, see Currency.exponent
+    amount_minor: int = Field(sa_type=BigInteger)
     currency: str
     user_id: str
     date: datetime
     deleted: bool = False
+    deleted_at: datetime | None = None
 
     def __eq__(self, other):
         if not isinstance(other, Transaction):
             return False
         return (
             self.id == other.id and
-            self.amount == other.amount and
+            self.amount_minor == other.amount_minor and
             self.currency == other.currency and
             self.user_id == other.user_id and
             self.date == other.date and
             self.deleted == other.deleted
         )
+
+# every read filters out soft-deleted rows, so the indexes only cover live ones
+live = Transaction.deleted == False
+Index("ix_transaction_live_date_id", Transaction.date, Transaction.id, postgresql_where=live, sqlite_where=live)
+Index("ix_transaction_live_user_id", Transaction.user_id, Transaction.date, postgresql_where=live, sqlite_where=live)
+Index("ix_transaction_live_currency", Transaction.currency, postgresql_where=live, sqlite_where=live)
+Index("ix_transaction_live_amount_minor_id", Transaction.amount_minor, Transaction.id, postgresql_where=live, sqlite_where=live)
+# tombstones waiting for compaction, oldest first
+tombstone = Transaction.deleted == True
+Index("ix_transaction_tombstone_deleted_at", Transaction.deleted_at, postgresql_where=tombstone, sqlite_where=tombstone)
@@ -0,0 +1,65 @@
+from collections import defaultdict
+from datetime import date
+from sqlalchemy import BigInteger
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Field, SQLModel, Session
+
+class CurrencyTotal(SQLModel, table=True):
+    __tablename__ = "currency_total"
+
+    currency: str = Field(primary_key=True)
+    amount_minor: int = Field(default=0, sa_type=BigInteger)
+    transaction_count: int = 0
+
+class DailyRollup(SQLModel, table=True):
+    __tablename__ = "daily_rollup"
+
+    day: date = Field(primary_key=True)
+    user_id: str = Field(primary_key=True)
+    currency: str = Field(primary_key=True)
+    total_minor: int = Field(default=0, sa_type=BigInteger)
+    transaction_count: int = 0
+
+def upsert(session: Session, model):
+    if session.bind.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+def apply_transaction_deltas(session: Session, rows: list[dict], sign: int = 1):
+    totals = defaultdict(lambda: [0, 0])
+    daily = defaultdict(lambda: [0, 0])
+    for row in rows:
+        totals[row["currency"]][0] += sign * row["amount_minor"]
+        totals[row["currency"]][1] += sign
+        key = (row["date"].date(), row["user_id"], row["currency"])
+        daily[key][0] += sign * row["amount_minor"]
+        daily[key][1] += sign
+
+    if not totals:
+        return
+    # rows are locked in key order, totals before rollups, so concurrent writers cannot deadlock
+    stmt = upsert(session, CurrencyTotal).values([
+        {"currency": currency, "amount_minor": amount, "transaction_count": count}
+        for currency, (amount, count) in sorted(totals.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CurrencyTotal.currency],
+        set_={
+            "amount_minor": CurrencyTotal.amount_minor + stmt.excluded.amount_minor,
+            "transaction_count": CurrencyTotal.transaction_count + stmt.excluded.transaction_count
+        }
+    )
+    session.exec(stmt)
+
+    stmt = upsert(session, DailyRollup).values([
+        {"day": day, "user_id": user_id, "currency": currency, "total_minor": amount, "transaction_count": count}
+        for (day, user_id, currency), (amount, count) in sorted(daily.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyRollup.day, DailyRollup.user_id, DailyRollup.currency],
+        set_={
+            "total_minor": DailyRollup.total_minor + stmt.excluded.total_minor,
+            "transaction_count": DailyRollup.transaction_count + stmt.excluded.transaction_count
+        }
+    )
+    session.exec(stmt)
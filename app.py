@@ -1,99 +1,362 @@
+import time
+IMPORT_STARTED = time.perf_counter()
 from typing import Union
-from fastapi import FastAPI, HTTPException
-from requests import TransactionRequest, CurrencyRequest
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import os
+from typing import Annotated, Literal
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+from requests import TransactionRequest, CurrencyRequest, DeleteTransactionsRequest
 from collections import defaultdict
 from datetime import date
+from decimal import Decimal
 from operator import itemgetter, attrgetter
-from repository import Repository, Status, GroupBy
-from db_config import start_db_engine
+from repository import Status, GroupBy
+from async_repository import AsyncRepository
+from cache import CachedRepository
+from columnar import ColumnarRepository, QueryEngine, columnar_enabled, sync_seconds
+from currency_registry import refresh_periodically
+from db_config import auto_maintain, auto_migrate, maintenance_tasks, start_async_db_engine, create_async_tables, pool_metrics
 from uuid import UUID
+from sqlalchemy import text
 from enum import Enum
+from streaming import StreamFormat, row_json, streaming_response
+from money import decimal_strings
+from encoding import json_response
+from metrics import Metrics, MetricsMiddleware, TimedJSONResponse, instrument_engine, metrics_enabled, slow_query_seconds
+from write_behind import QueueClosed, QueueFull, WriteBehindQueue, write_behind_enabled
+from bulk_ingest import BATCH_SIZE, MAX_REPORTED_REJECTS, parse_ndjson, parse_csv, parse_csv_header, ingest_batch, iter_lines
 
-app = FastAPI()
+CURRENCY_REFRESH_SECONDS = float(os.environ.get("CURRENCY_REFRESH_SECONDS", 60))
+FX_RATES_FILE = os.environ.get("FX_RATES_FILE")
+AmountSummary = Literal["count", "histogram"]
+# a histogram is built in memory per request, so its size is capped
+MAX_HISTOGRAM_BUCKETS = 1000
+ReportLayout = Literal["nested", "flat"]
+log = logging.getLogger("app")
+
+async def warm_up(app: FastAPI, engine, repository, lifespan_started: float):
+    # runs once the lifespan has yielded, so uvicorn is already accepting connections and /ready answers 503
+    # until the caches, fx rates and columnar store this worker serves from are in place
+    try:
+        async with engine.connect() as connection:
+            await connection.execute(text("select 1"))
+        await repository.refresh_currencies()
+        # serve.py loads the file in its migrate step and leaves FX_RATES_FILE unset for its workers
+        if FX_RATES_FILE:
+            response = await repository.load_fx_rates(FX_RATES_FILE)
+            if response["status"] == Status.FAILURE:
+                raise RuntimeError(response["message"])
+        if columnar_enabled():
+            await repository.loaded.wait()
+    except Exception as e:
+        log.exception("warming up worker %d failed, it stays out of rotation", os.getpid())
+        app.state.warm_up_error = str(e)
+        return
+    ready = time.perf_counter()
+    app.state.startup = {"startup_seconds": round(ready - IMPORT_STARTED, 3), "warm_up_seconds": round(ready - lifespan_started, 3)}
+    app.state.ready = True
+    print(f"worker {os.getpid()} ready in {ready - IMPORT_STARTED:.2f}s ({ready - lifespan_started:.2f}s warming up)")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    app.state.warm_up_error = None
+    lifespan_started = time.perf_counter()
+    engine = start_async_db_engine()
+    if auto_migrate():
+        await create_async_tables(engine)
+    metrics = Metrics() if metrics_enabled() else None
+    instrument_engine(engine.sync_engine, metrics, slow_query_seconds())
+    repository = CachedRepository.from_environment(ColumnarRepository(AsyncRepository(engine, metrics), columnar_enabled()))
+    background_tasks = [asyncio.create_task(refresh_periodically(repository, CURRENCY_REFRESH_SECONDS))]
+    if auto_maintain():
+        background_tasks += maintenance_tasks(engine)
+    if columnar_enabled():
+        background_tasks.append(asyncio.create_task(repository.sync_periodically(sync_seconds())))
+    app.state.repository = repository
+    app.state.metrics = metrics
+    app.state.write_behind = None
+    if write_behind_enabled():
+        app.state.write_behind = WriteBehindQueue.from_environment(repository)
+        app.state.write_behind.start()
+    background_tasks.append(asyncio.create_task(warm_up(app, engine, repository, lifespan_started)))
+    yield
+    app.state.ready = False
+    if app.state.write_behind:
+        await app.state.write_behind.drain()
+    for task in background_tasks:
+        task.cancel()
+    await engine.dispose()
+
+app = FastAPI(lifespan=lifespan, default_response_class=TimedJSONResponse)
+app.add_middleware(MetricsMiddleware)
 transactions: list[TransactionRequest] = []
 transactions_of_currency = defaultdict(float)
 
-repository = Repository(start_db_engine())
+def get_repository(request: Request) -> CachedRepository:
+    return request.app.state.repository
+
+Repo = Annotated[CachedRepository, Depends(get_repository)]
 
 @app.get("/health")
 def check_health():
     return {"health": "OK"}
 
+@app.get("/ready")
+def check_ready(request: Request):
+    # /health answers as soon as the process is up, this only passes once warm_up has finished
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"ready": False, "error": getattr(request.app.state, "warm_up_error", None)})
+    return {"ready": True, "pid": os.getpid(), **request.app.state.startup}
+
+@app.get("/pool")
+async def read_pool_metrics(repository: Repo):
+    return pool_metrics(repository.engine)
+
+@app.get("/cache")
+async def read_cache_metrics(repository: Repo):
+    return repository.cache.stats()
+
+@app.get("/fx")
+async def read_fx_rate_cache_metrics(repository: Repo):
+    return repository.rate_cache.stats()
+
+@app.get("/write-behind")
+async def read_write_behind_metrics(request: Request):
+    queue = request.app.state.write_behind
+    return queue.stats() if queue else {"enabled": False}
+
+@app.get("/metrics")
+async def read_metrics(request: Request, repository: Repo):
+    metrics = request.app.state.metrics
+    if metrics is None:
+        raise HTTPException(status_code=404, detail="metrics are disabled, set METRICS=1 to collect them")
+    return PlainTextResponse(metrics.render(pool_metrics(repository.engine)), media_type="text/plain; version=0.0.4")
+
+@app.get("/columnar")
+async def read_columnar_metrics(repository: Repo):
+    store = repository.store
+    return store.stats() if store else {"enabled": repository.enabled, "loaded": False}
+
 @app.get("/v1/transactions")
-def read_transactions():
-    response = repository.fetch_transactions()
+async def read_transactions(repository: Repo, stream: bool = False, format: StreamFormat = "json"):
+    response = await repository.fetch_transactions(stream=stream, encoded=not stream)
     if response["status"] == Status.FAILURE:
         return {"message": response["message"]}
-    return {"transactions": response["transactions"]}
+    if stream:
+        return streaming_response(response["transactions"], format)
+    return json_response(transactions=response["transactions"])
 
 @app.post("/v1/transaction")
-async def create_transaction(transaction: TransactionRequest):
-    response = repository.create_transactions([transaction])
+async def create_transaction(transaction: TransactionRequest, repository: Repo, request: Request, wait: bool = False):
+    queue = request.app.state.write_behind
+    if queue:
+        # a row the insert would reject is refused now, before it is answered 202 and nobody awaits the outcome
+        response = await repository.validate_transactions([transaction])
+        if response["status"] == Status.FAILURE:
+            raise HTTPException(status_code=503, detail=response["message"], headers={"Retry-After": "1"})
+        if response["rejects"]:
+            raise HTTPException(status_code=409, detail=response["rejects"][0][1])
+        try:
+            committed = queue.submit(transaction)
+        except (QueueFull, QueueClosed) as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        if not wait:
+            return JSONResponse(status_code=202, content={"id": str(transaction.id), "status": "accepted"})
+        response = await committed
+        if response["status"] == Status.FAILURE:
+            raise HTTPException(status_code=409, detail=response["message"])
+        return {"id": transaction.id, "status": "committed", "result": response["result"]}
+
+    response = await repository.create_transactions([transaction])
     if response["status"] == Status.FAILURE:
         raise HTTPException(status_code=409, detail=response["message"])
     return f"transaction {transaction} submitted succesfully"
 
+@app.post("/v1/transactions/bulk")
+async def create_transactions_in_bulk(request: Request, repository: Repo):
+    is_csv = "csv" in request.headers.get("content-type", "")
+    header = None
+    inserted, duplicates, rejected, rejects = 0, 0, 0, []
+
+    async def flush(lines, first_line_no):
+        nonlocal inserted, duplicates, rejected
+        parsed = parse_csv(lines, header, first_line_no) if is_csv else parse_ndjson(lines, first_line_no)
+        batch_inserted, batch_duplicates, batch_rejects = await ingest_batch(repository, await run_in_threadpool(list, parsed))
+        inserted += batch_inserted
+        duplicates += batch_duplicates
+        rejected += len(batch_rejects)
+        rejects.extend(batch_rejects[:MAX_REPORTED_REJECTS - len(rejects)])
+
+    lines, first_line_no, line_no = [], 1, 0
+    async for line in iter_lines(request.stream()):
+        line_no += 1
+        if is_csv and header is None:
+            try:
+                header = parse_csv_header(line)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            first_line_no = line_no + 1
+            continue
+        lines.append(line)
+        if len(lines) >= BATCH_SIZE:
+            await flush(lines, first_line_no)
+            lines, first_line_no = [], line_no + 1
+    if lines:
+        await flush(lines, first_line_no)
+
+    return {"inserted": inserted, "duplicates": duplicates, "rejected": rejected, "rejects": rejects}
+
 @app.post("/v1/currency")
-async def create_currency(currency: CurrencyRequest):
-    response = repository.register_currency(currency)
+async def create_currency(currency: CurrencyRequest, repository: Repo):
+    response = await repository.register_currency(currency)
     if response["status"] == Status.FAILURE:
         raise HTTPException(status_code=409, detail=response["message"])
     return response["message"]
 
 @app.get("/v1/total/{currency}")
-async def get_total_amount_of(currency: str):
-    response = repository.fetch_total_by_currency(currency)
+async def get_total_amount_of(currency: str, repository: Repo, engine: QueryEngine = "sql"):
+    response = await repository.fetch_total_by_currency(currency, engine=engine)
     if response["status"] == Status.FAILURE:
-        raise HTTPException(status_code=400, detail=f"{response.message}")
-    return {"amount": response["amount"]}
+        raise HTTPException(status_code=400, detail=f'{response["message"]}')
+    return {"amount": decimal_strings(response["amount"])}
+
+@app.get("/v1/total")
+async def get_converted_total(currency: str, repository: Repo):
+    response = await repository.fetch_converted_total(currency)
+    if response["status"] == Status.FAILURE:
+        raise HTTPException(status_code=400, detail=response["message"])
+    return {"amount": decimal_strings(response["amount"]), "currency": currency}
 
 @app.get("/v1/transactions/{date_str}")
-async def get_transactions_by_date(date_str: str):
-    response = repository.fetch_transactions_by_date(date_str)
+async def get_transactions_by_date(date_str: str, repository: Repo, stream: bool = False, format: StreamFormat = "json"):
+    response = await repository.fetch_transactions_by_date(date_str, stream=stream, encoded=not stream)
     if response["status"] == Status.FAILURE:
         raise HTTPException(status_code=400, detail=f'{response["message"]}')
-    return {"transactions": response["transactions"]}
+    if stream:
+        return streaming_response(response["transactions"], format)
+    return json_response(transactions=response["transactions"])
 
 @app.get("/v1/amount")
-async def get_transactions_within_range(start: float, end: float):
-    response = repository.fetch_transactions_within_amount_range(start, end)
+async def get_transactions_within_range(
+    start: Decimal,
+    end: Decimal,
+    repository: Repo,
+    stream: bool = False,
+    format: StreamFormat = "json",
+    engine: QueryEngine = "sql",
+    limit: int | None = None,
+    cursor: str | None = None,
+    summary: AmountSummary | None = None,
+    buckets: int = Query(10, ge=1, le=MAX_HISTOGRAM_BUCKETS)
+):
+    if summary:
+        response = await repository.summarize_amount_range(start, end, buckets if summary == "histogram" else None, engine=engine)
+        if response["status"] == Status.FAILURE:
+            raise HTTPException(status_code=400, detail=response["message"])
+        response.pop("status")
+        return decimal_strings(response)
+
+    if limit is not None or cursor:
+        if engine != "sql":
+            raise HTTPException(status_code=400, detail="paging through an amount range is only served by the sql engine")
+        response = await repository.paginated_transactions_by_amount(start, end, cursor, limit or 10, encoded=True)
+        if response["status"] == Status.FAILURE:
+            raise HTTPException(status_code=400, detail=response["message"])
+        return json_response(transactions=response["transactions"], next_cursor=response["next_cursor"])
+
+    response = await repository.fetch_transactions_within_amount_range(start, end, stream=stream, engine=engine, encoded=not stream)
     if response["status"] == Status.FAILURE:
         raise HTTPException(status_code=400, detail=response["message"])          
-    return {"transactions": response["transactions"]}
+    if stream:
+        return streaming_response(response["transactions"], format)
+    return json_response(transactions=response["transactions"])
 
 @app.get("/v1/paginated")
-async def get_paginated_transactions(offset: int = 0, limit: int = 10):
-    response = repository.paginated_transactions(offset, limit)
+async def get_paginated_transactions(repository: Repo, offset: int = 0, limit: int = 10, cursor: str | None = None, mode: str = "offset"):
+    if cursor or mode == "cursor":
+        response = await repository.paginated_transactions_by_cursor(cursor, limit, encoded=True)
+        if response["status"] == Status.FAILURE:
+            raise HTTPException(status_code=400, detail=response["message"])
+        return json_response(transactions=response["transactions"], next_cursor=response["next_cursor"])
+
+    response = await repository.paginated_transactions(offset, limit, encoded=True)
     if response["status"] == Status.FAILURE:
         raise HTTPException(status_code=400, detail=response["message"])
-    return {"transactions": response["transactions"]}
+    return json_response(transactions=response["transactions"])
 
 @app.get("/v1/user/{user_id}")
-async def get_transactions_by_user(user_id: str):
-    response = repository.fetch_transactions_by_user_id(user_id)
+async def get_transactions_by_user(user_id: str, repository: Repo, stream: bool = False, format: StreamFormat = "json"):
+    response = await repository.fetch_transactions_by_user_id(user_id, stream=stream, encoded=not stream)
     if response["status"] == Status.FAILURE:
         raise HTTPException(status_code=400, detail=response["message"])
-    return {"transactions": response["transactions"]} 
+    if stream:
+        return streaming_response(response["transactions"], format)
+    return json_response(transactions=response["transactions"])
 
 @app.put("/v1/delete/{transaction_id}")
-async def delete_transaction(transaction_id: UUID):
-    response = repository.delete_transaction(transaction_id)
+async def delete_transaction(transaction_id: UUID, repository: Repo):
+    response = await repository.delete_transaction(transaction_id)
     if response["status"] == Status.FAILURE:
         raise HTTPException(status_code=400, detail=response["message"])
     return response["result"]
 
+@app.delete("/v1/transactions/{transaction_id}")
+async def delete_one_transaction(transaction_id: UUID, repository: Repo):
+    return await delete_transaction(transaction_id, repository)
+
+@app.post("/v1/transactions/delete")
+async def delete_transactions(request: DeleteTransactionsRequest, repository: Repo):
+    if request.ids is None and request.user_id is None and request.from_date is None and request.to_date is None:
+        raise HTTPException(status_code=400, detail="give ids, a user_id or a from_date/to_date range to delete")
+    response = await repository.delete_transactions(request.ids, request.user_id, request.from_date, request.to_date)
+    if response["status"] == Status.FAILURE:
+        raise HTTPException(status_code=400, detail=response["message"])
+    return {"deleted": len(response["deleted"])}
+
 @app.get("/v1/report")
-async def read_report(from_date: str|None, to_date: str|None, group_by: str):
+async def read_report(
+    from_date: str|None,
+    to_date: str|None,
+    group_by: str,
+    repository: Repo,
+    currency: str | None = None,
+    engine: QueryEngine = "sql",
+    top: str | None = None,
+    min_total: Decimal | None = None,
+    layout: ReportLayout = "nested",
+    format: StreamFormat = "json",
+    rolling_days: int | None = None
+):
     group_by = group_by.upper()
     groups = group_by.split(sep=",")
 
     for group in groups:
-        if group not in [GroupBy.CURRENCY.name, GroupBy.DAY.name, GroupBy.USER.name]:
-            raise HTTPException(status_code=400, detail=f"the query group_by {group_by} is not valid. it should be either user, currency or day")
-    
-    response = repository.get_report(from_date, to_date, groups)
+        if group not in GroupBy.__members__:
+            raise HTTPException(status_code=400, detail=f"the query group_by {group_by} is not valid. it should be either user, currency, hour, day, week or month")
+    limits = parse_top(top, groups)
+    if rolling_days is not None and not 1 < rolling_days <= 366:
+        raise HTTPException(status_code=400, detail=f"rolling_days {rolling_days} should be between 2 and 366")
+
+    response = await repository.get_report(from_date, to_date, groups, currency, limits, min_total, rolling_days, stream=layout == "flat", engine=engine)
     if response["status"] == Status.FAILURE:
         raise HTTPException(status_code=400, detail=response["message"])
-    return  response["results"]
-    
+    if layout == "flat":
+        return streaming_response(response["results"], format, key="results", encode=row_json)
+    return decimal_strings(response["results"])
 
+def parse_top(top: str | None, groups: list[str]):
+    # one limit per group_by level, "5,100" keeps the top 5 of the first level and the top 100 under each of those
+    if not top:
+        return None
+    try:
+        limits = [int(limit) if limit.strip() else None for limit in top.split(",")]
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"top {top} should be comma separated counts, one per group_by level")
+    if len(limits) > len(groups) or any(limit is not None and limit < 1 for limit in limits):
+        raise HTTPException(status_code=400, detail=f"top {top} should hold at most one positive count per group_by level")
+    return limits
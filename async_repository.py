@@ -0,0 +1,109 @@
+from functools import partial
+from itertools import islice
+from datetime import date
+from decimal import Decimal
+from uuid import UUID
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.util import greenlet_spawn
+from currency_config import Currency
+from metrics import Metrics
+from repository import Repository, Status, STREAM_CHUNK_SIZE
+
+class AsyncRepository:
+    # runs the Repository queries through the async engine's greenlet bridge,
+    # so every round trip awaits the async driver instead of blocking the loop
+    def __init__(self, engine: AsyncEngine, metrics: Metrics | None = None):
+        self.engine = engine
+        self.metrics = metrics
+        self.repository = Repository(engine.sync_engine)
+        self.currency_registry = self.repository.currency_registry
+        self.rate_cache = self.repository.rate_cache
+
+    async def _run(self, method, *args, **kwargs):
+        if self.metrics is None:
+            return await greenlet_spawn(method, *args, **kwargs)
+        return await greenlet_spawn(self.metrics.observe, method.__name__, method, *args, **kwargs)
+
+    async def _stream(self, response, operation: str, key: str = "transactions"):
+        if response["status"] == Status.FAILURE:
+            return response
+        return {"status": Status.SUCCESS, key: self._iterate(response[key], operation)}
+
+    async def _iterate(self, rows, operation: str):
+        def next_chunk():
+            return list(islice(rows, STREAM_CHUNK_SIZE))
+        fetch = next_chunk if self.metrics is None else partial(self.metrics.observe_rows, operation, next_chunk)
+        try:
+            while chunk := await greenlet_spawn(fetch):
+                for row in chunk:
+                    yield row
+        finally:
+            await greenlet_spawn(rows.close)
+
+    async def create_transactions(self, transactions: list[any]):
+        return await self._run(self.repository.create_transactions, transactions)
+
+    async def bulk_create_transactions(self, transactions: list[any]):
+        return await self._run(self.repository.bulk_create_transactions, transactions)
+
+    async def validate_transactions(self, transactions: list[any]):
+        return await self._run(self.repository.validate_transactions, transactions)
+
+    async def register_currency(self, currency: Currency):
+        return await self._run(self.repository.register_currency, currency)
+
+    async def refresh_currencies(self):
+        return await self._run(self.repository.refresh_currencies)
+
+    async def fetch_transactions(self, stream: bool = False, encoded: bool = False):
+        response = await self._run(self.repository.fetch_transactions, stream=stream, encoded=encoded)
+        return await self._stream(response, "fetch_transactions") if stream else response
+
+    async def fetch_total_by_currency(self, currency):
+        return await self._run(self.repository.fetch_total_by_currency, currency)
+
+    async def fetch_converted_total(self, currency: str):
+        return await self._run(self.repository.fetch_converted_total, currency)
+
+    async def load_fx_rates(self, path: str):
+        return await self._run(self.repository.load_fx_rates, path)
+
+    async def reconcile_currency_totals(self):
+        return await self._run(self.repository.reconcile_currency_totals)
+
+    async def fetch_transactions_by_date(self, date_str: str, stream: bool = False, encoded: bool = False):
+        response = await self._run(self.repository.fetch_transactions_by_date, date_str, stream=stream, encoded=encoded)
+        return await self._stream(response, "fetch_transactions_by_date") if stream else response
+
+    async def fetch_transactions_within_amount_range(self, start: Decimal, end: Decimal, stream: bool = False, encoded: bool = False):
+        response = await self._run(self.repository.fetch_transactions_within_amount_range, start, end, stream=stream, encoded=encoded)
+        return await self._stream(response, "fetch_transactions_within_amount_range") if stream else response
+
+    async def paginated_transactions_by_amount(self, start: Decimal, end: Decimal, cursor: str | None, limit: int, encoded: bool = False):
+        return await self._run(self.repository.paginated_transactions_by_amount, start, end, cursor, limit, encoded)
+
+    async def summarize_amount_range(self, start: Decimal, end: Decimal, buckets: int | None = None):
+        return await self._run(self.repository.summarize_amount_range, start, end, buckets)
+
+    async def paginated_transactions(self, offset: int, limit: int, encoded: bool = False):
+        return await self._run(self.repository.paginated_transactions, offset, limit, encoded)
+
+    async def paginated_transactions_by_cursor(self, cursor: str | None, limit: int, encoded: bool = False):
+        return await self._run(self.repository.paginated_transactions_by_cursor, cursor, limit, encoded)
+
+    async def fetch_transactions_by_user_id(self, user_id: str, stream: bool = False, encoded: bool = False):
+        response = await self._run(self.repository.fetch_transactions_by_user_id, user_id, stream=stream, encoded=encoded)
+        return await self._stream(response, "fetch_transactions_by_user_id") if stream else response
+
+    async def delete_transaction(self, transaction_id: UUID):
+        return await self._run(self.repository.delete_transaction, transaction_id)
+
+    async def delete_transactions(self, ids: list[UUID] | None = None, user_id: str | None = None, from_date: date | None = None, to_date: date | None = None):
+        return await self._run(self.repository.delete_transactions, ids, user_id, from_date, to_date)
+
+    async def get_report(self, from_date=None, to_date=None, groups: list[str]=[], currency: str | None = None, top: list[int | None] | None = None, min_total: Decimal | None = None, rolling_days: int | None = None, stream: bool = False):
+        response = await self._run(self.repository.get_report, from_date, to_date, groups, currency, top, min_total, rolling_days, stream)
+        return await self._stream(response, "get_report", "results") if stream else response
+
+    async def rebuild_daily_rollup(self):
+        return await self._run(self.repository.rebuild_daily_rollup)
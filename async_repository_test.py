@@ -0,0 +1,62 @@
+from datetime import datetime
+from unittest import IsolatedAsyncioTestCase
+from uuid import uuid4
+from sqlmodel import Session, delete
+from aggregates import CurrencyTotal, DailyRollup
+from async_repository import AsyncRepository
+from currency_config import Currency
+from db_config import start_async_db_engine, create_async_tables
+from repository import Status
+from requests import TransactionRequest
+from Transaction import Transaction
+
+class TestAsyncRepository(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        engine = start_async_db_engine()
+        await create_async_tables(engine)
+        self.repository = AsyncRepository(engine)
+        await self.repository.register_currency(Currency(currency="TEST1", country="United Kingdom"))
+
+    async def asyncTearDown(self):
+        def clean(sync_session: Session):
+            sync_session.exec(delete(Transaction))
+            sync_session.exec(delete(Currency))
+            sync_session.exec(delete(CurrencyTotal))
+            sync_session.exec(delete(DailyRollup))
+            sync_session.commit()
+        await self.repository._run(clean, Session(self.repository.engine.sync_engine))
+        await self.repository.engine.dispose()
+
+    async def test_create_and_fetch_transactions(self):
+        tx = TransactionRequest(id=uuid4(), amount=20.0, currency="TEST1", user_id="123", date=datetime(2025, 5, 5, 9, 0))
+        res = await self.repository.create_transactions([tx])
+        self.assertEqual(res["status"], Status.SUCCESS)
+
+        fetch_res = await self.repository.fetch_transactions_by_user_id("123")
+        self.assertEqual(fetch_res["status"], Status.SUCCESS)
+        self.assertEqual([t.id for t in fetch_res["transactions"]], [tx.id])
+
+        total_res = await self.repository.fetch_total_by_currency("TEST1")
+        self.assertEqual(20.0, float(total_res["amount"]))
+
+    async def test_bulk_create_and_stream_transactions(self):
+        transactions = [
+            TransactionRequest(id=uuid4(), amount=float(i), currency="TEST1", user_id="123", date=datetime(2025, 5, 5, 9, 0))
+            for i in range(10)
+        ]
+        res = await self.repository.bulk_create_transactions(transactions)
+        self.assertEqual(res["status"], Status.SUCCESS)
+        self.assertEqual(res["inserted"], 10)
+
+        stream_res = await self.repository.fetch_transactions(stream=True)
+        self.assertEqual(stream_res["status"], Status.SUCCESS)
+        streamed = [transaction async for transaction in stream_res["transactions"]]
+        self.assertCountEqual([t.id for t in streamed], [t.id for t in transactions])
+
+    async def test_get_report(self):
+        tx = TransactionRequest(amount=3.0, currency="TEST1", user_id="123", date=datetime(2025, 5, 5, 9, 0))
+        await self.repository.create_transactions([tx])
+
+        report_res = await self.repository.get_report(groups=["CURRENCY"])
+        self.assertEqual(report_res["status"], Status.SUCCESS)
+        self.assertDictEqual(report_res["results"], {"TEST1": 3.0})
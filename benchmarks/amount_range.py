@@ -0,0 +1,73 @@
+import argparse
+import random
+import statistics
+import time
+from decimal import Decimal
+from benchmarks.seed import seed
+from db_config import start_db_engine
+from repository import Repository
+
+def percentiles(timings: list[float]):
+    cuts = statistics.quantiles(timings, n=100, method="inclusive")
+    return cuts[49], cuts[94], cuts[98]
+
+def measure(fn, ranges):
+    timings = []
+    for start, end in ranges:
+        started = time.perf_counter()
+        fn(start, end)
+        timings.append((time.perf_counter() - started) * 1000)
+    return percentiles(timings)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure amount range query latency over the (amount, id) index.")
+    parser.add_argument("--db-url", default=None)
+    parser.add_argument("--seed-rows", type=int, default=0, help="rows to insert before measuring, e.g. 50000000")
+    parser.add_argument("--queries", type=int, default=200, help="random ranges per query shape")
+    parser.add_argument("--widths", type=float, nargs="+", default=[1.0, 10.0, 100.0])
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--buckets", type=int, default=20)
+    parser.add_argument("--target-p99-ms", type=float, default=50.0)
+    args = parser.parse_args(argv)
+
+    repository = Repository(start_db_engine(args.db_url))
+    if args.seed_rows:
+        seed(repository, args.seed_rows)
+
+    def first_page(start, end):
+        return repository.paginated_transactions_by_amount(start, end, None, args.limit)
+
+    def second_page(start, end):
+        page = first_page(start, end)
+        if page["next_cursor"]:
+            started = time.perf_counter()
+            repository.paginated_transactions_by_amount(start, end, page["next_cursor"], args.limit)
+            return time.perf_counter() - started
+
+    shapes = {
+        "first page": first_page,
+        "count": lambda start, end: repository.summarize_amount_range(start, end),
+        "histogram": lambda start, end: repository.summarize_amount_range(start, end, args.buckets)
+    }
+
+    rng = random.Random(0)
+    failed = False
+    print(f"{'query':<24} {'width':>8} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for width in args.widths:
+        ranges = [(start, start + Decimal(str(width))) for start in (Decimal(str(round(rng.uniform(1, 10000 - width), 2))) for _ in range(args.queries))]
+        for name, fn in shapes.items():
+            p50, p95, p99 = measure(fn, ranges)
+            failed |= p99 > args.target_p99_ms
+            print(f"{name:<24} {width:>8g} {p50:>10.2f} {p95:>10.2f} {p99:>10.2f}")
+
+        cursor_timings = [elapsed * 1000 for elapsed in (second_page(start, end) for start, end in ranges) if elapsed is not None]
+        if len(cursor_timings) > 1:
+            p50, p95, p99 = percentiles(cursor_timings)
+            failed |= p99 > args.target_p99_ms
+            print(f"{'next page':<24} {width:>8g} {p50:>10.2f} {p95:>10.2f} {p99:>10.2f}")
+
+    print(f"p99 target {args.target_p99_ms:g} ms: {'missed' if failed else 'met'}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,56 @@
+import argparse
+import time
+from decimal import Decimal
+from benchmarks.pagination import time_call
+from benchmarks.seed import seed
+from columnar_store import ColumnarStore
+from db_config import start_db_engine
+from repository import Repository
+
+GROUPINGS = [["CURRENCY"], ["USER"], ["DAY"], ["USER", "CURRENCY"], ["DAY", "CURRENCY", "USER"]]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the SQL and columnar analytics engines.")
+    parser.add_argument("--db-url", default=None)
+    parser.add_argument("--seed-rows", type=int, default=0, help="rows to insert before measuring, e.g. 10000000")
+    parser.add_argument("--from-date", default="2024-03-01")
+    parser.add_argument("--to-date", default="2024-09-30")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--fx-rates", default=None, help="csv of daily rates, times reports converted to --fx-target")
+    parser.add_argument("--fx-target", default="BENCH1")
+    args = parser.parse_args(argv)
+
+    repository = Repository(start_db_engine(args.db_url))
+    if args.seed_rows:
+        seed(repository, args.seed_rows)
+
+    started = time.perf_counter()
+    store = ColumnarStore.load(repository.engine)
+    stats = store.stats()
+    print(f"loaded {stats['rows']} rows into {stats['bytes'] / 2**20:.1f} MiB of columns in {time.perf_counter() - started:.2f}s")
+
+    print(f"{'query':<32} {'sql ms':>12} {'columnar ms':>12}")
+    for groups in GROUPINGS:
+        for label, from_date, to_date in (("all", None, None), ("range", args.from_date, args.to_date)):
+            sql_ms = time_call(lambda: repository.get_report(from_date, to_date, groups), args.repeat)
+            columnar_ms = time_call(lambda: store.report(from_date, to_date, groups), args.repeat)
+            print(f"{'report ' + ','.join(groups) + ' ' + label:<32} {sql_ms:>12.2f} {columnar_ms:>12.2f}")
+
+    if args.fx_rates:
+        repository.load_fx_rates(args.fx_rates)
+        for groups in GROUPINGS:
+            sql_ms = time_call(lambda: repository.get_report(None, None, groups, args.fx_target), args.repeat)
+            print(f"{'report ' + ','.join(groups) + ' in ' + args.fx_target:<32} {sql_ms:>12.2f} {'-':>12}")
+        sql_ms = time_call(lambda: repository.fetch_converted_total(args.fx_target), args.repeat)
+        print(f"{'total in ' + args.fx_target:<32} {sql_ms:>12.2f} {'-':>12}")
+
+    sql_ms = time_call(lambda: repository.fetch_transactions_within_amount_range(Decimal(100), Decimal(110)), args.repeat)
+    columnar_ms = time_call(lambda: store.fetch_transactions_within_amount_range(Decimal(100), Decimal(110)), args.repeat)
+    print(f"{'amount 100-110':<32} {sql_ms:>12.2f} {columnar_ms:>12.2f}")
+
+    sql_ms = time_call(lambda: repository.fetch_total_by_currency("BENCH1"), args.repeat)
+    columnar_ms = time_call(lambda: store.fetch_total_by_currency("BENCH1"), args.repeat)
+    print(f"{'total BENCH1':<32} {sql_ms:>12.2f} {columnar_ms:>12.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import argparse
+import asyncio
+import time
+import httpx
+
+async def run_clients(client: httpx.AsyncClient, path: str, concurrency: int, requests: int):
+    remaining = requests
+    failures = 0
+
+    async def worker():
+        nonlocal remaining, failures
+        while remaining > 0:
+            remaining -= 1
+            response = await client.get(path)
+            if response.status_code >= 400:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - started), failures
+
+async def run(args):
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        print(f"{args.label}: {args.requests} requests per run")
+        print(f"{'path':<32} {'clients':>8} {'req/s':>10} {'errors':>8}")
+        for path in args.paths:
+            for concurrency in args.concurrency:
+                rate, failures = await run_clients(client, path, concurrency, args.requests)
+                print(f"{path:<32} {concurrency:>8} {rate:>10.1f} {failures:>8}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure requests/sec of a running server at several client concurrencies. "
+                                                 "Run it against a server started before and after a change to compare them.")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 128])
+    parser.add_argument("--paths", nargs="+", default=["/v1/user/1", "/v1/total/BENCH1", "/v1/paginated?limit=10"])
+    asyncio.run(run(parser.parse_args(argv)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import random
+import time
+from benchmarks.seed import generate_transactions, seed
+from db_config import start_db_engine
+from repository import Repository
+
+def ingest(repository: Repository, batches):
+    started = time.perf_counter()
+    inserted = duplicates = 0
+    for batch in batches:
+        response = repository.bulk_create_transactions(batch)
+        inserted += response["inserted"]
+        duplicates += response["duplicates"]
+    elapsed = time.perf_counter() - started
+    return inserted, duplicates, elapsed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure bulk ingest throughput when batches are retried with known ids.")
+    parser.add_argument("--db-url", default=None)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--duplicate-ratios", type=float, nargs="+", default=[0.0, 0.5, 0.9, 1.0])
+    args = parser.parse_args(argv)
+
+    repository = Repository(start_db_engine(args.db_url))
+    seed(repository, 0)
+    stored = list(generate_transactions(args.rows, seed=1))
+    ingest(repository, [stored[i:i + args.batch_size] for i in range(0, len(stored), args.batch_size)])
+
+    rng = random.Random(0)
+    print(f"{'duplicates':>10} {'inserted':>10} {'skipped':>10} {'rows/sec':>12}")
+    for number, ratio in enumerate(args.duplicate_ratios, start=2):
+        # every batch mixes retried rows that are already stored with new ones
+        duplicated = int(args.batch_size * ratio)
+        fresh = generate_transactions(args.rows, seed=number)
+        batches = []
+        for _ in range(max(args.rows // args.batch_size, 1)):
+            batch = rng.sample(stored, duplicated) + [next(fresh) for _ in range(args.batch_size - duplicated)]
+            rng.shuffle(batch)
+            batches.append(batch)
+        inserted, duplicates, elapsed = ingest(repository, batches)
+        print(f"{ratio:>10.0%} {inserted:>10} {duplicates:>10} {(inserted + duplicates) / elapsed:>12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import httpx
+from benchmarks.seed import seed
+
+# what /metrics costs: the same requests in-process with METRICS off, on, and on with the slow query log armed
+MODES = {
+    "off": {},
+    "metrics": {"METRICS": "1"},
+    "metrics+slow log": {"METRICS": "1", "SLOW_QUERY_MS": "1000"}
+}
+PATHS = ["/health", "/v1/total/BENCH1", "/v1/user/1", "/v1/paginated?limit=100"]
+
+async def run_round(app, requests: int):
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+            started = time.perf_counter()
+            for i in range(requests):
+                response = await client.get(PATHS[i % len(PATHS)])
+                response.raise_for_status()
+            return (time.perf_counter() - started) / requests
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the per-request overhead of the metrics middleware and SQL hooks.")
+    parser.add_argument("--db-url", default=None)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    os.environ["DATABASE_URL"] = args.db_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='benchmark-'), 'benchmark.db')}"
+    from db_config import start_db_engine
+    from repository import Repository
+    seed(Repository(start_db_engine()), args.rows, users=100)
+
+    import app
+    timings = {mode: [] for mode in MODES}
+    # modes alternate within every round so drift in the machine affects them alike
+    for _ in range(args.rounds):
+        for mode, environment in MODES.items():
+            for key in ("METRICS", "SLOW_QUERY_MS"):
+                os.environ.pop(key, None)
+            os.environ.update(environment)
+            timings[mode].append(asyncio.run(run_round(app.app, args.requests)))
+
+    baseline = statistics.median(timings["off"])
+    print(f"{'mode':<18} {'us/request':>12} {'overhead':>10}")
+    for mode, values in timings.items():
+        median = statistics.median(values)
+        print(f"{mode:<18} {median * 1e6:>12.1f} {(median / baseline - 1) * 100:>9.1f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import argparse
+import statistics
+import time
+from sqlmodel import Session, select
+from Transaction import Transaction
+from benchmarks.seed import seed
+from db_config import start_db_engine
+from pagination import encode_cursor
+from repository import Repository
+
+def time_call(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def cursor_at(repository: Repository, offset: int):
+    if offset == 0:
+        return None
+    with Session(repository.engine) as session:
+        stmt = select(Transaction.date, Transaction.id)\
+                .where(Transaction.deleted == False)\
+                .order_by(Transaction.date, Transaction.id)\
+                .offset(offset - 1)\
+                .limit(1)
+        last_date, last_id = session.exec(stmt).one()
+    return encode_cursor([last_date.isoformat(), str(last_id)])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare OFFSET and keyset pagination latency.")
+    parser.add_argument("--db-url", default=None)
+    parser.add_argument("--seed-rows", type=int, default=0, help="rows to insert before measuring")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    repository = Repository(start_db_engine(args.db_url))
+    if args.seed_rows:
+        seed(repository, args.seed_rows)
+
+    print(f"{'page':>8} {'offset ms':>12} {'cursor ms':>12}")
+    for page in args.pages:
+        offset = (page - 1) * args.limit
+        cursor = cursor_at(repository, offset)
+        offset_ms = time_call(lambda: repository.paginated_transactions(offset, args.limit), args.repeat)
+        cursor_ms = time_call(lambda: repository.paginated_transactions_by_cursor(cursor, args.limit), args.repeat)
+        print(f"{page:>8} {offset_ms:>12.2f} {cursor_ms:>12.2f}")
+
+if __name__ == "__main__":
+    main()
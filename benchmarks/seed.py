@@ -0,0 +1,51 @@
+import csv
+import random
+from datetime import date, datetime, timedelta
+from uuid import UUID
+from currency_config import Currency
+from requests import TransactionRequest
+
+START = datetime(2024, 1, 1)
+
+def pick_user(rng: random.Random, users: int, skew: float):
+    if not skew:
+        return rng.randrange(users)
+    # a power law over the user ids, the larger the skew the more rows land on the first few users
+    return min(int(users * rng.random() ** (1 + skew)), users - 1)
+
+def generate_transactions(rows: int, users: int = 1000, currencies: list[str] = ["BENCH1", "BENCH2"], days: int = 365, seed: int = 0, skew: float = 0.0):
+    rng = random.Random(seed)
+    for _ in range(rows):
+        yield TransactionRequest(
+            id=UUID(int=rng.getrandbits(128), version=4),
+            amount=round(rng.uniform(1, 10000), 2),
+            currency=rng.choice(currencies),
+            user_id=str(pick_user(rng, users, skew)),
+            date=START + timedelta(seconds=rng.randrange(days * 86400))
+        )
+
+def write_rates(path: str, currencies: list[str] = ["BENCH1", "BENCH2"], days: int = 365, seed: int = 0):
+    # one daily rate from every currency into the first, drifting like a random walk
+    rng = random.Random(seed)
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["day", "base", "quote", "rate"])
+        for currency in currencies[1:]:
+            rate = rng.uniform(0.5, 2.0)
+            for offset in range(days):
+                rate *= rng.uniform(0.99, 1.01)
+                writer.writerow([date(2024, 1, 1) + timedelta(days=offset), currency, currencies[0], f"{rate:.6f}"])
+
+def seed(repository, rows: int, batch_size: int = 10000, **kwargs):
+    currencies = kwargs.setdefault("currencies", ["BENCH1", "BENCH2"])
+    for currency in currencies:
+        repository.register_currency(Currency(currency=currency, country="Benchmark"))
+
+    batch = []
+    for transaction in generate_transactions(rows, **kwargs):
+        batch.append(transaction)
+        if len(batch) >= batch_size:
+            repository.bulk_create_transactions(batch)
+            batch = []
+    if batch:
+        repository.bulk_create_transactions(batch)
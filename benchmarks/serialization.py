@@ -0,0 +1,54 @@
+import argparse
+import time
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlmodel import Session, select
+from benchmarks.seed import seed
+from db_config import start_db_engine
+from encoding import json_response, orjson
+from repository import TRANSACTION_COLUMNS, Repository
+from Transaction import Transaction
+
+# rows/sec for a page of transactions answered the way list endpoints used to (ORM instances through
+# jsonable_encoder) against Core rows encoded straight to bytes
+
+def page(repository: Repository, columns, limit: int, encoded: bool):
+    # returns seconds spent querying and building the page, then seconds spent encoding the response
+    started = time.perf_counter()
+    with Session(repository.engine) as session:
+        rows = session.exec(select(*columns).where(Transaction.deleted == False).order_by(Transaction.date, Transaction.id).limit(limit)).all()
+        transactions = repository._present(session, rows, encoded)
+    queried = time.perf_counter()
+    if encoded:
+        json_response(transactions=transactions)
+    else:
+        JSONResponse(jsonable_encoder({"transactions": transactions}))
+    return queried - started, time.perf_counter() - queried
+
+MODES = {
+    "orm+jsonable_encoder": ([Transaction], False),
+    "core+jsonable_encoder": (TRANSACTION_COLUMNS, False),
+    "core+encoded bytes": (TRANSACTION_COLUMNS, True)
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare response encoding throughput for lists of transactions.")
+    parser.add_argument("--db-url", default=None)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    repository = Repository(start_db_engine(args.db_url))
+    seed(repository, args.rows)
+    print(f"encoder: {'orjson' if orjson else 'json'}")
+    print(f"{'rows':>8} {'mode':<24} {'encoded rows/s':>16} {'end to end rows/s':>18}")
+    for limit in args.page_sizes:
+        for mode, (columns, encoded) in MODES.items():
+            runs = [page(repository, columns, limit, encoded) for _ in range(args.repeat)]
+            encode = min(run[1] for run in runs)
+            total = min(sum(run) for run in runs)
+            print(f"{limit:>8} {mode:<24} {limit / encode:>16,.0f} {limit / total:>18,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from uuid import uuid4
+import httpx
+from benchmarks.seed import START, generate_transactions, seed, write_rates
+from currency_config import Currency
+from requests import TransactionRequest
+
+# Drives every route in app.py and every public Repository method against a disposable database and
+# writes throughput and latency percentiles as JSON, so runs can be diffed across commits:
+#   python -m benchmarks.suite --db-url sqlite:////tmp/bench.db --seed-rows 1000000
+#   python -m benchmarks.suite --seed-rows 0 --compare benchmarks/results/<earlier run>.json
+
+DELETE_USER = "bench-delete"
+
+@dataclass
+class Case:
+    name: str
+    call: object
+    requests: int | None = None
+
+class Workload:
+    # random but reproducible arguments that land inside the seeded data
+    def __init__(self, args):
+        self.rng = random.Random(args.seed)
+        self.users = args.users
+        self.currencies = args.currencies
+        self.days = args.days
+        self.registered = 0
+        self.tombstones = []
+
+    def user(self):
+        return str(self.rng.randrange(self.users))
+
+    def day(self):
+        return (START + timedelta(days=self.rng.randrange(self.days))).date().isoformat()
+
+    def amount_range(self, width: float = 1.0):
+        start = Decimal(str(round(self.rng.uniform(1, 10000 - width), 2)))
+        return start, start + Decimal(str(width))
+
+    def transaction(self, user_id: str | None = None):
+        return TransactionRequest(
+            id=uuid4(),
+            amount=Decimal(self.rng.randrange(100, 1000000)).scaleb(-2),
+            currency=self.rng.choice(self.currencies),
+            user_id=user_id or self.user(),
+            date=START + timedelta(seconds=self.rng.randrange(self.days * 86400))
+        )
+
+    def currency(self):
+        self.registered += 1
+        return f"BX{os.getpid()}{self.registered}"
+
+    def tombstone(self):
+        return self.tombstones.pop()
+
+def summarize(name: str, kind: str, latencies: list[float], elapsed: float, errors: int):
+    ordered = sorted(latencies)
+    cuts = statistics.quantiles(ordered, n=100, method="inclusive") if len(ordered) > 1 else ordered * 99
+    return {
+        "kind": kind,
+        "name": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": cuts[49],
+        "p95_ms": cuts[94],
+        "p99_ms": cuts[98],
+        "max_ms": ordered[-1]
+    }
+
+def measure_repository(case: Case, requests: int):
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for _ in range(case.requests or requests):
+        call_started = time.perf_counter()
+        response = case.call()
+        latencies.append((time.perf_counter() - call_started) * 1000)
+        errors += response["status"].name == "FAILURE"
+    return summarize(case.name, "repository", latencies, time.perf_counter() - started, errors)
+
+async def measure_route(client: httpx.AsyncClient, case: Case, requests: int, concurrency: int):
+    latencies, errors = [], 0
+    remaining = case.requests or requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            call_started = time.perf_counter()
+            response = await case.call(client)
+            await response.aread()
+            latencies.append((time.perf_counter() - call_started) * 1000)
+            errors += response.status_code >= 400
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, case.requests or requests))))
+    return summarize(case.name, "route", latencies, time.perf_counter() - started, errors)
+
+def repository_cases(repository, work: Workload, heavy_requests: int):
+    def ranged(method, *extra):
+        return lambda: method(*work.amount_range(), *extra)
+
+    def consumed(response):
+        if response["status"].name == "SUCCESS":
+            for _ in response["transactions"]:
+                pass
+        return response
+
+    def consumed_report(response):
+        if response["status"].name == "SUCCESS":
+            for _ in response["results"]:
+                pass
+        return response
+
+    return [
+        Case("create_transactions", lambda: repository.create_transactions([work.transaction()])),
+        Case("bulk_create_transactions x1000", lambda: repository.bulk_create_transactions([work.transaction() for _ in range(1000)]), heavy_requests),
+        Case("register_currency", lambda: repository.register_currency(Currency(currency=work.currency(), country="Benchmark"))),
+        Case("refresh_currencies", repository.refresh_currencies),
+        Case("fetch_transactions stream", lambda: consumed(repository.fetch_transactions(stream=True)), heavy_requests),
+        Case("fetch_total_by_currency", lambda: repository.fetch_total_by_currency(work.rng.choice(work.currencies))),
+        Case("fetch_converted_total", lambda: repository.fetch_converted_total(work.currencies[0])),
+        Case("fetch_transactions_by_date", lambda: repository.fetch_transactions_by_date(work.day())),
+        Case("fetch_transactions_within_amount_range", ranged(repository.fetch_transactions_within_amount_range)),
+        Case("paginated_transactions_by_amount", ranged(repository.paginated_transactions_by_amount, None, 100)),
+        Case("summarize_amount_range histogram", ranged(repository.summarize_amount_range, 20)),
+        Case("paginated_transactions", lambda: repository.paginated_transactions(work.rng.randrange(1000), 100)),
+        Case("paginated_transactions_by_cursor", lambda: repository.paginated_transactions_by_cursor(None, 100)),
+        Case("fetch_transactions_by_user_id", lambda: repository.fetch_transactions_by_user_id(work.user())),
+        Case("delete_transaction", lambda: repository.delete_transaction(work.tombstone())),
+        Case("delete_transactions x10", lambda: repository.delete_transactions(ids=[work.tombstone() for _ in range(10)])),
+        Case("get_report USER", lambda: repository.get_report(groups=["USER"])),
+        Case("get_report DAY,CURRENCY", lambda: repository.get_report(groups=["DAY", "CURRENCY"])),
+        Case("get_report DAY converted", lambda: repository.get_report(groups=["DAY"], currency=work.currencies[0])),
+        Case("get_report CURRENCY,USER top 100", lambda: repository.get_report(groups=["CURRENCY", "USER"], top=[None, 100])),
+        Case("get_report USER flat stream", lambda: consumed_report(repository.get_report(groups=["USER"], stream=True))),
+        Case("get_report MONTH,HOUR", lambda: repository.get_report(groups=["MONTH", "HOUR"]), heavy_requests),
+        Case("get_report USER,DAY rolling 7", lambda: repository.get_report(groups=["USER", "DAY"], rolling_days=7), heavy_requests),
+        Case("reconcile_currency_totals", repository.reconcile_currency_totals, heavy_requests),
+        Case("rebuild_daily_rollup", repository.rebuild_daily_rollup, heavy_requests)
+    ]
+
+def route_cases(work: Workload, heavy_requests: int):
+    def get(path):
+        return lambda client: client.get(path() if callable(path) else path)
+
+    def amount(query=""):
+        def path():
+            start, end = work.amount_range()
+            return f"/v1/amount?start={start}&end={end}{query}"
+        return get(path)
+
+    def ndjson_batch():
+        return "\n".join(work.transaction().model_dump_json() for _ in range(1000))
+
+    return [
+        Case("GET /health", get("/health")),
+        Case("GET /ready", get("/ready")),
+        Case("GET /pool", get("/pool")),
+        Case("GET /cache", get("/cache")),
+        Case("GET /fx", get("/fx")),
+        Case("GET /write-behind", get("/write-behind")),
+        Case("GET /columnar", get("/columnar")),
+        Case("GET /metrics", get("/metrics")),
+        Case("GET /v1/transactions", get("/v1/transactions?stream=true&format=ndjson"), heavy_requests),
+        Case("POST /v1/transaction", lambda client: client.post("/v1/transaction", content=work.transaction().model_dump_json())),
+        Case("POST /v1/transactions/bulk", lambda client: client.post("/v1/transactions/bulk", content=ndjson_batch()), heavy_requests),
+        Case("POST /v1/currency", lambda client: client.post("/v1/currency", json={"currency": work.currency(), "country": "Benchmark"})),
+        Case("GET /v1/total/{currency}", get(lambda: f"/v1/total/{work.rng.choice(work.currencies)}")),
+        Case("GET /v1/total", get(f"/v1/total?currency={work.currencies[0]}")),
+        Case("GET /v1/transactions/{date_str}", get(lambda: f"/v1/transactions/{work.day()}")),
+        Case("GET /v1/amount", amount()),
+        Case("GET /v1/amount page", amount("&limit=100")),
+        Case("GET /v1/amount histogram", amount("&summary=histogram&buckets=20")),
+        Case("GET /v1/paginated", get(lambda: f"/v1/paginated?offset={work.rng.randrange(1000)}&limit=100")),
+        Case("GET /v1/paginated cursor", get("/v1/paginated?mode=cursor&limit=100")),
+        Case("GET /v1/user/{user_id}", get(lambda: f"/v1/user/{work.user()}")),
+        Case("PUT /v1/delete/{transaction_id}", lambda client: client.put(f"/v1/delete/{work.tombstone()}")),
+        Case("DELETE /v1/transactions/{transaction_id}", lambda client: client.delete(f"/v1/transactions/{work.tombstone()}")),
+        Case("POST /v1/transactions/delete", lambda client: client.post("/v1/transactions/delete", json={"ids": [str(work.tombstone()) for _ in range(10)]})),
+        Case("GET /v1/report", get("/v1/report?from_date=&to_date=&group_by=user")),
+        Case("GET /v1/report converted", get(f"/v1/report?from_date=&to_date=&group_by=day&currency={work.currencies[0]}")),
+        Case("GET /v1/report top", get("/v1/report?from_date=&to_date=&group_by=currency,user&top=,100")),
+        Case("GET /v1/report flat", get("/v1/report?from_date=&to_date=&group_by=user&layout=flat&format=ndjson")),
+        Case("GET /v1/report rolling", get("/v1/report?from_date=&to_date=&group_by=week,day&rolling_days=7"))
+    ]
+
+def uncovered_routes(app, cases: list[Case]):
+    covered = {case.name.split()[1] for case in cases}
+    documentation = {app.openapi_url, app.docs_url, app.redoc_url, app.swagger_ui_oauth2_redirect_url}
+    return sorted(route.path for route in app.routes if route.path not in documentation and route.path not in covered)
+
+def prepare_tombstones(repository, work: Workload, count: int):
+    # rows the delete cases can remove, kept apart from the seeded users
+    transactions = [work.transaction(DELETE_USER) for _ in range(count)]
+    for i in range(0, count, 5000):
+        repository.bulk_create_transactions(transactions[i:i + 5000])
+    work.tombstones = [tx.id for tx in transactions]
+
+async def wait_ready(client, timeout_seconds=300):
+    # workers accept connections before warm-up finishes, timing them earlier would measure cold caches
+    deadline = time.perf_counter() + timeout_seconds
+    while (await client.get("/ready")).status_code != 200:
+        if time.perf_counter() > deadline:
+            raise RuntimeError("the app did not become ready")
+        await asyncio.sleep(0.1)
+
+async def run_routes(args, work: Workload, base_url: str | None):
+    cases = [case for case in route_cases(work, args.heavy_requests) if args.only in case.name]
+    results = []
+    if base_url:
+        async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+            await wait_ready(client)
+            for case in cases:
+                results.append(await measure_route(client, case, args.requests, args.concurrency))
+        return results, []
+
+    import app
+    async with app.app.router.lifespan_context(app.app):
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=300) as client:
+            await wait_ready(client)
+            for case in cases:
+                results.append(await measure_route(client, case, args.requests, args.concurrency))
+    return results, uncovered_routes(app.app, route_cases(work, args.heavy_requests))
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+def compare(results: list[dict], baseline_path: str):
+    with open(baseline_path) as file:
+        baseline = {(row["kind"], row["name"]): row for row in json.load(file)["results"]}
+    print(f"\n{'compared with ' + baseline_path:<48} {'p99 ms':>20} {'throughput/s':>24}")
+    for row in results:
+        before = baseline.get((row["kind"], row["name"]))
+        if before:
+            print(
+                f"{row['kind'] + ' ' + row['name']:<48} {before['p99_ms']:>9.2f} -> {row['p99_ms']:>7.2f} "
+                f"{before['throughput_per_s']:>11.1f} -> {row['throughput_per_s']:>9.1f}"
+            )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every route and repository method against a disposable database.")
+    parser.add_argument("--db-url", default=None, help="defaults to a sqlite file in a temporary directory")
+    parser.add_argument("--url", default=None, help="drive a running server instead of the app in-process")
+    parser.add_argument("--seed-rows", type=int, default=1000000, help="rows to generate first, 0 reuses what is there")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--currencies", nargs="+", default=["BENCH1", "BENCH2", "BENCH3"])
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--skew", type=float, default=1.0, help="0 spreads rows evenly over users, larger values favour a few")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=200, help="calls per case")
+    parser.add_argument("--heavy-requests", type=int, default=3, help="calls per case that scans the whole table")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients per route")
+    parser.add_argument("--only", default="", help="run the cases whose name contains this")
+    parser.add_argument("--skip-routes", action="store_true")
+    parser.add_argument("--skip-repository", action="store_true")
+    parser.add_argument("--output", default=None, help="defaults to benchmarks/results/<time>-<commit>.json")
+    parser.add_argument("--compare", default=None, help="an earlier result file to print deltas against")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="benchmark-")
+    db_url = args.db_url or f"sqlite:///{os.path.join(workdir, 'benchmark.db')}"
+    os.environ["DATABASE_URL"] = db_url
+    rates_path = os.path.join(workdir, "rates.csv")
+    write_rates(rates_path, args.currencies, args.days, args.seed)
+    os.environ["FX_RATES_FILE"] = rates_path
+    os.environ.setdefault("METRICS", "1")
+
+    from db_config import start_db_engine
+    from repository import Repository
+    repository = Repository(start_db_engine(db_url))
+    work = Workload(args)
+
+    started = time.perf_counter()
+    seed(repository, args.seed_rows, users=args.users, currencies=args.currencies, days=args.days, skew=args.skew, seed=args.seed)
+    repository.load_fx_rates(rates_path)
+    seeded_seconds = time.perf_counter() - started
+    print(f"seeded {args.seed_rows} rows in {seeded_seconds:.1f}s")
+
+    results, uncovered = [], []
+    # each side has one single delete case and one that removes ten rows per call
+    deletes = args.requests * 12
+    if not args.skip_repository:
+        prepare_tombstones(repository, work, deletes)
+        for case in repository_cases(repository, work, args.heavy_requests):
+            if args.only in case.name:
+                results.append(measure_repository(case, args.requests))
+                print(f"repository {case.name:<44} p50 {results[-1]['p50_ms']:>8.2f} p99 {results[-1]['p99_ms']:>8.2f} ms")
+    if not args.skip_routes:
+        prepare_tombstones(repository, work, deletes)
+        route_results, uncovered = asyncio.run(run_routes(args, work, args.url))
+        for row in route_results:
+            print(f"route {row['name']:<49} p50 {row['p50_ms']:>8.2f} p99 {row['p99_ms']:>8.2f} ms")
+        results.extend(route_results)
+    for path in uncovered:
+        print(f"warning: no benchmark case for route {path}", file=sys.stderr)
+
+    commit, dirty = git_revision()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "database": repository.engine.dialect.name,
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "seed_seconds": seeded_seconds,
+        "results": results
+    }
+    output = args.output or os.path.join("benchmarks", "results", f"{datetime.now():%Y%m%d-%H%M%S}-{(commit or 'unknown')[:8]}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"wrote {output}")
+    if args.compare:
+        compare(results, args.compare)
+    return 1 if any(row["errors"] for row in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import csv
+from pydantic import ValidationError
+from requests import TransactionRequest
+from repository import Status
+
+BATCH_SIZE = 5000
+MAX_REPORTED_REJECTS = 1000
+CSV_FIELDS = ["id", "amount", "currency", "user_id", "date"]
+
+def parse_ndjson(lines, first_line_no=1):
+    for line_no, line in enumerate(lines, start=first_line_no):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, TransactionRequest.model_validate_json(line), None
+        except ValidationError as e:
+            yield line_no, None, _describe(e)
+
+def parse_csv(lines, header=CSV_FIELDS, first_line_no=1):
+    for line_no, row in enumerate(csv.reader(lines), start=first_line_no):
+        if not row:
+            continue
+        if len(row) != len(header):
+            yield line_no, None, f"expected {len(header)} columns but got {len(row)}"
+            continue
+        fields = {key: value for key, value in zip(header, row) if value != ""}
+        try:
+            yield line_no, TransactionRequest.model_validate(fields), None
+        except ValidationError as e:
+            yield line_no, None, _describe(e)
+
+def parse_csv_header(line: str):
+    header = [column.strip() for column in next(csv.reader([line]))]
+    unknown = set(header) - set(CSV_FIELDS)
+    if unknown:
+        raise ValueError(f"unknown csv columns {unknown}, expected a subset of {CSV_FIELDS}")
+    return header
+
+async def ingest_batch(repository, parsed):
+    transactions, line_numbers, rejects = [], [], []
+    for line_no, transaction, error in parsed:
+        if error:
+            rejects.append({"line": line_no, "reason": error})
+        else:
+            transactions.append(transaction)
+            line_numbers.append(line_no)
+
+    inserted, duplicates = 0, 0
+    if transactions:
+        response = await repository.bulk_create_transactions(transactions)
+        if response["status"] == Status.FAILURE:
+            rejects.extend({"line": line_no, "reason": response["message"]} for line_no in line_numbers)
+        else:
+            inserted, duplicates = response["inserted"], response["duplicates"]
+            rejects.extend({"line": line_numbers[index], "reason": reason} for index, reason in response["rejects"])
+    return inserted, duplicates, rejects
+
+async def iter_lines(chunks):
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode().rstrip("\r")
+    if buffer:
+        yield buffer.decode().rstrip("\r")
+
+def _describe(error: ValidationError):
+    return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in error.errors())
@@ -0,0 +1,33 @@
+from unittest import TestCase
+from bulk_ingest import parse_ndjson, parse_csv, parse_csv_header
+
+class TestBulkIngest(TestCase):
+    def test_parse_ndjson_skips_blank_lines_and_reports_invalid_rows(self):
+        lines = [
+            '{"amount": 1.0, "currency": "TEST1", "user_id": "123"}',
+            '',
+            '{"amount": "abc", "currency": "TEST1", "user_id": "123"}'
+        ]
+        parsed = list(parse_ndjson(lines))
+
+        self.assertEqual(len(parsed), 2)
+        self.assertEqual(parsed[0][0], 1)
+        self.assertEqual(parsed[0][1].amount, 1.0)
+        self.assertIsNone(parsed[0][2])
+        self.assertEqual(parsed[1][0], 3)
+        self.assertIsNone(parsed[1][1])
+        self.assertIn("amount", parsed[1][2])
+
+    def test_parse_csv_with_header(self):
+        header = parse_csv_header("amount,currency,user_id,date")
+        lines = ["5.5,TEST1,123,2025-05-05T09:00:00", "7,TEST2"]
+        parsed = list(parse_csv(lines, header, first_line_no=2))
+
+        self.assertEqual(parsed[0][0], 2)
+        self.assertEqual(parsed[0][1].user_id, "123")
+        self.assertEqual(parsed[1][0], 3)
+        self.assertEqual(parsed[1][2], "expected 4 columns but got 2")
+
+    def test_parse_csv_header_rejects_unknown_columns(self):
+        with self.assertRaises(ValueError):
+            parse_csv_header("amount,currency,user_id,country")
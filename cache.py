@@ -0,0 +1,160 @@
+import os
+import time
+from collections import OrderedDict
+from datetime import date
+from encoding import EncodedRows
+from repository import Status
+
+ROW_BYTES = 1500
+ENTRY_BYTES = 200
+
+class TTLCache:
+    def __init__(self, max_bytes: int, ttl_seconds: float, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, size, value = entry
+        if expires_at <= self.clock():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def begin_read(self, key):
+        token = object()
+        self.pending[key] = token
+        return token
+
+    def put(self, key, token, value, size: int):
+        # a write that invalidated the key while the read was in flight drops the token
+        if self.pending.get(key) is not token:
+            return
+        del self.pending[key]
+        # a ttl of 0 turns caching off, serve.py does that when several workers would each hold their own copy
+        if size > self.max_bytes or self.ttl_seconds <= 0:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (self.clock() + self.ttl_seconds, size, value)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def abandon(self, key, token):
+        if self.pending.get(key) is token:
+            del self.pending[key]
+
+    def invalidate(self, key):
+        self.pending.pop(key, None)
+        if key in self.entries:
+            self._remove(key)
+            self.invalidations += 1
+
+    def _remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.bytes -= size
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+def entry_bytes(transactions):
+    # encoded rows are held as their JSON bytes, model rows are estimated
+    if isinstance(transactions, EncodedRows):
+        return len(transactions.body)
+    return ROW_BYTES * len(transactions)
+
+class CachedRepository:
+    # read-through cache for the per-user and per-date lookups in front of an AsyncRepository
+    def __init__(self, repository, cache: TTLCache):
+        self.repository = repository
+        self.cache = cache
+
+    @classmethod
+    def from_environment(cls, repository):
+        max_bytes = int(os.environ.get("CACHE_MAX_BYTES", 64 * 1024 * 1024))
+        ttl_seconds = float(os.environ.get("CACHE_TTL_SECONDS", 30))
+        return cls(repository, TTLCache(max_bytes, ttl_seconds))
+
+    def __getattr__(self, name):
+        return getattr(self.repository, name)
+
+    async def _read_through(self, key, fetch):
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        token = self.cache.begin_read(key)
+        response = await fetch()
+        if response["status"] == Status.SUCCESS:
+            self.cache.put(key, token, response, ENTRY_BYTES + entry_bytes(response["transactions"]))
+        else:
+            self.cache.abandon(key, token)
+        return response
+
+    def _invalidate(self, rows):
+        for user_id, day in {(row.user_id, row.date.date()) for row in rows}:
+            for encoded in (False, True):
+                self.cache.invalidate(("user", user_id, encoded))
+                self.cache.invalidate(("date", day, encoded))
+
+    async def fetch_transactions_by_user_id(self, user_id: str, stream: bool = False, encoded: bool = False):
+        if stream:
+            return await self.repository.fetch_transactions_by_user_id(user_id, stream=True)
+        key = ("user", user_id, encoded)
+        return await self._read_through(key, lambda: self.repository.fetch_transactions_by_user_id(user_id, encoded=encoded))
+
+    async def fetch_transactions_by_date(self, date_str: str, stream: bool = False, encoded: bool = False):
+        if stream:
+            return await self.repository.fetch_transactions_by_date(date_str, stream=True)
+        key = ("date", date.fromisoformat(date_str), encoded)
+        return await self._read_through(key, lambda: self.repository.fetch_transactions_by_date(date_str, encoded=encoded))
+
+    async def create_transactions(self, transactions: list[any]):
+        response = await self.repository.create_transactions(transactions)
+        if response["status"] == Status.SUCCESS:
+            self._invalidate(transactions)
+        return response
+
+    async def bulk_create_transactions(self, transactions: list[any]):
+        response = await self.repository.bulk_create_transactions(transactions)
+        if response["status"] == Status.SUCCESS:
+            self._invalidate(transactions)
+        return response
+
+    async def delete_transaction(self, transaction_id):
+        response = await self.repository.delete_transaction(transaction_id)
+        if response["status"] == Status.SUCCESS:
+            self._invalidate(response["deleted"])
+        return response
+
+    async def delete_transactions(self, ids=None, user_id=None, from_date=None, to_date=None):
+        response = await self.repository.delete_transactions(ids, user_id, from_date, to_date)
+        # a failed run may still have committed earlier chunks
+        self._invalidate(response.get("deleted", []))
+        return response
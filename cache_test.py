@@ -0,0 +1,77 @@
+from datetime import datetime
+from types import SimpleNamespace
+from unittest import TestCase, IsolatedAsyncioTestCase
+from cache import TTLCache, CachedRepository
+from repository import Status
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestTTLCache(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = TTLCache(max_bytes=100, ttl_seconds=10, clock=self.clock)
+
+    def store(self, key, value, size=10):
+        self.cache.put(key, self.cache.begin_read(key), value, size)
+
+    def test_hit_and_expiry(self):
+        self.store("a", 1)
+        self.assertEqual(self.cache.get("a"), 1)
+        self.clock.now = 11
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["expirations"], 1)
+
+    def test_evicts_least_recently_used_over_memory_cap(self):
+        self.store("a", 1, size=40)
+        self.store("b", 2, size=40)
+        self.cache.get("a")
+        self.store("c", 3, size=40)
+
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+        self.assertLessEqual(self.cache.stats()["bytes"], 100)
+
+    def test_invalidation_during_read_discards_result(self):
+        token = self.cache.begin_read("a")
+        self.cache.invalidate("a")
+        self.cache.put("a", token, "stale", 10)
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_zero_ttl_stores_nothing(self):
+        cache = TTLCache(max_bytes=100, ttl_seconds=0, clock=self.clock)
+        cache.put("a", cache.begin_read("a"), 1, 10)
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["entries"], 0)
+        self.assertEqual(cache.pending, {})
+
+class FakeRepository:
+    def __init__(self):
+        self.calls = 0
+
+    async def fetch_transactions_by_user_id(self, user_id, stream=False, encoded=False):
+        self.calls += 1
+        return {"status": Status.SUCCESS, "transactions": [self.calls]}
+
+    async def create_transactions(self, transactions):
+        return {"status": Status.SUCCESS, "message": "ok"}
+
+class TestCachedRepository(IsolatedAsyncioTestCase):
+    async def test_reads_through_and_invalidates_on_write(self):
+        repository = CachedRepository(FakeRepository(), TTLCache(max_bytes=10000, ttl_seconds=60))
+
+        first = await repository.fetch_transactions_by_user_id("123")
+        second = await repository.fetch_transactions_by_user_id("123")
+        self.assertEqual(first, second)
+
+        await repository.create_transactions([SimpleNamespace(user_id="123", date=datetime(2025, 5, 5, 9, 0))])
+        third = await repository.fetch_transactions_by_user_id("123")
+        self.assertEqual(third["transactions"], [2])
+        self.assertEqual(repository.cache.stats()["invalidations"], 1)
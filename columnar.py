@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import os
+from decimal import Decimal
+from typing import Literal
+from uuid import UUID, uuid4
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+from db_config import sync_url
+from money import to_minor
+from repository import INSERTED, Status, GroupBy
+
+QueryEngine = Literal["sql", "columnar"]
+LOAD_RETRY_SECONDS = 30
+log = logging.getLogger("columnar")
+
+def columnar_enabled():
+    return os.environ.get("COLUMNAR_ANALYTICS", "false").lower() in ("1", "true", "yes")
+
+def sync_seconds():
+    # 0 loads the store once, which is only right while a single process handles every write
+    return float(os.environ.get("COLUMNAR_SYNC_SECONDS", 0))
+
+class ColumnarRepository:
+    # answers analytics from a ColumnarStore and keeps it in step with the writes made through this process;
+    # writes from other processes show up after the next periodic sync
+    def __init__(self, repository, enabled: bool = False):
+        self.repository = repository
+        self.enabled = enabled
+        self.store = None
+        self.pending = None
+        self.loaded = asyncio.Event()
+
+    def __getattr__(self, name):
+        return getattr(self.repository, name)
+
+    def _load(self):
+        # numpy is only imported once the columnar engine is in use, workers that leave it off start without it
+        from columnar_store import ColumnarStore
+        engine = create_engine(sync_url(self.repository.engine.url), poolclass=NullPool)
+        try:
+            return ColumnarStore.load(engine)
+        finally:
+            engine.dispose()
+
+    async def sync(self):
+        # the snapshot loads on a thread with its own sync engine so the event loop keeps serving, writes that
+        # land meanwhile are replayed onto it before it is swapped in
+        self.pending = []
+        try:
+            store = await asyncio.to_thread(self._load)
+            for change, args in self.pending:
+                if change == "insert":
+                    store.append(*args, skip_existing=True)
+                else:
+                    store.delete(*args)
+            self.store = store
+            self.loaded.set()
+        finally:
+            self.pending = None
+
+    async def sync_periodically(self, interval_seconds: float = 0):
+        # after the first load the store follows this process's writes, a reload every interval_seconds is
+        # only needed to pick up writes made by other processes
+        while True:
+            try:
+                await self.sync()
+            except Exception:
+                log.exception("loading the columnar store failed")
+            else:
+                if not interval_seconds:
+                    return
+            await asyncio.sleep(interval_seconds or LOAD_RETRY_SECONDS)
+
+    def _record(self, change: str, *args):
+        if self.store is not None:
+            if change == "insert":
+                self.store.append(*args)
+            else:
+                self.store.delete(*args)
+        if self.pending is not None:
+            self.pending.append((change, args))
+
+    def _record_inserts(self, transactions):
+        if not self.enabled or not transactions:
+            return
+        exponents = {tx.currency: self.repository.currency_registry.exponents[tx.currency] for tx in transactions}
+        self._record(
+            "insert",
+            [tx.id for tx in transactions],
+            [to_minor(tx.amount, exponents[tx.currency]) for tx in transactions],
+            [tx.currency for tx in transactions],
+            [tx.user_id for tx in transactions],
+            [tx.date for tx in transactions],
+            exponents
+        )
+
+    async def _query(self, method: str, *args):
+        if not self.enabled:
+            return {"status": Status.FAILURE, "message": "the columnar engine is disabled, set COLUMNAR_ANALYTICS=true to enable it"}
+        if self.store is None:
+            return {"status": Status.FAILURE, "message": "the columnar engine is still loading"}
+        return await asyncio.to_thread(getattr(self.store, method), *args)
+
+    async def create_transactions(self, transactions: list[any]):
+        if self.enabled:
+            for tx in transactions:
+                tx.id = tx.id or uuid4()
+        response = await self.repository.create_transactions(transactions)
+        if response["status"] == Status.SUCCESS:
+            self._record_inserts([tx for tx, result in zip(transactions, response["results"]) if result == INSERTED])
+        return response
+
+    async def bulk_create_transactions(self, transactions: list[any]):
+        if self.enabled:
+            for tx in transactions:
+                tx.id = tx.id or uuid4()
+        response = await self.repository.bulk_create_transactions(transactions)
+        if response["status"] == Status.SUCCESS:
+            self._record_inserts([tx for tx, result in zip(transactions, response["results"]) if result == INSERTED])
+        return response
+
+    async def delete_transaction(self, transaction_id: UUID):
+        response = await self.repository.delete_transaction(transaction_id)
+        if response["status"] == Status.SUCCESS and response["deleted"] and self.enabled:
+            self._record("delete", transaction_id)
+        return response
+
+    async def delete_transactions(self, ids=None, user_id=None, from_date=None, to_date=None):
+        response = await self.repository.delete_transactions(ids, user_id, from_date, to_date)
+        if self.enabled:
+            for row in response.get("deleted", []):
+                self._record("delete", row.id)
+        return response
+
+    async def get_report(self, from_date=None, to_date=None, groups: list[str]=[], currency: str | None = None, top: list[int | None] | None = None, min_total: Decimal | None = None, rolling_days: int | None = None, stream: bool = False, engine: QueryEngine = "sql"):
+        if engine == "columnar":
+            if currency:
+                return {"status": Status.FAILURE, "message": "currency conversion is only served by the sql engine"}
+            if any(top or []) or min_total is not None or stream:
+                return {"status": Status.FAILURE, "message": "top, min_total and the flat layout are only served by the sql engine"}
+            if rolling_days or set(groups) - {GroupBy.USER.name, GroupBy.DAY.name, GroupBy.CURRENCY.name}:
+                return {"status": Status.FAILURE, "message": "hour, week and month buckets and rolling windows are only served by the sql engine"}
+            return await self._query("report", from_date, to_date, groups)
+        return await self.repository.get_report(from_date, to_date, groups, currency, top, min_total, rolling_days, stream)
+
+    async def fetch_transactions_within_amount_range(self, start: Decimal, end: Decimal, stream: bool = False, engine: QueryEngine = "sql", encoded: bool = False):
+        if engine == "columnar":
+            response = await self._query("fetch_transactions_within_amount_range", start, end, stream)
+            if stream and response["status"] == Status.SUCCESS:
+                return {"status": Status.SUCCESS, "transactions": self._iterate(response["transactions"])}
+            return response
+        return await self.repository.fetch_transactions_within_amount_range(start, end, stream=stream, encoded=encoded)
+
+    async def summarize_amount_range(self, start: Decimal, end: Decimal, buckets: int | None = None, engine: QueryEngine = "sql"):
+        if engine == "columnar":
+            return await self._query("summarize_amount_range", start, end, buckets)
+        return await self.repository.summarize_amount_range(start, end, buckets)
+
+    async def fetch_total_by_currency(self, currency: str, engine: QueryEngine = "sql"):
+        if engine == "columnar":
+            return await self._query("fetch_total_by_currency", currency)
+        return await self.repository.fetch_total_by_currency(currency)
+
+    async def _iterate(self, transactions):
+        for transaction in transactions:
+            yield transaction
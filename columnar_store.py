@@ -0,0 +1,230 @@
+from datetime import date
+from decimal import Decimal
+from uuid import UUID
+import numpy as np
+from sqlalchemy import select
+from currency_config import Currency
+from money import DEFAULT_EXPONENT, from_minor, minor_bounds
+from repository import Status, GroupBy
+from requests import TransactionResponse
+from Transaction import Transaction
+
+LOAD_CHUNK_SIZE = 100000
+INITIAL_CAPACITY = 1024
+EPOCH = date(1970, 1, 1)
+
+class Dictionary:
+    # maps repeated strings to dense int32 codes
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, values):
+        codes = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.values)
+                self.values.append(value)
+            codes[i] = code
+        return codes
+
+    def code(self, value):
+        return self.codes.get(value)
+
+    def decode(self, codes):
+        return np.array(self.values, dtype=object)[codes]
+
+class ColumnarStore:
+    # live transactions as parallel numpy arrays, grown by doubling so appends stay amortized O(1)
+    COLUMNS = {
+        "ids": "V16",
+        "amount": np.int64,
+        "timestamp": "datetime64[us]",
+        "day": np.int32,
+        "user": np.int32,
+        "currency": np.int32,
+        "live": np.bool_
+    }
+
+    def __init__(self):
+        self.size = 0
+        self.capacity = 0
+        self.users = Dictionary()
+        self.currencies = Dictionary()
+        self.exponents = {}
+        for name, dtype in self.COLUMNS.items():
+            setattr(self, name, np.empty(0, dtype=dtype))
+
+    @classmethod
+    def load(cls, engine, chunk_size: int = LOAD_CHUNK_SIZE):
+        store = cls()
+        stmt = select(Transaction.id, Transaction.amount_minor, Transaction.currency, Transaction.user_id, Transaction.date)\
+                .where(Transaction.deleted == False)
+        with engine.connect() as connection:
+            store.exponents = dict(connection.execute(select(Currency.currency, Currency.exponent)).all())
+            result = connection.execution_options(yield_per=chunk_size).execute(stmt)
+            for rows in result.partitions():
+                ids, amounts, currencies, user_ids, dates = zip(*rows)
+                store.append(ids, amounts, currencies, user_ids, dates)
+        return store
+
+    def _reserve(self, extra: int):
+        if self.size + extra <= self.capacity:
+            return
+        capacity = max(self.size + extra, self.capacity * 2, INITIAL_CAPACITY)
+        for name, dtype in self.COLUMNS.items():
+            grown = np.empty(capacity, dtype=dtype)
+            grown[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, grown)
+        self.capacity = capacity
+
+    def append(self, ids, amounts, currencies, user_ids, dates, exponents: dict[str, int] = {}, skip_existing: bool = False):
+        # amounts are in minor units, exponents covers any currency the store has not seen yet
+        self.exponents.update(exponents)
+        ids = np.array([transaction_id.bytes for transaction_id in ids], dtype="V16")
+        keep = ~np.isin(ids, self.ids[:self.size]) if skip_existing else np.ones(len(ids), dtype=np.bool_)
+        count = int(keep.sum())
+        if not count:
+            return 0
+
+        timestamps = np.array(dates, dtype="datetime64[us]")[keep]
+        start, end = self.size, self.size + count
+        self._reserve(count)
+        self.ids[start:end] = ids[keep]
+        self.amount[start:end] = np.asarray(amounts, dtype=np.int64)[keep]
+        self.timestamp[start:end] = timestamps
+        self.day[start:end] = timestamps.astype("datetime64[D]").astype(np.int32)
+        self.currency[start:end] = self.currencies.encode(currencies)[keep]
+        self.user[start:end] = self.users.encode(user_ids)[keep]
+        self.live[start:end] = True
+        # readers slice by size, so the rows only become visible once they are fully written
+        self.size = end
+        return count
+
+    def delete(self, transaction_id: UUID):
+        rows = np.nonzero(self.ids[:self.size] == np.void(transaction_id.bytes))[0]
+        self.live[rows] = False
+        return len(rows)
+
+    def _code_exponents(self):
+        return np.array([self.exponents[currency] for currency in self.currencies.values], dtype=np.int64)
+
+    def report(self, from_date=None, to_date=None, groups: list[str]=[]):
+        try:
+            groups = [GroupBy[group_by] for group_by in groups]
+            size = self.size
+            mask = self.live[:size].copy()
+            if from_date and to_date:
+                day = self.day[:size]
+                mask &= day >= (date.fromisoformat(from_date) - EPOCH).days
+                mask &= day <= (date.fromisoformat(to_date) - EPOCH).days
+
+            amount = self.amount[:size][mask]
+            if not groups or not len(amount):
+                return {"status": Status.SUCCESS, "results": {}}
+
+            # currency is always part of the key so integer sums never mix exponents
+            dimensions = groups if GroupBy.CURRENCY in groups else [*groups, GroupBy.CURRENCY]
+            columns = {GroupBy.USER: self.user, GroupBy.CURRENCY: self.currency, GroupBy.DAY: self.day}
+            codes, dims, offsets = [], [], []
+            for group in dimensions:
+                column = columns[group][:size][mask].astype(np.int64)
+                offset = int(column.min())
+                codes.append(column - offset)
+                dims.append(int(column.max()) - offset + 1)
+                offsets.append(offset)
+
+            keys, inverse = np.unique(np.ravel_multi_index(codes, dims), return_inverse=True)
+            totals = np.zeros(len(keys), dtype=np.int64)
+            np.add.at(totals, inverse, amount)
+            levels = [level + offset for level, offset in zip(np.unravel_index(keys, dims), offsets)]
+            labels = []
+            for group, level in zip(groups, levels):
+                if group == GroupBy.DAY:
+                    labels.append(level.astype("datetime64[D]").astype(str))
+                else:
+                    labels.append((self.users if group == GroupBy.USER else self.currencies).decode(level))
+            exponents = self._code_exponents()[levels[dimensions.index(GroupBy.CURRENCY)]]
+
+            final_result = {}
+            for i, (total, exponent) in enumerate(zip(totals.tolist(), exponents.tolist())):
+                current_level = final_result
+                for label in labels[:-1]:
+                    current_level = current_level.setdefault(str(label[i]), {})
+                key = str(labels[-1][i])
+                current_level[key] = current_level.get(key, 0) + from_minor(total, exponent)
+            return {"status": Status.SUCCESS, "results": final_result}
+        except Exception as e:
+            return {"status": Status.FAILURE, "message": f"Fetching report failed due to {e}"}
+
+    def _amount_ranges(self, start: Decimal, end: Decimal):
+        # a major-unit range is a different minor-unit range for each currency exponent
+        size = self.size
+        amount = self.amount[:size]
+        live = self.live[:size]
+        code_exponents = self._code_exponents()
+        distinct = np.unique(code_exponents).tolist()
+        row_exponents = code_exponents[self.currency[:size]] if len(distinct) > 1 else None
+        for exponent in distinct:
+            low, high = minor_bounds(start, end, exponent)
+            mask = live & (low <= amount) & (amount <= high)
+            if row_exponents is not None:
+                mask &= row_exponents == exponent
+            yield exponent, mask
+
+    def fetch_transactions_within_amount_range(self, start: Decimal, end: Decimal, stream: bool = False):
+        rows = np.concatenate([np.nonzero(mask)[0] for _, mask in self._amount_ranges(start, end)] or [np.empty(0, dtype=np.int64)])
+        rows = rows[np.argsort(self.amount[rows], kind="stable")]
+        transactions = self._transactions(rows)
+        return {"status": Status.SUCCESS, "transactions": transactions if stream else list(transactions)}
+
+    def summarize_amount_range(self, start: Decimal, end: Decimal, buckets: int | None = None):
+        start, end = Decimal(start), Decimal(end)
+        count, total = 0, Decimal(0)
+        counts = np.zeros(buckets or 0, dtype=np.int64)
+        for exponent, mask in self._amount_ranges(start, end):
+            matches = self.amount[:self.size][mask]
+            count += len(matches)
+            total += from_minor(int(matches.sum()), exponent)
+            if buckets and len(matches):
+                lower, upper = float(start.scaleb(exponent)), float(end.scaleb(exponent))
+                counts += np.histogram(matches, bins=buckets, range=(lower, upper if upper > lower else lower + 1))[0]
+
+        response = {"status": Status.SUCCESS, "count": count, "total": total}
+        if buckets:
+            width = (end - start) / buckets
+            response["histogram"] = [
+                {"lower": start + i * width, "upper": start + (i + 1) * width, "count": int(bucket_count)}
+                for i, bucket_count in enumerate(counts)
+            ]
+        return response
+
+    def fetch_total_by_currency(self, currency: str):
+        code = self.currencies.code(currency)
+        if code is None:
+            return {"status": Status.SUCCESS, "amount": from_minor(0, self.exponents.get(currency, DEFAULT_EXPONENT))}
+        size = self.size
+        mask = self.live[:size] & (self.currency[:size] == code)
+        return {"status": Status.SUCCESS, "amount": from_minor(int(self.amount[:size][mask].sum()), self.exponents[currency])}
+
+    def _transactions(self, rows):
+        for row in rows:
+            currency = self.currencies.values[self.currency[row]]
+            yield TransactionResponse.model_construct(
+                id=UUID(bytes=self.ids[row].tobytes()),
+                amount=from_minor(int(self.amount[row]), self.exponents[currency]),
+                currency=currency,
+                user_id=self.users.values[self.user[row]],
+                date=self.timestamp[row].item(),
+                deleted=False
+            )
+
+    def stats(self):
+        return {
+            "rows": self.size,
+            "live_rows": int(self.live[:self.size].sum()),
+            "users": len(self.users.values),
+            "currencies": len(self.currencies.values),
+            "bytes": sum(getattr(self, name).nbytes for name in self.COLUMNS)
+        }
@@ -0,0 +1,118 @@
+import asyncio
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+from uuid import uuid4
+from sqlmodel import Session, delete
+from aggregates import CurrencyTotal, DailyRollup
+from benchmarks.seed import seed
+import columnar
+from columnar import ColumnarRepository
+from columnar_store import ColumnarStore
+from currency_config import Currency
+from db_config import start_db_engine
+from repository import Repository, Status
+from Transaction import Transaction
+
+engine = start_db_engine()
+
+class TestColumnarStore(TestCase):
+    def setUp(self):
+        self.store = ColumnarStore()
+        self.ids = [uuid4() for _ in range(4)]
+        self.store.append(
+            self.ids,
+            [1000, 2000, 500, 750],
+            ["USD", "EUR", "USD", "USD"],
+            ["1", "1", "2", "2"],
+            [datetime(2024, 1, 1, 9), datetime(2024, 1, 1, 18), datetime(2024, 1, 2, 12), datetime(2024, 1, 3, 8)],
+            {"USD": 2, "EUR": 2}
+        )
+
+    def test_report_groups_nest_in_order(self):
+        response = self.store.report(groups=["USER", "CURRENCY"])
+
+        self.assertEqual(response["status"], Status.SUCCESS)
+        self.assertEqual(response["results"], {"1": {"USD": Decimal("10.00"), "EUR": Decimal("20.00")}, "2": {"USD": Decimal("12.50")}})
+
+    def test_report_filters_days_inclusively(self):
+        response = self.store.report("2024-01-01", "2024-01-02", ["DAY"])
+
+        self.assertEqual(response["results"], {"2024-01-01": 30.0, "2024-01-02": 5.0})
+
+    def test_deleted_rows_are_excluded(self):
+        self.store.delete(self.ids[1])
+
+        self.assertEqual(self.store.report(groups=["CURRENCY"])["results"], {"USD": 22.5})
+        self.assertEqual(self.store.fetch_total_by_currency("EUR")["amount"], Decimal("0.00"))
+
+    def test_amount_range_is_sorted_by_amount(self):
+        response = self.store.fetch_transactions_within_amount_range(Decimal(6), Decimal(15))
+
+        self.assertEqual([tx.amount for tx in response["transactions"]], [Decimal("7.50"), Decimal("10.00")])
+        self.assertEqual(response["transactions"][0].id, self.ids[3])
+        self.assertEqual(response["transactions"][0].date, datetime(2024, 1, 3, 8))
+
+    def test_amount_histogram_includes_upper_bound(self):
+        response = self.store.summarize_amount_range(Decimal(0), Decimal(20), buckets=2)
+
+        self.assertEqual(response["count"], 4)
+        self.assertEqual([bucket["count"] for bucket in response["histogram"]], [2, 2])
+
+    def test_append_grows_past_initial_capacity_and_skips_known_ids(self):
+        ids = [uuid4() for _ in range(3000)]
+        self.store.append(ids, [100] * 3000, ["GBP"] * 3000, ["3"] * 3000, [datetime(2024, 2, 1)] * 3000, {"GBP": 2})
+        added = self.store.append(ids[:10] + [uuid4()], [100] * 11, ["GBP"] * 11, ["3"] * 11, [datetime(2024, 2, 1)] * 11, skip_existing=True)
+
+        self.assertEqual(added, 1)
+        self.assertEqual(self.store.fetch_total_by_currency("GBP")["amount"], Decimal("3001.00"))
+
+class TestColumnarParity(TestCase):
+    def setUp(self):
+        self.repository = Repository(engine)
+        seed(self.repository, 2000, batch_size=500, users=20, currencies=["COL1", "COL2"], days=30)
+
+    def tearDown(self):
+        with Session(engine) as session:
+            session.exec(delete(Transaction).where(Transaction.currency.in_(["COL1", "COL2"])))
+            session.exec(delete(CurrencyTotal).where(CurrencyTotal.currency.in_(["COL1", "COL2"])))
+            session.exec(delete(DailyRollup).where(DailyRollup.currency.in_(["COL1", "COL2"])))
+            session.exec(delete(Currency).where(Currency.currency.in_(["COL1", "COL2"])))
+            session.commit()
+
+    def test_matches_sql_report(self):
+        store = ColumnarStore.load(engine, chunk_size=300)
+
+        for groups in (["CURRENCY"], ["USER", "DAY"], ["DAY", "CURRENCY", "USER"]):
+            expected = self.repository.get_report("2024-01-05", "2024-01-20", groups)
+            self.assertEqual(store.report("2024-01-05", "2024-01-20", groups)["results"], expected["results"])
+
+        self.assertEqual(store.fetch_total_by_currency("COL1")["amount"], self.repository.fetch_total_by_currency("COL1")["amount"])
+
+    def test_repository_loads_the_store_once_off_the_event_loop(self):
+        repository = ColumnarRepository(SimpleNamespace(engine=engine), enabled=True)
+        asyncio.run(repository.sync_periodically())
+
+        self.assertEqual(repository.store.report(groups=["CURRENCY"])["results"], self.repository.get_report(groups=["CURRENCY"])["results"])
+
+class TestColumnarSync(TestCase):
+    def test_failed_loads_are_logged_and_retried(self):
+        repository = ColumnarRepository(SimpleNamespace(engine=SimpleNamespace(url="nosuchdb://")), enabled=True)
+        attempts = []
+        load = repository._load
+        def counting_load():
+            attempts.append(1)
+            return load()
+
+        async def run():
+            task = asyncio.create_task(repository.sync_periodically())
+            while len(attempts) < 2:
+                await asyncio.sleep(0.01)
+            task.cancel()
+
+        with patch.object(repository, "_load", counting_load), patch.object(columnar, "LOAD_RETRY_SECONDS", 0), self.assertLogs("columnar") as logs:
+            asyncio.run(run())
+        self.assertIn("loading the columnar store failed", logs.output[0])
+        self.assertIsNone(repository.store)
@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+from uuid import UUID
+from sqlalchemy import BigInteger, literal
+from sqlmodel import Field, SQLModel, Session, delete, select
+from aggregates import upsert
+from Transaction import Transaction
+
+CHUNK_ROWS = 5000
+log = logging.getLogger("compaction")
+
+def retention_days():
+    value = os.environ.get("TRANSACTION_RETENTION_DAYS")
+    return int(value) if value else None
+
+def compaction_seconds():
+    return float(os.environ.get("COMPACTION_SECONDS", 3600))
+
+def compaction_chunk_rows():
+    return int(os.environ.get("COMPACTION_CHUNK_ROWS", CHUNK_ROWS))
+
+class TransactionArchive(SQLModel, table=True):
+    __tablename__ = "transaction_archive"
+
+    id: UUID = Field(primary_key=True)
+    amount_minor: int = Field(sa_type=BigInteger)
+    currency: str
+    user_id: str
+    date: datetime
+    deleted_at: datetime | None = None
+    archived_at: datetime
+
+ARCHIVED_COLUMNS = ["id", "amount_minor", "currency", "user_id", "date", "deleted_at"]
+
+def compact_chunk(session: Session, cutoff: datetime, chunk_rows: int = CHUNK_ROWS):
+    # the totals already left these rows out when they were deleted, so moving them changes no aggregate
+    ids = select(Transaction.id)\
+        .where(Transaction.deleted == True)\
+        .where(Transaction.deleted_at < cutoff)\
+        .order_by(Transaction.deleted_at)\
+        .limit(chunk_rows)
+    if session.bind.dialect.name == "postgresql":
+        ids = ids.with_for_update(skip_locked=True)
+    ids = session.exec(ids).all()
+    if not ids:
+        return 0
+
+    archived_at = datetime.now()
+    # an id archived before and stored again still leaves the live table, the archive keeps its first copy
+    session.exec(upsert(session, TransactionArchive).from_select(
+        [*ARCHIVED_COLUMNS, "archived_at"],
+        select(*[getattr(Transaction, column) for column in ARCHIVED_COLUMNS], literal(archived_at)).where(Transaction.id.in_(ids))
+    ).on_conflict_do_nothing())
+    session.exec(delete(Transaction).where(Transaction.id.in_(ids)))
+    return len(ids)
+
+def compact(engine, retention: timedelta, chunk_rows: int = CHUNK_ROWS, max_chunks: int | None = None):
+    # one short transaction per chunk, so live writes never wait behind a long purge
+    cutoff = datetime.now() - retention
+    moved, chunks = 0, 0
+    while max_chunks is None or chunks < max_chunks:
+        with engine.begin() as connection:
+            count = compact_chunk(Session(bind=connection), cutoff, chunk_rows)
+        if not count:
+            break
+        moved += count
+        chunks += 1
+    return moved
+
+async def compact_periodically(engine, retention: timedelta, interval_seconds: float, chunk_rows: int = CHUNK_ROWS):
+    while True:
+        cutoff = datetime.now() - retention
+        try:
+            while True:
+                async with engine.begin() as connection:
+                    count = await connection.run_sync(lambda sync_connection: compact_chunk(Session(bind=sync_connection), cutoff, chunk_rows))
+                if not count:
+                    break
+        except Exception:
+            # a failed pass is retried on the next interval instead of ending the task
+            log.exception("compacting deleted transactions failed")
+        await asyncio.sleep(interval_seconds)
+
+def main(argv=None):
+    from db_config import start_db_engine
+
+    parser = argparse.ArgumentParser(description="Move soft-deleted transactions past the retention window into transaction_archive.")
+    parser.add_argument("--db-url", default=None)
+    parser.add_argument("--retention-days", type=int, default=retention_days() or 30)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--max-chunks", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    engine = start_db_engine(args.db_url)
+    moved = compact(engine, timedelta(days=args.retention_days), args.chunk_rows, args.max_chunks)
+    print(f"archived {moved} deleted transactions")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
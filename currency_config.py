@@ -3,5 +3,6 @@ from uuid import UUID, uuid4
 
 class Currency(SQLModel, table=True):
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    currency: str 
-    country: str
\ No newline at end of file
+    currency: str = Field(index=True, unique=True)
+    country: str
+    exponent: int = 2
@@ -0,0 +1,44 @@
+import asyncio
+import time
+from collections import defaultdict
+from sqlmodel import Session, select
+from currency_config import Currency
+
+class CurrencyRegistry:
+    def __init__(self):
+        self.exponents = {}
+        self.loaded_at = None
+
+    @property
+    def currencies(self):
+        return frozenset(self.exponents)
+
+    def refresh(self, session: Session):
+        self.exponents = dict(session.exec(select(Currency.currency, Currency.exponent)).all())
+        self.loaded_at = time.monotonic()
+
+    def add(self, currency: str, exponent: int):
+        self.exponents = {**self.exponents, currency: exponent}
+
+    def valid_currencies(self, session: Session, currencies: set[str]):
+        if self.loaded_at is None:
+            self.refresh(session)
+        # unknown codes may have been registered by another worker since the last refresh
+        missing = currencies - self.exponents.keys()
+        if missing:
+            found = session.exec(select(Currency.currency, Currency.exponent).where(Currency.currency.in_(missing))).all()
+            self.exponents = {**self.exponents, **dict(found)}
+        return {currency: self.exponents[currency] for currency in currencies if currency in self.exponents}
+
+    def exponent_groups(self, session: Session):
+        if self.loaded_at is None:
+            self.refresh(session)
+        groups = defaultdict(list)
+        for currency, exponent in self.exponents.items():
+            groups[exponent].append(currency)
+        return groups
+
+async def refresh_periodically(repository, interval_seconds: float):
+    while True:
+        await asyncio.sleep(interval_seconds)
+        await repository.refresh_currencies()
@@ -0,0 +1,74 @@
+import json
+import time
+from contextvars import ContextVar
+from datetime import date
+from decimal import Decimal
+from uuid import UUID
+from fastapi.responses import Response
+from pydantic import BaseModel
+from money import format_minor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# seconds spent encoding the current request's body, MetricsMiddleware sets it per request. rows encoded inside
+# a Repository call add to it as well as what the response class renders
+current_serialization = ContextVar("current_serialization", default=None)
+
+def record_serialization(started: float):
+    timing = current_serialization.get()
+    if timing is not None:
+        timing[0] += time.perf_counter() - started
+
+def _default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (UUID, Decimal)):
+        return str(value)
+    raise TypeError(f"cannot encode {type(value).__name__} as JSON")
+
+def dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(value, separators=(",", ":"), default=_default).encode()
+
+class EncodedRows:
+    # a JSON array already encoded to bytes, spliced into the response body as is
+    __slots__ = ("body", "count")
+
+    def __init__(self, body: bytes, count: int):
+        self.body = body
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+def encode_transactions(rows, exponents: dict[str, int]) -> EncodedRows:
+    # rows are (id, amount_minor, currency, user_id, date, deleted) tuples, encoded the way TransactionResponse would be
+    started = time.perf_counter()
+    encoded = EncodedRows(dumps([
+        {
+            "id": id,
+            "amount": format_minor(amount_minor, exponents[currency]),
+            "currency": currency,
+            "user_id": user_id,
+            "date": day,
+            "deleted": deleted
+        } for id, amount_minor, currency, user_id, day, deleted in rows
+    ]), len(rows))
+    record_serialization(started)
+    return encoded
+
+def json_response(status_code: int = 200, **fields) -> Response:
+    started = time.perf_counter()
+    parts = [
+        dumps(key) + b":" + (value.body if isinstance(value, EncodedRows) else dumps(value))
+        for key, value in fields.items()
+    ]
+    body = b"{" + b",".join(parts) + b"}"
+    record_serialization(started)
+    return Response(body, status_code=status_code, media_type="application/json")
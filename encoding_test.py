@@ -0,0 +1,45 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+from unittest import TestCase
+from unittest.mock import patch
+from uuid import uuid4
+import encoding
+from encoding import encode_transactions, json_response
+from requests import TransactionResponse
+
+ROWS = [
+    (uuid4(), 150, "TEST1", "1", datetime(2025, 5, 5, 9, 0), False),
+    (uuid4(), -7, "TEST0", "2", datetime(2025, 5, 5, 9, 0, 0, 123000), True)
+]
+EXPONENTS = {"TEST1": 2, "TEST0": 0}
+
+def as_responses(rows):
+    return [
+        TransactionResponse(id=id, amount=Decimal(minor).scaleb(-EXPONENTS[currency]), currency=currency, user_id=user_id, date=day, deleted=deleted)
+        for id, minor, currency, user_id, day, deleted in rows
+    ]
+
+class TestEncoding(TestCase):
+    def test_rows_encode_like_transaction_responses(self):
+        expected = [json.loads(response.model_dump_json()) for response in as_responses(ROWS)]
+
+        encoded = encode_transactions(ROWS, EXPONENTS)
+        self.assertEqual(json.loads(encoded.body), expected)
+        self.assertEqual(len(encoded), 2)
+
+        with patch.object(encoding, "orjson", None):
+            self.assertEqual(json.loads(encode_transactions(ROWS, EXPONENTS).body), expected)
+
+    def test_response_splices_encoded_rows(self):
+        response = json_response(transactions=encode_transactions(ROWS[:1], EXPONENTS), next_cursor=None)
+
+        body = json.loads(response.body)
+        self.assertEqual(body["transactions"][0]["amount"], "1.50")
+        self.assertIsNone(body["next_cursor"])
+        self.assertEqual(response.media_type, "application/json")
+
+    def test_response_encodes_model_lists(self):
+        response = json_response(transactions=as_responses(ROWS[1:]))
+
+        self.assertEqual(json.loads(response.body)["transactions"][0]["amount"], "-7")
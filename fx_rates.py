@@ -0,0 +1,129 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import Numeric
+from sqlmodel import Field, SQLModel, Session, select
+from aggregates import upsert
+
+LOAD_BATCH_SIZE = 5000
+CSV_FIELDS = ["day", "base", "quote", "rate"]
+RATE_PLACES = 12
+
+class FxRate(SQLModel, table=True):
+    __tablename__ = "fx_rate"
+
+    # key order serves both the per-day join and the latest-rate-before-a-day lookup
+    base: str = Field(primary_key=True)
+    quote: str = Field(primary_key=True)
+    day: date = Field(primary_key=True)
+    # units of quote per one unit of base, exact so amounts are never multiplied in floating point
+    rate: Decimal = Field(sa_type=Numeric(24, RATE_PLACES))
+
+def read_rates(path: str):
+    rates = {}
+    with open(path, newline="") as file:
+        reader = csv.DictReader(file)
+        missing = set(CSV_FIELDS) - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"fx rate file {path} is missing columns {missing}, expected {CSV_FIELDS}")
+        for line_no, row in enumerate(reader, start=2):
+            try:
+                day, base, quote, rate = date.fromisoformat(row["day"]), row["base"].strip(), row["quote"].strip(), Decimal(row["rate"])
+            except (ValueError, InvalidOperation) as e:
+                raise ValueError(f"fx rate file {path} line {line_no}: {e}")
+            if not rate.is_finite() or rate <= 0:
+                raise ValueError(f"fx rate file {path} line {line_no}: rate must be positive")
+            rates[(base, quote, day)] = rate
+    # a pair listed one way can be converted both ways, explicit rates win over inverted ones
+    for (base, quote, day), rate in list(rates.items()):
+        rates.setdefault((quote, base, day), (1 / rate).quantize(Decimal(1).scaleb(-RATE_PLACES)))
+    return rates
+
+def load_rates(session: Session, path: str, batch_size: int = LOAD_BATCH_SIZE):
+    rows = [{"base": base, "quote": quote, "day": day, "rate": rate} for (base, quote, day), rate in read_rates(path).items()]
+    for i in range(0, len(rows), batch_size):
+        stmt = upsert(session, FxRate).values(rows[i:i + batch_size])
+        stmt = stmt.on_conflict_do_update(index_elements=[FxRate.base, FxRate.quote, FxRate.day], set_={"rate": stmt.excluded.rate})
+        session.exec(stmt)
+    return len(rows)
+
+class RateCache:
+    # bounded LRU of the latest rate on or before a day. load_fx_rates clears it in its own process, entries
+    # also expire after ttl_seconds so rates loaded by another worker or the cli are picked up
+    def __init__(self, max_entries: int | None = None, ttl_seconds: float | None = None, clock=time.monotonic):
+        self.max_entries = max_entries or int(os.environ.get("FX_RATE_CACHE_SIZE", 10000))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.environ.get("FX_RATE_CACHE_SECONDS", 60))
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def rate(self, session: Session, base: str, quote: str, day: date):
+        if base == quote:
+            return Decimal(1)
+        key = (base, quote, day)
+        if key in self.entries:
+            expires_at, rate = self.entries[key]
+            if expires_at > self.clock():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return rate
+            del self.entries[key]
+            self.expirations += 1
+
+        self.misses += 1
+        stmt = select(FxRate.rate)\
+            .where(FxRate.base == base)\
+            .where(FxRate.quote == quote)\
+            .where(FxRate.day <= day)\
+            .order_by(FxRate.day.desc())\
+            .limit(1)
+        rate = session.exec(stmt).first()
+        if rate is None:
+            # not cached, so a rate loaded later is picked up
+            return None
+        self.entries[key] = (self.clock() + self.ttl_seconds, rate)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return rate
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+def main(argv=None):
+    from db_config import start_db_engine
+
+    parser = argparse.ArgumentParser(description="Load daily FX rates from a csv file with day,base,quote,rate columns.")
+    parser.add_argument("path")
+    parser.add_argument("--db-url", default=None)
+    parser.add_argument("--batch-size", type=int, default=LOAD_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    engine = start_db_engine(args.db_url)
+    with Session(engine) as session:
+        rows = load_rates(session, args.path, args.batch_size)
+        session.commit()
+    print(f"loaded {rows} fx rates")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+import os
+import tempfile
+from datetime import date
+from decimal import Decimal
+from unittest import TestCase
+from sqlmodel import Session, delete
+from db_config import start_db_engine
+from fx_rates import FxRate, RateCache, load_rates, read_rates
+
+engine = start_db_engine()
+
+class TestFxRates(TestCase):
+    def setUp(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as file:
+            file.write("day,base,quote,rate\n2024-01-01,EUR,USD,1.25\n2024-01-01,USD,EUR,0.79\n2024-01-03,EUR,USD,1.5\n")
+        self.path = file.name
+
+    def tearDown(self):
+        os.remove(self.path)
+        with Session(engine) as session:
+            session.exec(delete(FxRate))
+            session.commit()
+
+    def test_read_rates_adds_missing_inverses(self):
+        rates = read_rates(self.path)
+
+        self.assertEqual(rates[("USD", "EUR", date(2024, 1, 1))], Decimal("0.79"))
+        self.assertEqual(rates[("USD", "EUR", date(2024, 1, 3))], Decimal("0.666666666667"))
+
+    def test_read_rates_rejects_bad_rows(self):
+        with open(self.path, "a") as file:
+            file.write("2024-01-04,EUR,USD,-1\n")
+        with self.assertRaises(ValueError) as context:
+            read_rates(self.path)
+        self.assertIn("line 5", str(context.exception))
+
+    def test_cache_returns_latest_earlier_rate_and_stays_bounded(self):
+        cache = RateCache(max_entries=2)
+        with Session(engine) as session:
+            load_rates(session, self.path)
+            session.commit()
+
+            self.assertEqual(cache.rate(session, "EUR", "USD", date(2024, 1, 2)), 1.25)
+            self.assertEqual(cache.rate(session, "EUR", "USD", date(2024, 1, 5)), 1.5)
+            self.assertEqual(cache.rate(session, "EUR", "USD", date(2024, 1, 2)), 1.25)
+            self.assertEqual(cache.rate(session, "USD", "EUR", date(2024, 1, 1)), Decimal("0.79"))
+            self.assertIsNone(cache.rate(session, "EUR", "USD", date(2023, 12, 31)))
+            self.assertEqual(cache.rate(session, "EUR", "EUR", date(2023, 12, 31)), 1.0)
+
+        self.assertEqual(cache.stats()["entries"], 2)
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (1, 4, 1))
+
+    def test_cached_rates_expire_so_rates_loaded_elsewhere_are_seen(self):
+        now = [0.0]
+        cache = RateCache(ttl_seconds=60, clock=lambda: now[0])
+        with Session(engine) as session:
+            load_rates(session, self.path)
+            session.commit()
+            self.assertEqual(cache.rate(session, "EUR", "USD", date(2024, 1, 5)), Decimal("1.5"))
+
+            # another process loads a newer rate without clearing this cache
+            with open(self.path, "a") as file:
+                file.write("2024-01-04,EUR,USD,2\n")
+            load_rates(session, self.path)
+            session.commit()
+            self.assertEqual(cache.rate(session, "EUR", "USD", date(2024, 1, 5)), Decimal("1.5"))
+            now[0] = 61
+            self.assertEqual(cache.rate(session, "EUR", "USD", date(2024, 1, 5)), Decimal("2"))
+
+        self.assertEqual(cache.stats()["expirations"], 1)
@@ -0,0 +1,107 @@
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from bulk_ingest import parse_ndjson
+from db_config import start_db_engine
+from repository import Repository, Status
+
+def read_chunks(path: str, offset: int = 0, chunk_lines: int = 5000):
+    with open(path, "rb") as file:
+        file.seek(offset)
+        while True:
+            lines = list(islice(file, chunk_lines))
+            if not lines:
+                return
+            offset += sum(len(line) for line in lines)
+            yield offset, [line.decode() for line in lines]
+
+def parse_chunk(lines: list[str]):
+    # line_nos keeps each parsed transaction's line so rows the database rejects are reported like parse errors
+    transactions, line_nos, rejects = [], [], []
+    for line_no, transaction, error in parse_ndjson(lines):
+        if error:
+            rejects.append((line_no, error))
+        else:
+            transactions.append(transaction)
+            line_nos.append(line_no)
+    return transactions, line_nos, rejects
+
+def parsed_chunks(chunks, workers: int):
+    if workers <= 0:
+        for end_offset, lines in chunks:
+            yield end_offset, len(lines), parse_chunk(lines)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for end_offset, lines in chunks:
+            pending.append((end_offset, len(lines), pool.submit(parse_chunk, lines)))
+            if len(pending) >= workers * 2:
+                end_offset, line_count, future = pending.popleft()
+                yield end_offset, line_count, future.result()
+        while pending:
+            end_offset, line_count, future = pending.popleft()
+            yield end_offset, line_count, future.result()
+
+def read_checkpoint(path: str):
+    if not os.path.exists(path):
+        return 0
+    with open(path) as file:
+        return int(file.read().strip() or 0)
+
+def write_checkpoint(path: str, offset: int):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as file:
+        file.write(str(offset))
+    os.replace(tmp_path, path)
+
+def load(repository: Repository, path: str, offset: int, batch_size: int, workers: int, checkpoint: str):
+    started = time.perf_counter()
+    loaded, duplicates, rejected, lines_read = 0, 0, 0, 0
+
+    for end_offset, line_count, (transactions, line_nos, rejects) in parsed_chunks(read_chunks(path, offset, batch_size), workers):
+        if transactions:
+            # rows with an unknown currency or too many decimal places are rejected one by one, only a failure
+            # of the whole batch stops the load
+            response = repository.bulk_create_transactions(transactions)
+            if response["status"] == Status.FAILURE:
+                print(f"batch ending at byte {end_offset} failed: {response['message']}", file=sys.stderr)
+                print(f"resume with --offset {read_checkpoint(checkpoint)}", file=sys.stderr)
+                return False
+            loaded += response["inserted"]
+            duplicates += response["duplicates"]
+            rejects = sorted(rejects + [(line_nos[index], error) for index, error in response["rejects"]])
+        for line_no, error in rejects:
+            print(f"line {lines_read + line_no} (from offset {offset}) rejected: {error}", file=sys.stderr)
+        rejected += len(rejects)
+        lines_read += line_count
+        write_checkpoint(checkpoint, end_offset)
+
+    elapsed = time.perf_counter() - started
+    rate = loaded / elapsed if elapsed else 0.0
+    print(f"loaded {loaded} rows, skipped {duplicates} duplicates, rejected {rejected} rows in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load a JSONL file of transaction requests into the database.")
+    parser.add_argument("path", help="JSONL file with one TransactionRequest per line")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per bulk_create_transactions call")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="parser processes, 0 parses in-process")
+    parser.add_argument("--offset", type=int, default=None, help="byte offset to start from, defaults to the checkpoint")
+    parser.add_argument("--checkpoint", default=None, help="checkpoint file, defaults to <path>.offset")
+    parser.add_argument("--db-url", default=None)
+    args = parser.parse_args(argv)
+
+    checkpoint = args.checkpoint or f"{args.path}.offset"
+    offset = args.offset if args.offset is not None else read_checkpoint(checkpoint)
+    engine = start_db_engine(args.db_url)
+
+    succeeded = load(Repository(engine), args.path, offset, args.batch_size, args.workers, checkpoint)
+    return 0 if succeeded else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import io
+import os
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import TestCase
+from sqlmodel import Session, delete
+from aggregates import CurrencyTotal, DailyRollup
+from currency_config import Currency
+from db_config import start_db_engine
+from loader import load, read_chunks, parse_chunk, parsed_chunks, read_checkpoint, write_checkpoint
+from repository import Repository
+from Transaction import Transaction
+
+engine = start_db_engine()
+
+class TestLoader(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "transactions.jsonl")
+        with open(self.path, "w") as file:
+            for i in range(5):
+                file.write(f'{{"amount": {i}.0, "currency": "TEST1", "user_id": "{i}"}}\n')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_read_chunks_reports_end_offsets(self):
+        chunks = list(read_chunks(self.path, chunk_lines=2))
+
+        self.assertEqual([len(lines) for _, lines in chunks], [2, 2, 1])
+        self.assertEqual(chunks[-1][0], os.path.getsize(self.path))
+
+    def test_read_chunks_resumes_from_offset(self):
+        first_offset, _ = next(read_chunks(self.path, chunk_lines=2))
+        resumed = [line for _, lines in read_chunks(self.path, first_offset, chunk_lines=2) for line in lines]
+
+        self.assertEqual(len(resumed), 3)
+        self.assertIn('"user_id": "2"', resumed[0])
+
+    def test_parse_chunk_separates_rejects(self):
+        transactions, line_nos, rejects = parse_chunk(['{"amount": 1.0, "currency": "TEST1", "user_id": "1"}', '{"amount": 1.0}'])
+
+        self.assertEqual(len(transactions), 1)
+        self.assertEqual(line_nos, [1])
+        self.assertEqual(rejects[0][0], 2)
+
+    def test_parsed_chunks_keeps_file_order_with_workers(self):
+        parsed = list(parsed_chunks(read_chunks(self.path, chunk_lines=1), workers=2))
+
+        self.assertEqual([transactions[0].user_id for _, _, (transactions, _, _) in parsed], ["0", "1", "2", "3", "4"])
+
+    def test_checkpoint_round_trip(self):
+        checkpoint = os.path.join(self.dir.name, "transactions.jsonl.offset")
+        self.assertEqual(read_checkpoint(checkpoint), 0)
+        write_checkpoint(checkpoint, 123)
+        self.assertEqual(read_checkpoint(checkpoint), 123)
+
+class TestLoad(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "transactions.jsonl")
+        self.repository = Repository(engine)
+        self.repository.register_currency(Currency(currency="TEST1", country="United Kingdom"))
+        with open(self.path, "w") as file:
+            file.write('{"amount": 1.0, "currency": "TEST1", "user_id": "1"}\n')
+            file.write('{"amount": 1.0, "currency": "NOPE", "user_id": "1"}\n')
+            file.write('{"amount": 1.0}\n')
+            file.write('{"amount": 1.001, "currency": "TEST1", "user_id": "1"}\n')
+            file.write('{"amount": 2.0, "currency": "TEST1", "user_id": "1"}\n')
+
+    def tearDown(self):
+        self.dir.cleanup()
+        with Session(engine) as session:
+            for model in (Transaction, Currency, CurrencyTotal, DailyRollup):
+                session.exec(delete(model))
+            session.commit()
+
+    def test_rows_the_database_rejects_are_reported_by_line(self):
+        errors = io.StringIO()
+        with redirect_stderr(errors), redirect_stdout(io.StringIO()):
+            succeeded = load(self.repository, self.path, 0, 5, 0, os.path.join(self.dir.name, "offset"))
+
+        self.assertTrue(succeeded)
+        self.assertEqual([line.split(" (")[0] for line in errors.getvalue().splitlines()], ["line 2", "line 3", "line 4"])
+        self.assertIn("invalid currency NOPE", errors.getvalue())
+        self.assertEqual(len(self.repository.fetch_transactions()["transactions"]), 2)
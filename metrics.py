@@ -0,0 +1,260 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from encoding import EncodedRows, current_serialization, record_serialization
+
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_LOGGED_PARAMETERS = 2000
+UNMATCHED_ROUTE = "unmatched"
+OTHER_OPERATION = "other"
+
+slow_query_log = logging.getLogger("slow_query")
+current_operation = ContextVar("current_operation", default=None)
+
+def metrics_enabled():
+    return os.environ.get("METRICS", "").lower() in ("1", "true", "yes")
+
+def slow_query_seconds():
+    value = os.environ.get("SLOW_QUERY_MS")
+    return float(value) / 1000 if value else None
+
+class Histogram:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        with self.lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+
+    def samples(self, name: str, labels: str):
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+        prefix, braces = (f"{labels},", f"{{{labels}}}") if labels else ("", "")
+        cumulative = 0
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], counts):
+            cumulative += count
+            yield f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}'
+        yield f"{name}_sum{braces} {total}"
+        yield f"{name}_count{braces} {cumulative}"
+
+class OperationStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.duration = Histogram()
+        self.query_duration = Histogram()
+        self.queries = 0
+        self.rows = 0
+        self.errors = 0
+
+def returned_rows(response):
+    if isinstance(response, list):
+        return len(response)
+    if isinstance(response, dict):
+        for key in ("transactions", "results", "deleted"):
+            if isinstance(response.get(key), (list, EncodedRows)):
+                return len(response[key])
+    return 0
+
+def labels(**values):
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values.values())
+    return ",".join(f'{key}="{value}"' for key, value in zip(values, escaped))
+
+class Metrics:
+    # in-process registry rendered in the Prometheus text format, keyed by route template and Repository method
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.serialization = {}
+        self.operations = {}
+        self.slow_queries = 0
+
+    def _entry(self, table: dict, key, factory):
+        entry = table.get(key)
+        if entry is None:
+            with self.lock:
+                entry = table.setdefault(key, factory())
+        return entry
+
+    def operation(self, name: str) -> OperationStats:
+        return self._entry(self.operations, name, lambda: OperationStats(name))
+
+    def observe(self, name: str, method, *args, **kwargs):
+        # runs a Repository method with its queries attributed to it, counting the rows it returns. rows it
+        # encodes to JSON are timed as serialization, so that time is left out of the operation's duration
+        stats = self.operation(name)
+        token = current_operation.set(stats)
+        timing = current_serialization.get()
+        encoding = timing[0] if timing else 0.0
+        started = time.perf_counter()
+        try:
+            response = method(*args, **kwargs)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            current_operation.reset(token)
+            if timing:
+                encoding = timing[0] - encoding
+            stats.duration.observe(time.perf_counter() - started - encoding)
+        stats.rows += returned_rows(response)
+        return response
+
+    def observe_rows(self, name: str, method, *args, **kwargs):
+        # a chunk of a streamed result, its queries and rows belong to the call that opened the stream
+        stats = self.operation(name)
+        token = current_operation.set(stats)
+        try:
+            rows = method(*args, **kwargs)
+        finally:
+            current_operation.reset(token)
+        stats.rows += len(rows)
+        return rows
+
+    def record_query(self, seconds: float):
+        stats = current_operation.get() or self.operation(OTHER_OPERATION)
+        stats.queries += 1
+        stats.query_duration.observe(seconds)
+
+    def record_request(self, method: str, route: str, status: int, seconds: float, serialization_seconds: float | None):
+        self._entry(self.requests, (method, route, status), Histogram).observe(seconds)
+        if serialization_seconds is not None:
+            self._entry(self.serialization, route, Histogram).observe(serialization_seconds)
+
+    def render(self, pool: dict | None = None):
+        with self.lock:
+            requests, serialization, operations = sorted(self.requests.items()), sorted(self.serialization.items()), sorted(self.operations.items())
+        lines = [
+            "# HELP http_request_duration_seconds Time from receiving a request to sending the last body chunk.",
+            "# TYPE http_request_duration_seconds histogram"
+        ]
+        for (method, route, status), histogram in requests:
+            lines.extend(histogram.samples("http_request_duration_seconds", labels(method=method, route=route, status=status)))
+        lines += [
+            "# HELP http_response_serialization_seconds Time spent encoding JSON response bodies.",
+            "# TYPE http_response_serialization_seconds histogram"
+        ]
+        for route, histogram in serialization:
+            lines.extend(histogram.samples("http_response_serialization_seconds", labels(route=route)))
+        lines += [
+            "# HELP repository_operation_duration_seconds Time spent in each Repository method.",
+            "# TYPE repository_operation_duration_seconds histogram"
+        ]
+        for name, stats in operations:
+            lines.extend(stats.duration.samples("repository_operation_duration_seconds", labels(operation=name)))
+        lines += [
+            "# HELP repository_query_duration_seconds Time spent executing each SQL statement, by the Repository method that issued it.",
+            "# TYPE repository_query_duration_seconds histogram"
+        ]
+        for name, stats in operations:
+            lines.extend(stats.query_duration.samples("repository_query_duration_seconds", labels(operation=name)))
+        for metric, attribute, description in (
+            ("repository_queries_total", "queries", "SQL statements executed"),
+            ("repository_rows_total", "rows", "Rows returned to callers"),
+            ("repository_errors_total", "errors", "Calls that raised")
+        ):
+            lines += [f"# HELP {metric} {description}, by Repository method.", f"# TYPE {metric} counter"]
+            lines.extend(f"{metric}{{{labels(operation=name)}}} {getattr(stats, attribute)}" for name, stats in operations)
+        lines += [
+            "# HELP slow_queries_total Statements slower than SLOW_QUERY_MS.",
+            "# TYPE slow_queries_total counter",
+            f"slow_queries_total {self.slow_queries}"
+        ]
+
+        if pool and "checkouts" in pool:
+            lines += [
+                "# HELP db_pool_checkout_wait_seconds Time spent waiting for a pooled connection.",
+                "# TYPE db_pool_checkout_wait_seconds histogram"
+            ]
+            cumulative = 0
+            for bound, count in pool["checkout_wait_buckets"].items():
+                cumulative += count
+                lines.append(f'db_pool_checkout_wait_seconds_bucket{{le="{bound}"}} {cumulative}')
+            lines += [
+                f"db_pool_checkout_wait_seconds_sum {pool['checkout_wait_seconds_total']}",
+                f"db_pool_checkout_wait_seconds_count {pool['checkouts']}",
+                "# TYPE db_pool_checkout_timeouts_total counter",
+                f"db_pool_checkout_timeouts_total {pool['checkout_timeouts']}",
+                "# HELP db_pool_connect_seconds Time spent opening new connections, not counted as checkout wait.",
+                "# TYPE db_pool_connect_seconds summary",
+                f"db_pool_connect_seconds_sum {pool['connect_seconds_total']}",
+                f"db_pool_connect_seconds_count {pool['connects']}"
+            ]
+        if pool and "checked_out" in pool:
+            lines += ["# TYPE db_pool_checked_out gauge", f"db_pool_checked_out {pool['checked_out']}"]
+        return "\n".join(lines) + "\n"
+
+def instrument_engine(engine, metrics: Metrics | None = None, slow_seconds: float | None = None):
+    # times every statement on the engine's connections; takes the sync engine behind an async one
+    if metrics is None and slow_seconds is None:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def stop_timer(connection, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - connection.info["query_started"].pop()
+        if metrics is not None:
+            metrics.record_query(elapsed)
+        if slow_seconds is not None and elapsed >= slow_seconds:
+            if metrics is not None:
+                metrics.slow_queries += 1
+            operation = current_operation.get()
+            slow_query_log.warning(
+                "slow query took %.1fms in %s: %s parameters=%s",
+                elapsed * 1000, operation.name if operation else OTHER_OPERATION, statement, repr(parameters)[:MAX_LOGGED_PARAMETERS]
+            )
+
+    @event.listens_for(engine, "handle_error")
+    def drop_timer(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+class TimedJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        timing = current_serialization.get()
+        if timing is None:
+            return super().render(content)
+        started = time.perf_counter()
+        body = super().render(content)
+        record_serialization(started)
+        return body
+
+class MetricsMiddleware:
+    # plain ASGI rather than BaseHTTPMiddleware, which would add a task per request and hide streamed bodies
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        metrics = getattr(scope["app"].state, "metrics", None) if "app" in scope else None
+        if scope["type"] != "http" or metrics is None:
+            return await self.app(scope, receive, send)
+
+        status = 500
+        timing = [0.0]
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        token = current_serialization.set(timing)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_serialization.reset(token)
+            route = scope.get("route")
+            metrics.record_request(scope["method"], route.path if route else UNMATCHED_ROUTE, status, time.perf_counter() - started, timing[0] or None)
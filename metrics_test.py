@@ -0,0 +1,89 @@
+from datetime import datetime
+from unittest import TestCase
+from uuid import uuid4
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from encoding import encode_transactions, json_response
+from metrics import Histogram, Metrics, MetricsMiddleware, TimedJSONResponse, instrument_engine
+
+class TestHistogram(TestCase):
+    def test_samples_are_cumulative(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+
+        self.assertEqual(list(histogram.samples("latency", 'route="/x"')), [
+            'latency_bucket{route="/x",le="0.1"} 2',
+            'latency_bucket{route="/x",le="1.0"} 3',
+            'latency_bucket{route="/x",le="+Inf"} 4',
+            'latency_sum{route="/x"} 2.65',
+            'latency_count{route="/x"} 4'
+        ])
+
+class TestSqlHooks(TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        self.metrics = Metrics()
+
+    def test_queries_are_attributed_to_the_running_operation(self):
+        instrument_engine(self.engine, self.metrics)
+
+        def fetch_numbers():
+            with self.engine.connect() as connection:
+                connection.execute(text("select 1"))
+                return {"transactions": connection.execute(text("select 1 union all select 2")).all()}
+        self.metrics.observe("fetch_numbers", fetch_numbers)
+        with self.engine.connect() as connection:
+            connection.execute(text("select 3"))
+
+        stats = self.metrics.operations["fetch_numbers"]
+        self.assertEqual((stats.queries, stats.rows), (2, 2))
+        self.assertEqual(self.metrics.operations["other"].queries, 1)
+        self.assertIn('repository_queries_total{operation="fetch_numbers"} 2', self.metrics.render())
+
+    def test_slow_query_log_captures_statement_and_parameters(self):
+        instrument_engine(self.engine, self.metrics, slow_seconds=0)
+
+        with self.assertLogs("slow_query") as logs:
+            self.metrics.observe("lookup", lambda: self.engine.connect().execute(text("select :value"), {"value": 42}).all())
+
+        self.assertEqual(self.metrics.slow_queries, 1)
+        self.assertIn("in lookup: select ?", logs.output[0])
+        self.assertIn("parameters=(42,)", logs.output[0])
+
+class TestMetricsMiddleware(TestCase):
+    def test_records_requests_by_route_template(self):
+        app = FastAPI(default_response_class=TimedJSONResponse)
+        app.add_middleware(MetricsMiddleware)
+        app.state.metrics = Metrics()
+
+        @app.get("/items/{item_id}")
+        async def read_item(item_id: int):
+            return {"id": item_id}
+
+        client = TestClient(app)
+        client.get("/items/1")
+        client.get("/items/2")
+        client.get("/missing")
+
+        requests = app.state.metrics.requests
+        self.assertEqual(sum(requests[("GET", "/items/{item_id}", 200)].counts), 2)
+        self.assertEqual(sum(requests[("GET", "unmatched", 404)].counts), 1)
+        self.assertEqual(sum(app.state.metrics.serialization["/items/{item_id}"].counts), 2)
+
+    def test_rows_encoded_by_the_repository_count_as_serialization(self):
+        app = FastAPI(default_response_class=TimedJSONResponse)
+        app.add_middleware(MetricsMiddleware)
+        app.state.metrics = Metrics()
+        rows = [(uuid4(), 1000, "USD", "1", datetime(2024, 1, 1), False)] * 1000
+
+        @app.get("/rows")
+        def read_rows():
+            response = app.state.metrics.observe("fetch_rows", lambda: {"transactions": encode_transactions(rows, {"USD": 2})})
+            return json_response(transactions=response["transactions"])
+
+        TestClient(app).get("/rows")
+
+        self.assertEqual(sum(app.state.metrics.serialization["/rows"].counts), 1)
+        self.assertGreater(app.state.metrics.serialization["/rows"].sum, app.state.metrics.operations["fetch_rows"].duration.sum)
@@ -0,0 +1,168 @@
+import argparse
+import sys
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import bindparam, column, inspect, select, table, text, tuple_
+from sqlmodel import create_engine
+from db_config import database_url
+from money import DEFAULT_EXPONENT
+
+# Moves the float amount columns to integer minor units without taking the service down:
+#   1. prepare   add the minor-unit columns and, on Postgres, triggers that keep both columns in sync
+#                while the previous release is still writing floats
+#   2. backfill  fill the minor-unit columns in small batches, then build the new amount index
+#   3. deploy the release that reads and writes minor units
+#   4. finalize  make the new columns NOT NULL, drop the triggers and the float columns, rebuild the aggregates
+# SQLite has no triggers or concurrent DDL here, so run every step before starting the new release.
+
+AMOUNT_COLUMNS = {
+    # table: (float column, minor-unit column, key columns)
+    "transaction": ("amount", "amount_minor", ["id"]),
+    "currency_total": ("amount", "amount_minor", ["currency"]),
+    "daily_rollup": ("total_amount", "total_minor", ["day", "user_id", "currency"])
+}
+LEGACY_INDEX = "ix_transaction_live_amount_id"
+AMOUNT_INDEX = "ix_transaction_live_amount_minor_id"
+BATCH_SIZE = 5000
+
+SYNC_FUNCTION = """
+CREATE OR REPLACE FUNCTION {table}_amount_sync() RETURNS trigger AS $$
+DECLARE
+    scale numeric := 10 ^ COALESCE((SELECT exponent FROM currency WHERE currency = NEW.currency), {default});
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        IF NEW.{minor} IS NULL THEN
+            NEW.{minor} := round(NEW.{legacy}::numeric * scale);
+        ELSIF NEW.{legacy} IS NULL THEN
+            NEW.{legacy} := NEW.{minor} / scale;
+        END IF;
+    ELSIF NEW.{legacy} IS DISTINCT FROM OLD.{legacy} AND NEW.{minor} IS NOT DISTINCT FROM OLD.{minor} THEN
+        NEW.{minor} := round(NEW.{legacy}::numeric * scale);
+    ELSIF NEW.{minor} IS DISTINCT FROM OLD.{minor} AND NEW.{legacy} IS NOT DISTINCT FROM OLD.{legacy} THEN
+        NEW.{legacy} := NEW.{minor} / scale;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+def float_to_minor(amount: float, exponent: int) -> int:
+    # repr gives the shortest decimal that round-trips, so 0.1 becomes 10 cents rather than 10.000000000000000555
+    return int(Decimal(repr(amount)).scaleb(exponent).to_integral_value(rounding=ROUND_HALF_UP))
+
+def prepare(engine):
+    with engine.begin() as connection:
+        quote = connection.dialect.identifier_preparer.quote
+        postgres = connection.dialect.name == "postgresql"
+        inspector = inspect(connection)
+        if "exponent" not in {c["name"] for c in inspector.get_columns("currency")}:
+            connection.execute(text(f"ALTER TABLE currency ADD COLUMN exponent INTEGER NOT NULL DEFAULT {DEFAULT_EXPONENT}"))
+
+        for name, (legacy, minor, _) in AMOUNT_COLUMNS.items():
+            if minor not in {c["name"] for c in inspector.get_columns(name)}:
+                connection.execute(text(f"ALTER TABLE {quote(name)} ADD COLUMN {minor} BIGINT"))
+            if postgres:
+                # the new release only writes minor units, the trigger fills the float column in for the old one
+                connection.execute(text(f"ALTER TABLE {quote(name)} ALTER COLUMN {legacy} DROP NOT NULL"))
+                connection.execute(text(SYNC_FUNCTION.format(table=name, legacy=legacy, minor=minor, default=DEFAULT_EXPONENT)))
+                connection.execute(text(f"DROP TRIGGER IF EXISTS {name}_amount_sync ON {quote(name)}"))
+                connection.execute(text(
+                    f"CREATE TRIGGER {name}_amount_sync BEFORE INSERT OR UPDATE ON {quote(name)} "
+                    f"FOR EACH ROW EXECUTE FUNCTION {name}_amount_sync()"
+                ))
+
+def backfill_table(engine, name: str, batch_size: int = BATCH_SIZE):
+    legacy, minor, keys = AMOUNT_COLUMNS[name]
+    rows = table(name, *[column(c) for c in dict.fromkeys([*keys, "currency", legacy, minor])])
+    key = tuple_(*[rows.c[k] for k in keys])
+    update = rows.update()\
+        .where(*[rows.c[k] == bindparam(f"key_{k}") for k in keys])\
+        .where(rows.c[minor].is_(None))\
+        .values({minor: bindparam("minor")})
+
+    with engine.connect() as connection:
+        exponents = dict(connection.execute(text("SELECT currency, exponent FROM currency")).all())
+
+    updated, last = 0, None
+    while True:
+        stmt = select(*[rows.c[c] for c in dict.fromkeys([*keys, "currency", legacy])])\
+            .where(rows.c[minor].is_(None))\
+            .order_by(*[rows.c[k] for k in keys])\
+            .limit(batch_size)
+        if last is not None:
+            stmt = stmt.where(key > tuple_(*last))
+        # one short transaction per batch keeps row locks brief next to live writes
+        with engine.begin() as connection:
+            batch = connection.execute(stmt).mappings().all()
+            if not batch:
+                return updated
+            connection.execute(update, [
+                {**{f"key_{k}": row[k] for k in keys}, "minor": float_to_minor(row[legacy], exponents.get(row["currency"], DEFAULT_EXPONENT))}
+                for row in batch
+            ])
+        updated += len(batch)
+        last = [batch[-1][k] for k in keys]
+
+def create_amount_index(engine):
+    with engine.connect() as connection:
+        quote = connection.dialect.identifier_preparer.quote
+        where = "WHERE deleted = false" if connection.dialect.name == "postgresql" else "WHERE deleted = 0"
+        concurrently = ""
+        if connection.dialect.name == "postgresql":
+            relkind = connection.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('transaction')")).scalar()
+            # Postgres cannot build an index concurrently on a partitioned parent
+            concurrently = "" if relkind == "p" else "CONCURRENTLY"
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        connection.execute(text(f"CREATE INDEX {concurrently} IF NOT EXISTS {AMOUNT_INDEX} ON {quote('transaction')} (amount_minor, id) {where}"))
+
+def backfill(engine, batch_size: int = BATCH_SIZE):
+    updated = {name: backfill_table(engine, name, batch_size) for name in AMOUNT_COLUMNS}
+    create_amount_index(engine)
+    return updated
+
+def finalize(engine, batch_size: int = BATCH_SIZE):
+    from repository import Repository, Status
+
+    updated = backfill(engine, batch_size)
+    with engine.begin() as connection:
+        quote = connection.dialect.identifier_preparer.quote
+        postgres = connection.dialect.name == "postgresql"
+        connection.execute(text(f"DROP INDEX IF EXISTS {LEGACY_INDEX}"))
+        for name, (legacy, minor, _) in AMOUNT_COLUMNS.items():
+            if postgres:
+                # a validated check lets SET NOT NULL skip its full-table scan under the exclusive lock
+                connection.execute(text(f"ALTER TABLE {quote(name)} ADD CONSTRAINT {name}_{minor}_not_null CHECK ({minor} IS NOT NULL) NOT VALID"))
+                connection.execute(text(f"ALTER TABLE {quote(name)} VALIDATE CONSTRAINT {name}_{minor}_not_null"))
+                connection.execute(text(f"ALTER TABLE {quote(name)} ALTER COLUMN {minor} SET NOT NULL"))
+                connection.execute(text(f"ALTER TABLE {quote(name)} DROP CONSTRAINT {name}_{minor}_not_null"))
+                connection.execute(text(f"DROP TRIGGER IF EXISTS {name}_amount_sync ON {quote(name)}"))
+                connection.execute(text(f"DROP FUNCTION IF EXISTS {name}_amount_sync()"))
+            connection.execute(text(f"ALTER TABLE {quote(name)} DROP COLUMN {legacy}"))
+
+    # the float totals drifted while both releases were writing, recompute them from the transactions
+    repository = Repository(engine)
+    for response in (repository.reconcile_currency_totals(), repository.rebuild_daily_rollup()):
+        if response["status"] == Status.FAILURE:
+            raise RuntimeError(response["message"])
+    return updated
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate float amounts to integer minor units.")
+    parser.add_argument("--db-url", default=None)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("command", choices=["prepare", "backfill", "finalize"])
+    args = parser.parse_args(argv)
+
+    # not start_db_engine, its create_schema expects the migrated columns
+    engine = create_engine(args.db_url or database_url())
+    if args.command == "prepare":
+        prepare(engine)
+        print("minor-unit columns added")
+    else:
+        steps = {"backfill": backfill, "finalize": finalize}
+        for name, rows in steps[args.command](engine, args.batch_size).items():
+            print(f"{name}: backfilled {rows} rows")
+        print(f"{args.command} complete")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
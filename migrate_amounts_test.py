@@ -0,0 +1,68 @@
+import os
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import TestCase
+from uuid import uuid4
+from sqlalchemy import inspect, text
+from sqlmodel import create_engine
+from db_config import start_db_engine
+from migrate_amounts import backfill, finalize, float_to_minor, prepare
+from repository import Repository
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE currency (id CHAR(32) PRIMARY KEY, currency VARCHAR NOT NULL UNIQUE, country VARCHAR NOT NULL)",
+    'CREATE TABLE "transaction" (id CHAR(32) PRIMARY KEY, amount FLOAT NOT NULL, currency VARCHAR NOT NULL, user_id VARCHAR NOT NULL, date DATETIME NOT NULL, deleted BOOLEAN NOT NULL)',
+    'CREATE INDEX ix_transaction_live_amount_id ON "transaction" (amount, id) WHERE deleted = 0',
+    "CREATE TABLE currency_total (currency VARCHAR PRIMARY KEY, amount FLOAT NOT NULL, transaction_count INTEGER NOT NULL)",
+    "CREATE TABLE daily_rollup (day DATE, user_id VARCHAR, currency VARCHAR, total_amount FLOAT NOT NULL, transaction_count INTEGER NOT NULL, PRIMARY KEY (day, user_id, currency))"
+]
+
+class TestMigrateAmounts(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.url = f"sqlite:///{os.path.join(self.directory.name, 'legacy.db')}"
+        self.engine = create_engine(self.url)
+        with self.engine.begin() as connection:
+            for ddl in LEGACY_SCHEMA:
+                connection.execute(text(ddl))
+            connection.execute(text("INSERT INTO currency VALUES (:id, 'GBP', 'United Kingdom')"), {"id": uuid4().hex})
+            connection.execute(
+                text('INSERT INTO "transaction" VALUES (:id, :amount, \'GBP\', \'1\', :date, 0)'),
+                [{"id": uuid4().hex, "amount": amount, "date": datetime(2024, 1, 1, 9)} for amount in (0.1, 0.2, 19.99)]
+            )
+            # floats drift, finalize recomputes the aggregates from the transactions
+            connection.execute(text("INSERT INTO currency_total VALUES ('GBP', 20.290000000000003, 3)"))
+            connection.execute(text("INSERT INTO daily_rollup VALUES (:day, '1', 'GBP', 20.29, 3)"), {"day": date(2024, 1, 1)})
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def test_float_to_minor_uses_the_shortest_decimal(self):
+        self.assertEqual(float_to_minor(0.1 + 0.2, 2), 30)
+        self.assertEqual(float_to_minor(1.005, 2), 101)
+        self.assertEqual(float_to_minor(150.0, 0), 150)
+
+    def test_backfill_in_batches_is_resumable(self):
+        prepare(self.engine)
+        prepare(self.engine)
+        self.assertEqual(backfill(self.engine, batch_size=2)["transaction"], 3)
+        self.assertEqual(backfill(self.engine, batch_size=2), {"transaction": 0, "currency_total": 0, "daily_rollup": 0})
+
+        with self.engine.connect() as connection:
+            minor = connection.execute(text('SELECT amount_minor FROM "transaction" ORDER BY amount_minor')).scalars().all()
+        self.assertEqual(minor, [10, 20, 1999])
+
+    def test_finalized_schema_serves_the_new_release(self):
+        prepare(self.engine)
+        backfill(self.engine)
+        finalize(self.engine)
+
+        columns = {c["name"] for c in inspect(self.engine).get_columns("transaction")}
+        self.assertNotIn("amount", columns)
+        repository = Repository(start_db_engine(self.url))
+        self.assertEqual(repository.fetch_total_by_currency("GBP")["amount"], Decimal("20.29"))
+        self.assertEqual(repository.get_report(groups=["DAY"])["results"], {"2024-01-01": Decimal("20.29")})
+        self.assertEqual(repository.reconcile_currency_totals()["drift"], {})
+        repository.engine.dispose()
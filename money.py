@@ -0,0 +1,35 @@
+from decimal import Decimal
+
+DEFAULT_EXPONENT = 2
+
+def to_minor(amount, exponent: int) -> int:
+    scaled = Decimal(amount).scaleb(exponent)
+    if scaled != scaled.to_integral_value():
+        raise ValueError(f"amount {amount} has more than {exponent} decimal places")
+    return int(scaled)
+
+def from_minor(minor: int, exponent: int) -> Decimal:
+    return Decimal(minor).scaleb(-exponent).quantize(Decimal(1).scaleb(-exponent))
+
+def format_minor(minor: int, exponent: int) -> str:
+    # str(from_minor(minor, exponent)) without building a Decimal
+    if not exponent:
+        return str(minor)
+    whole, fraction = divmod(abs(minor), 10 ** exponent)
+    return f"{'-' if minor < 0 else ''}{whole}.{fraction:0{exponent}d}"
+
+def minor_bounds(start, end, exponent: int):
+    # the integer range [low, high] holding every amount between start and end at this exponent
+    low = Decimal(start).scaleb(exponent).to_integral_value(rounding="ROUND_CEILING")
+    high = Decimal(end).scaleb(exponent).to_integral_value(rounding="ROUND_FLOOR")
+    return int(low), int(high)
+
+def decimal_strings(value):
+    # FastAPI encodes a bare Decimal as a float, so amounts in plain dicts are stringified first
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: decimal_strings(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decimal_strings(item) for item in value]
+    return value
@@ -0,0 +1,17 @@
+import base64
+import binascii
+import json
+
+def encode_cursor(values: list) -> str:
+    payload = json.dumps(values, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(payload)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"invalid cursor {cursor}") from e
+    if not isinstance(values, list):
+        raise ValueError(f"invalid cursor {cursor}")
+    return values
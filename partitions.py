@@ -0,0 +1,148 @@
+import argparse
+import asyncio
+import logging
+import os
+import re
+import sys
+import warnings
+from datetime import date
+from sqlalchemy import MetaData, PrimaryKeyConstraint, inspect, text
+from sqlalchemy.exc import SAWarning
+from Transaction import Transaction
+
+PARTITION_NAME = re.compile(r"_y(\d{4})m(\d{2})$")
+log = logging.getLogger("partitions")
+
+def partitioning_enabled():
+    return os.environ.get("TRANSACTION_PARTITIONING", "").lower() == "monthly"
+
+def months_ahead():
+    return int(os.environ.get("PARTITION_MONTHS_AHEAD", 3))
+
+def maintenance_seconds():
+    return float(os.environ.get("PARTITION_MAINTENANCE_SECONDS", 3600))
+
+def month_start(day: date):
+    return day.replace(day=1)
+
+def add_months(month: date, months: int):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(table: str, month: date):
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+def partition_month(table: str, name: str):
+    match = PARTITION_NAME.search(name)
+    if not name.startswith(table) or not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+def partitioned_table(name: str = Transaction.__tablename__):
+    table = Transaction.__table__.to_metadata(MetaData(), name=name)
+    with warnings.catch_warnings():
+        # a partitioned table's primary key has to include the partition key
+        warnings.simplefilter("ignore", SAWarning)
+        table.append_constraint(PrimaryKeyConstraint("id", "date"))
+    table.dialect_options["postgresql"]["partition_by"] = "RANGE (date)"
+    for index in table.indexes:
+        index.name = index.name.replace(Transaction.__tablename__, name, 1)
+    return table
+
+def create_partitioned_table(connection, table: str = Transaction.__tablename__):
+    if inspect(connection).has_table(table):
+        return False
+    quote = connection.dialect.identifier_preparer.quote
+    partitioned_table(table).create(connection)
+    connection.execute(text(f"CREATE TABLE {quote(table + '_default')} PARTITION OF {quote(table)} DEFAULT"))
+    return True
+
+def ensure_partitions(connection, first_month: date, months: int, table: str = Transaction.__tablename__):
+    quote = connection.dialect.identifier_preparer.quote
+    parent, default = quote(table), quote(table + "_default")
+    created = []
+
+    for offset in range(months):
+        start = add_months(month_start(first_month), offset)
+        end = add_months(start, 1)
+        name = partition_name(table, start)
+        if connection.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+            continue
+
+        bounds = f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        in_range = f"date >= '{start.isoformat()}' AND date < '{end.isoformat()}'"
+        stray_rows = connection.execute(text(f"SELECT 1 FROM {default} WHERE {in_range} LIMIT 1")).first()
+        if stray_rows:
+            # rows that landed in the default partition have to move before the range can be claimed
+            connection.execute(text(f"ALTER TABLE {parent} DETACH PARTITION {default}"))
+            connection.execute(text(f"CREATE TABLE {quote(name)} PARTITION OF {parent} {bounds}"))
+            connection.execute(text(f"INSERT INTO {quote(name)} SELECT * FROM {default} WHERE {in_range}"))
+            connection.execute(text(f"DELETE FROM {default} WHERE {in_range}"))
+            connection.execute(text(f"ALTER TABLE {parent} ATTACH PARTITION {default} DEFAULT"))
+        else:
+            connection.execute(text(f"CREATE TABLE {quote(name)} PARTITION OF {parent} {bounds}"))
+        created.append(name)
+    return created
+
+def attached_partitions(connection, table: str = Transaction.__tablename__):
+    stmt = text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "WHERE parent.relname = :table"
+    )
+    return [name for name in connection.execute(stmt, {"table": table}).scalars()]
+
+def detach_partitions_before(connection, cutoff: date, archive_schema: str | None = None, table: str = Transaction.__tablename__):
+    quote = connection.dialect.identifier_preparer.quote
+    if archive_schema:
+        connection.execute(text(f"CREATE SCHEMA IF NOT EXISTS {quote(archive_schema)}"))
+
+    detached = []
+    for name in sorted(attached_partitions(connection, table)):
+        month = partition_month(table, name)
+        if month is None or add_months(month, 1) > cutoff:
+            continue
+        connection.execute(text(f"ALTER TABLE {quote(table)} DETACH PARTITION {quote(name)}"))
+        if archive_schema:
+            connection.execute(text(f"ALTER TABLE {quote(name)} SET SCHEMA {quote(archive_schema)}"))
+        detached.append(name)
+    return detached
+
+async def maintain_periodically(engine, interval_seconds: float):
+    while True:
+        try:
+            async with engine.begin() as connection:
+                await connection.run_sync(lambda sync_connection: ensure_partitions(sync_connection, date.today(), months_ahead() + 1))
+        except Exception:
+            # the months created ahead leave time to retry, so a failure is logged rather than ending the task
+            log.exception("creating monthly partitions ahead failed")
+        await asyncio.sleep(interval_seconds)
+
+def main(argv=None):
+    from db_config import start_db_engine
+
+    parser = argparse.ArgumentParser(description="Manage the monthly partitions of the transaction table.")
+    parser.add_argument("--db-url", default=None)
+    commands = parser.add_subparsers(dest="command", required=True)
+    ensure = commands.add_parser("ensure", help="create monthly partitions ahead of time")
+    ensure.add_argument("--from-month", type=date.fromisoformat, default=date.today(), help="first month to cover, YYYY-MM-DD")
+    ensure.add_argument("--months", type=int, default=months_ahead() + 1)
+    detach = commands.add_parser("detach", help="detach partitions that end before a cutoff")
+    detach.add_argument("--older-than-months", type=int, required=True)
+    detach.add_argument("--archive-schema", default=None, help="move detached partitions into this schema")
+    args = parser.parse_args(argv)
+
+    engine = start_db_engine(args.db_url)
+    with engine.begin() as connection:
+        if args.command == "ensure":
+            for name in ensure_partitions(connection, args.from_month, args.months):
+                print(f"created partition {name}")
+        else:
+            cutoff = add_months(month_start(date.today()), -args.older_than_months)
+            for name in detach_partitions_before(connection, cutoff, args.archive_schema):
+                print(f"detached partition {name}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import asyncio
+from datetime import date, datetime
+from unittest import TestCase, skipUnless
+from uuid import uuid4
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+from db_config import start_db_engine
+from partitions import add_months, partition_name, partition_month, partitioned_table, create_partitioned_table, ensure_partitions, detach_partitions_before, maintain_periodically
+
+TABLE = "transaction_partition_test"
+engine = start_db_engine()
+
+class TestPartitionHelpers(TestCase):
+    def test_add_months_wraps_years(self):
+        self.assertEqual(add_months(date(2024, 11, 1), 3), date(2025, 2, 1))
+        self.assertEqual(add_months(date(2024, 1, 1), -1), date(2023, 12, 1))
+
+    def test_partition_names_round_trip(self):
+        name = partition_name("transaction", date(2024, 3, 1))
+
+        self.assertEqual(name, "transaction_y2024m03")
+        self.assertEqual(partition_month("transaction", name), date(2024, 3, 1))
+        self.assertIsNone(partition_month("transaction", "transaction_default"))
+
+    def test_partitioned_table_ddl(self):
+        table = partitioned_table(TABLE)
+        ddl = str(CreateTable(table).compile(dialect=postgresql.dialect()))
+
+        self.assertIn("PRIMARY KEY (id, date)", ddl)
+        self.assertIn("PARTITION BY RANGE (date)", ddl)
+        self.assertTrue(all(index.name.startswith(f"ix_{TABLE}_") for index in table.indexes))
+
+    def test_maintenance_keeps_running_after_a_failure(self):
+        attempts = []
+        class FailingEngine:
+            def begin(self):
+                attempts.append(1)
+                raise RuntimeError("database is down")
+
+        async def run():
+            task = asyncio.create_task(maintain_periodically(FailingEngine(), 0))
+            while len(attempts) < 3:
+                await asyncio.sleep(0)
+            task.cancel()
+
+        with self.assertLogs("partitions") as logs:
+            asyncio.run(run())
+        self.assertIn("creating monthly partitions ahead failed", logs.output[0])
+
+@skipUnless(engine.dialect.name == "postgresql", "partitioning is postgres only")
+class TestPartitions(TestCase):
+    def setUp(self):
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE IF EXISTS {TABLE} CASCADE"))
+            create_partitioned_table(connection, TABLE)
+
+    def tearDown(self):
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE IF EXISTS {TABLE} CASCADE"))
+            connection.execute(text(f"DROP TABLE IF EXISTS {partition_name(TABLE, date(2024, 1, 1))}"))
+
+    def insert(self, connection, when: datetime):
+        connection.execute(
+            text(f"INSERT INTO {TABLE} (id, amount_minor, currency, user_id, date, deleted) VALUES (:id, 100, 'USD', '1', :date, false)"),
+            {"id": uuid4(), "date": when}
+        )
+
+    def rows_in(self, connection, relation: str):
+        return connection.execute(text(f"SELECT count(*) FROM ONLY {relation}")).scalar()
+
+    def test_rows_route_to_their_month(self):
+        with engine.begin() as connection:
+            ensure_partitions(connection, date(2024, 1, 1), 2, TABLE)
+            self.insert(connection, datetime(2024, 2, 29, 23, 59))
+
+            self.assertEqual(self.rows_in(connection, partition_name(TABLE, date(2024, 2, 1))), 1)
+            self.assertEqual(self.rows_in(connection, f"{TABLE}_default"), 0)
+
+    def test_rows_in_default_move_to_new_partition(self):
+        with engine.begin() as connection:
+            self.insert(connection, datetime(2024, 5, 10))
+            self.assertEqual(ensure_partitions(connection, date(2024, 5, 1), 1, TABLE), [partition_name(TABLE, date(2024, 5, 1))])
+
+            self.assertEqual(self.rows_in(connection, partition_name(TABLE, date(2024, 5, 1))), 1)
+            self.assertEqual(self.rows_in(connection, f"{TABLE}_default"), 0)
+
+    def test_ensure_partitions_is_idempotent(self):
+        with engine.begin() as connection:
+            self.assertEqual(len(ensure_partitions(connection, date(2024, 1, 1), 3, TABLE)), 3)
+            self.assertEqual(ensure_partitions(connection, date(2024, 1, 1), 3, TABLE), [])
+
+    def test_detach_old_partitions(self):
+        with engine.begin() as connection:
+            ensure_partitions(connection, date(2024, 1, 1), 3, TABLE)
+            self.insert(connection, datetime(2024, 1, 15))
+
+            detached = detach_partitions_before(connection, date(2024, 2, 1), table=TABLE)
+
+            self.assertEqual(detached, [partition_name(TABLE, date(2024, 1, 1))])
+            self.assertEqual(connection.execute(text(f"SELECT count(*) FROM {TABLE}")).scalar(), 0)
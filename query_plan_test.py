@@ -0,0 +1,126 @@
+import json
+import os
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import TestCase, skipUnless
+from sqlalchemy import event, text
+from sqlmodel import Session, delete
+from aggregates import CurrencyTotal, DailyRollup
+from benchmarks.seed import generate_transactions
+from currency_config import Currency
+from db_config import start_db_engine
+from repository import Repository
+from Transaction import Transaction
+
+SEED_ROWS = int(os.environ.get("QUERY_PLAN_ROWS", 200000))
+CURRENCIES = ["PLAN1", "PLAN2"]
+repository = Repository(start_db_engine())
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+@skipUnless(repository.engine.dialect.name == "postgresql", "query plans are only checked on postgres")
+class TestQueryPlans(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for currency in CURRENCIES:
+            repository.register_currency(Currency(currency=currency, country="Query plan"))
+        batch = []
+        for transaction in generate_transactions(SEED_ROWS, users=20000, currencies=CURRENCIES, days=1000):
+            batch.append(transaction)
+            if len(batch) == 10000:
+                repository.bulk_create_transactions(batch)
+                batch = []
+        if batch:
+            repository.bulk_create_transactions(batch)
+        with repository.engine.connect() as connection:
+            connection.execute(text("ANALYZE"))
+            connection.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        with Session(repository.engine) as session:
+            session.exec(delete(Transaction).where(Transaction.currency.in_(CURRENCIES)))
+            session.exec(delete(CurrencyTotal).where(CurrencyTotal.currency.in_(CURRENCIES)))
+            session.exec(delete(DailyRollup).where(DailyRollup.currency.in_(CURRENCIES)))
+            session.exec(delete(Currency).where(Currency.currency.in_(CURRENCIES)))
+            session.commit()
+        super().tearDownClass()
+
+    @contextmanager
+    def captured_statements(self):
+        statements = []
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+        event.listen(repository.engine, "before_cursor_execute", capture)
+        try:
+            yield statements
+        finally:
+            event.remove(repository.engine, "before_cursor_execute", capture)
+
+    def assertNoSequentialScan(self, call):
+        with self.captured_statements() as statements:
+            response = call()
+        self.assertEqual(response["status"].name, "SUCCESS", response.get("message"))
+
+        checked = 0
+        connection = repository.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for statement, parameters in statements:
+                if not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+                    continue
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+                plan = cursor.fetchone()[0]
+                plan = plan if isinstance(plan, list) else json.loads(plan)
+                for node in plan_nodes(plan[0]["Plan"]):
+                    self.assertFalse(
+                        node["Node Type"] == "Seq Scan" and node.get("Relation Name") == Transaction.__tablename__,
+                        f"sequential scan on {Transaction.__tablename__} for:\n{statement}"
+                    )
+                checked += 1
+        finally:
+            connection.rollback()
+            connection.close()
+        self.assertGreater(checked, 0)
+
+    def sample_transaction(self):
+        with Session(repository.engine) as session:
+            return session.get(Transaction, next(generate_transactions(1, users=20000, currencies=CURRENCIES, days=1000)).id)
+
+    def test_fetch_transactions_by_date(self):
+        day = self.sample_transaction().date.date()
+        self.assertNoSequentialScan(lambda: repository.fetch_transactions_by_date(day.isoformat()))
+
+    def test_fetch_transactions_by_user_id(self):
+        self.assertNoSequentialScan(lambda: repository.fetch_transactions_by_user_id("42"))
+
+    def test_fetch_transactions_within_amount_range(self):
+        self.assertNoSequentialScan(lambda: repository.fetch_transactions_within_amount_range(Decimal(100), Decimal(101)))
+
+    def test_paginated_transactions_by_amount(self):
+        first_page = repository.paginated_transactions_by_amount(Decimal(100), Decimal(5000), None, 100)
+        self.assertNoSequentialScan(lambda: repository.paginated_transactions_by_amount(Decimal(100), Decimal(5000), first_page["next_cursor"], 100))
+
+    def test_summarize_amount_range(self):
+        self.assertNoSequentialScan(lambda: repository.summarize_amount_range(Decimal(100), Decimal(101), buckets=10))
+
+    def test_paginated_transactions(self):
+        self.assertNoSequentialScan(lambda: repository.paginated_transactions(0, 10))
+
+    def test_paginated_transactions_by_cursor(self):
+        first_page = repository.paginated_transactions_by_cursor(None, 10)
+        self.assertNoSequentialScan(lambda: repository.paginated_transactions_by_cursor(first_page["next_cursor"], 10))
+
+    def test_get_report_for_date_range(self):
+        start = (date.today() - timedelta(days=7)).isoformat()
+        end = date.today().isoformat()
+        self.assertNoSequentialScan(lambda: repository.get_report(start, end, ["USER", "CURRENCY"]))
+
+    def test_delete_transaction(self):
+        transaction = self.sample_transaction()
+        self.assertNoSequentialScan(lambda: repository.delete_transaction(transaction.id))
@@ -0,0 +1,33 @@
+import argparse
+import sys
+from db_config import start_db_engine
+from repository import Repository, Status
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the running currency totals and the daily rollup from the transaction table and report drift.")
+    parser.add_argument("--db-url", default=None)
+    args = parser.parse_args(argv)
+
+    repository = Repository(start_db_engine(args.db_url))
+    response = repository.reconcile_currency_totals()
+    if response["status"] == Status.FAILURE:
+        print(response["message"], file=sys.stderr)
+        return 1
+
+    if not response["drift"]:
+        print("currency totals are in sync")
+    for currency, drift in sorted(response["drift"].items()):
+        print(
+            f"{currency}: stored {drift['stored_amount_minor']} minor units over {drift['stored_count']} transactions, "
+            f"actual {drift['actual_amount_minor']} minor units over {drift['actual_count']} transactions"
+        )
+
+    response = repository.rebuild_daily_rollup()
+    if response["status"] == Status.FAILURE:
+        print(response["message"], file=sys.stderr)
+        return 1
+    print(f"daily rollup rebuilt with {response['rows']} rows")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
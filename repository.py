@@ -1,10 +1,33 @@
-from db_config import start_db_engine
-from sqlmodel import Session, select, func, update, insert as create
+from sqlmodel import Session, select, func, update, delete, insert as create
+from sqlalchemy import BigInteger, Date, Integer, Numeric, and_, case, cast, false, literal, literal_column, or_, true, tuple_, text, union_all
+from sqlalchemy.util import await_only
 from Transaction import Transaction
 from enum import Enum
-from datetime import date
-from uuid import UUID
+from datetime import date, datetime, time, timedelta
+from uuid import UUID, uuid4
 from currency_config import Currency
+from pagination import encode_cursor, decode_cursor
+from aggregates import CurrencyTotal, DailyRollup, apply_transaction_deltas, upsert
+from compaction import TransactionArchive
+from partitions import partitioning_enabled
+from currency_registry import CurrencyRegistry
+from fx_rates import FxRate, RateCache, load_rates
+from money import DEFAULT_EXPONENT, to_minor, from_minor, minor_bounds
+from requests import TransactionResponse
+from encoding import encode_transactions
+from collections import defaultdict
+from decimal import ROUND_CEILING, Decimal
+import csv
+import io
+
+STREAM_CHUNK_SIZE = 1000
+INSERT_CHUNK_ROWS = 1000
+DELETE_CHUNK_ROWS = 5000
+COPY_COLUMNS = ["id", "amount_minor", "currency", "user_id", "date", "deleted"]
+# reads select plain columns, so rows come back as tuples without building ORM instances
+TRANSACTION_COLUMNS = [Transaction.id, Transaction.amount_minor, Transaction.currency, Transaction.user_id, Transaction.date, Transaction.deleted]
+STAGING_TABLE = "transaction_staging"
+INSERTED, DUPLICATE, REJECTED = "inserted", "duplicate", "rejected"
 
 class Status(Enum):
     SUCCESS=0
@@ -13,20 +36,36 @@ class Status(Enum):
 class GroupBy(Enum):
     USER=0
     DAY=1
-    CURRENCY=2    
+    CURRENCY=2
+    HOUR=3
+    WEEK=4
+    MONTH=5
+
+REPORT_COLUMNS = {GroupBy.USER: "user_id", GroupBy.DAY: "date", GroupBy.CURRENCY: "currency", GroupBy.HOUR: "hour", GroupBy.WEEK: "week", GroupBy.MONTH: "month"}
+# buckets are keyed by their start: hours as 2025-05-05T09:00, weeks by their monday, months as 2025-05
+BUCKET_LABELS = {
+    GroupBy.HOUR: lambda value: str(value)[:16].replace(" ", "T"),
+    GroupBy.DAY: str,
+    GroupBy.WEEK: lambda value: str(value)[:10],
+    GroupBy.MONTH: lambda value: str(value)[:7]
+}
+
+def rolling_average(total: Decimal, count: int):
+    return (total / count).quantize(total) if count else None
 
 
 class Repository:
-    def __init__(self, engine=start_db_engine()) -> Status:
+    def __init__(self, engine, currency_registry: CurrencyRegistry | None = None, rate_cache: RateCache | None = None):
         self.engine = engine
+        self.currency_registry = currency_registry or CurrencyRegistry()
+        self.rate_cache = rate_cache or RateCache()
 
     def create_transactions(self, transactions:list[any]):
         with Session(self.engine) as session:  
             try:      
                 currencies = {tx.currency for tx in transactions}
-                stmt = select(Currency).where(Currency.currency.in_(currencies))
-                valid_currencies = {c.currency for c in session.exec(stmt)}
-                invalid_currencies = currencies - valid_currencies
+                valid_currencies = self.currency_registry.valid_currencies(session, currencies)
+                invalid_currencies = currencies - valid_currencies.keys()
                 
                 if invalid_currencies:
                     return {
@@ -34,20 +73,26 @@ class Repository:
                         "message": f"transaction failed because there are/is invalid currencies {invalid_currencies}."
                     }
                     
-                session.add_all([
-                    Transaction(
-                        id=tx.id,
-                        amount=tx.amount,
-                        currency=tx.currency,
-                        user_id=tx.user_id,
-                        date=tx.date
-                    ) for tx in transactions
-                ]) 
+                rows = [
+                    {
+                        "id": tx.id or uuid4(),
+                        "amount_minor": to_minor(tx.amount, valid_currencies[tx.currency]),
+                        "currency": tx.currency,
+                        "user_id": tx.user_id,
+                        "date": tx.date,
+                        "deleted": False
+                    } for tx in transactions
+                ]
+                inserted = self._insert_new(session, rows)
+                apply_transaction_deltas(session, [row for row, new in zip(rows, inserted) if new])
                 session.commit()    
 
                 return {
                     "status": Status.SUCCESS,
-                    "message": f"transactions {transactions} submitted successfully."
+                    "message": f"{len(transactions)} transactions submitted successfully.",
+                    "inserted": sum(inserted),
+                    "duplicates": len(rows) - sum(inserted),
+                    "results": [INSERTED if new else DUPLICATE for new in inserted]
                 }     
             except Exception as e:
                 session.rollback()
@@ -56,20 +101,149 @@ class Repository:
                     "message": f"transaction failed due to {e}"
                 }   
 
+    def bulk_create_transactions(self, transactions:list[any]):
+        with Session(self.engine) as session:
+            try:
+                valid_currencies = self.currency_registry.valid_currencies(session, {tx.currency for tx in transactions})
+
+                rows, indexes, rejects = [], [], []
+                results = [REJECTED] * len(transactions)
+                for index, tx in enumerate(transactions):
+                    try:
+                        rows.append(self._row(tx, valid_currencies))
+                    except ValueError as e:
+                        rejects.append((index, str(e)))
+                        continue
+                    indexes.append(index)
+
+                inserted = self._insert_new(session, rows) if rows else []
+                apply_transaction_deltas(session, [row for row, new in zip(rows, inserted) if new])
+                session.commit()
+
+                for index, new in zip(indexes, inserted):
+                    results[index] = INSERTED if new else DUPLICATE
+                return {
+                    "status": Status.SUCCESS,
+                    "inserted": sum(inserted),
+                    "duplicates": len(rows) - sum(inserted),
+                    "rejects": rejects,
+                    "results": results
+                }
+            except Exception as e:
+                session.rollback()
+                return {
+                    "status": Status.FAILURE,
+                    "message": f"bulk transaction insert failed due to {e}"
+                }
+
+    def validate_transactions(self, transactions: list[any]):
+        # the per-row checks of bulk_create_transactions, for callers that answer before the insert runs
+        with Session(self.engine) as session:
+            try:
+                valid_currencies = self.currency_registry.valid_currencies(session, {tx.currency for tx in transactions})
+            except Exception as e:
+                return {"status": Status.FAILURE, "message": f"validating transactions failed due to {e}"}
+        rejects = []
+        for index, tx in enumerate(transactions):
+            try:
+                self._row(tx, valid_currencies)
+            except ValueError as e:
+                rejects.append((index, str(e)))
+        return {"status": Status.SUCCESS, "rejects": rejects}
+
+    def _row(self, tx, valid_currencies: dict[str, int]):
+        if tx.currency not in valid_currencies:
+            raise ValueError(f"invalid currency {tx.currency}")
+        return {
+            "id": tx.id or uuid4(),
+            "amount_minor": to_minor(tx.amount, valid_currencies[tx.currency]),
+            "currency": tx.currency,
+            "user_id": tx.user_id,
+            "date": tx.date,
+            "deleted": False
+        }
+
+    def _insert_new(self, session: Session, rows: list[dict]):
+        # ids are idempotency keys: a row whose id is already stored, already archived by compaction, or repeats
+        # an earlier row of the batch, is a duplicate and skipped without a per-row lookup
+        first = {}
+        for row in rows:
+            first.setdefault(row["id"], row)
+        unique = list(first.values())
+
+        driver = session.bind.dialect.driver
+        if driver in ("psycopg2", "asyncpg"):
+            # COPY cannot skip conflicts, so it fills a staging table that is merged with one INSERT .. SELECT
+            table = session.bind.dialect.identifier_preparer.format_table(Transaction.__table__)
+            session.exec(text(f"CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"))
+            if driver == "psycopg2":
+                self._copy_transactions(session, unique, STAGING_TABLE)
+            else:
+                self._copy_records(session, unique, STAGING_TABLE)
+            columns = ", ".join(COPY_COLUMNS)
+            archive = session.bind.dialect.identifier_preparer.format_table(TransactionArchive.__table__)
+            stored = [archive]
+            if partitioning_enabled():
+                # the partitioned key is (id, date), so ON CONFLICT alone would store a retry with another date
+                # again. this check sees committed rows, two batches carrying the same id at once can still both land
+                stored.append(table)
+            exists = " ".join(f"AND NOT EXISTS (SELECT 1 FROM {stored_table} stored WHERE stored.id = staged.id)" for stored_table in stored)
+            stmt = text(
+                f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {STAGING_TABLE} staged WHERE true {exists} "
+                "ON CONFLICT DO NOTHING RETURNING id"
+            )
+            inserted_ids = set(session.exec(stmt.columns(Transaction.__table__.c.id)).scalars())
+        else:
+            inserted_ids = set()
+            for i in range(0, len(unique), INSERT_CHUNK_ROWS):
+                chunk = unique[i:i + INSERT_CHUNK_ROWS]
+                archived = set(session.exec(select(TransactionArchive.id).where(TransactionArchive.id.in_([row["id"] for row in chunk]))).all())
+                chunk = [row for row in chunk if row["id"] not in archived]
+                if not chunk:
+                    continue
+                stmt = upsert(session, Transaction).values(chunk).on_conflict_do_nothing().returning(Transaction.id)
+                inserted_ids.update(session.exec(stmt).scalars())
+        return [first[row["id"]] is row and row["id"] in inserted_ids for row in rows]
+
+    def _copy_transactions(self, session: Session, rows: list[dict], table: str):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row[column] for column in COPY_COLUMNS])
+        buffer.seek(0)
+
+        # csv.writer leaves an empty string unquoted, which COPY would read as NULL
+        cursor = session.connection().connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {table} ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (currency, user_id))", buffer)
+        finally:
+            cursor.close()
+
+    def _copy_records(self, session: Session, rows: list[dict], table: str):
+        connection = session.connection().connection.driver_connection
+        await_only(connection.copy_records_to_table(
+            table,
+            records=[tuple(row[column] for column in COPY_COLUMNS) for row in rows],
+            columns=COPY_COLUMNS
+        ))
+
     def register_currency(self, currency: Currency):
         with Session(self.engine) as session:
             try:
-                stmt = select(Currency).where(Currency.currency == currency.currency)
-                existing_currency = session.exec(stmt).one_or_none()
+                stmt = upsert(session, Currency)\
+                        .values(id=uuid4(), currency=currency.currency, country=currency.country, exponent=currency.exponent)\
+                        .on_conflict_do_nothing(index_elements=[Currency.currency])\
+                        .returning(Currency.id)
+                created = session.exec(stmt).one_or_none()
+                session.commit()
 
-                if existing_currency:
+                if not created:
                     return {
                     "status": Status.FAILURE, 
                     "message": f"The currency {currency} already exists."
                     }
 
-                session.add(Currency(currency=currency.currency,country=currency.country))
-                session.commit()
+                self.currency_registry.add(currency.currency, currency.exponent)
                 return {
                     "status": Status.SUCCESS, 
                     "message": f"currency {currency} successfully created"
@@ -81,126 +255,597 @@ class Repository:
                     "message": f"registering currency {currency} failed due to {e}"
                 }
             
-    def fetch_transactions(self):
+    def refresh_currencies(self):
+        with Session(self.engine) as session:
+            try:
+                self.currency_registry.refresh(session)
+                return {"status": Status.SUCCESS, "currencies": self.currency_registry.currencies}
+            except Exception as e:
+                return {"status": Status.FAILURE, "message": f"refreshing currencies failed due to {e}"}
+
+    def fetch_transactions(self, stream: bool = False, encoded: bool = False):
+        stmt = select(*TRANSACTION_COLUMNS).where(Transaction.deleted == False)
+        if stream:
+            return self._stream(stmt, "failed to stream transactions due to")
         with Session(self.engine) as session:
             try:
-                stmt = select(Transaction).where(Transaction.deleted == False)
-                return {"status": Status.SUCCESS, "transactions": session.exec(stmt).fetchall()}
+                return {"status": Status.SUCCESS, "transactions": self._present(session, session.exec(stmt).fetchall(), encoded)}
             except Exception as e:
                 return {"status": Status.FAILURE, "message": e}
             
     def fetch_total_by_currency(self, currency):
         with Session(self.engine) as session:
             try:
-                stmt = select(func.sum(Transaction.amount)).where(Transaction.currency == currency)
-                total = session.exec(stmt).one()
+                stmt = select(CurrencyTotal.amount_minor).where(CurrencyTotal.currency == currency)
+                total = session.exec(stmt).one_or_none()
+                exponent = self.currency_registry.valid_currencies(session, {currency}).get(currency, DEFAULT_EXPONENT)
                 
-                return {"status": Status.SUCCESS, "amount": total}
+                return {"status": Status.SUCCESS, "amount": from_minor(total or 0, exponent)}
             except Exception as e:
                 return {"status": Status.FAILURE, "message": e}
+
+    def fetch_converted_total(self, currency: str):
+        # the running totals hold one row per currency, so this is a handful of cached rate lookups
+        with Session(self.engine) as session:
+            try:
+                target_exponent = self._target_exponent(session, currency)
+                totals = session.exec(select(CurrencyTotal.currency, CurrencyTotal.amount_minor)).all()
+                exponents = self.currency_registry.valid_currencies(session, {source for source, _ in totals})
+                amount = from_minor(0, target_exponent)
+                for source, total_minor in totals:
+                    rate = self._rate(session, source, currency, date.today())
+                    amount += self._convert(Decimal(total_minor or 0) * rate, exponents[source], target_exponent)
+                return {"status": Status.SUCCESS, "amount": amount}
+            except Exception as e:
+                return {"status": Status.FAILURE, "message": f"converting totals to {currency} failed due to {e}"}
+
+    def load_fx_rates(self, path: str):
+        with Session(self.engine) as session:
+            try:
+                rows = load_rates(session, path)
+                session.commit()
+                self.rate_cache.clear()
+                return {"status": Status.SUCCESS, "rows": rows}
+            except Exception as e:
+                return {"status": Status.FAILURE, "message": f"loading fx rates from {path} failed due to {e}"}
+
+    def _target_exponent(self, session: Session, currency: str):
+        exponents = self.currency_registry.valid_currencies(session, {currency})
+        if currency not in exponents:
+            raise ValueError(f"{currency} is not a registered currency")
+        return exponents[currency]
+
+    def _rate(self, session: Session, source: str, currency: str, day: date):
+        rate = self.rate_cache.rate(session, source, currency, day)
+        if rate is None:
+            raise ValueError(f"no fx rate from {source} to {currency} on or before {day}")
+        return rate
+
+    def _convert(self, source_minor: Decimal, source_exponent: int, target_exponent: int):
+        return source_minor.scaleb(-source_exponent).quantize(Decimal(1).scaleb(-target_exponent))
+
+    def reconcile_currency_totals(self):
+        with Session(self.engine) as session:
+            try:
+                if session.bind.dialect.name == "postgresql":
+                    session.exec(text(f"LOCK TABLE {CurrencyTotal.__tablename__} IN EXCLUSIVE MODE"))
+
+                stmt = select(Transaction.currency, func.sum(Transaction.amount_minor), func.count())\
+                        .where(Transaction.deleted == False)\
+                        .group_by(Transaction.currency)
+                actual = {currency: (int(amount), count) for currency, amount, count in session.exec(stmt)}
+                stored = {t.currency: (t.amount_minor, t.transaction_count) for t in session.exec(select(CurrencyTotal))}
+
+                drift = {}
+                for currency in actual.keys() | stored.keys():
+                    actual_amount, actual_count = actual.get(currency, (0, 0))
+                    stored_amount, stored_count = stored.get(currency, (0, 0))
+                    if (actual_amount, actual_count) != (stored_amount, stored_count):
+                        drift[currency] = {
+                            "stored_amount_minor": stored_amount,
+                            "actual_amount_minor": actual_amount,
+                            "stored_count": stored_count,
+                            "actual_count": actual_count
+                        }
+
+                session.exec(delete(CurrencyTotal))
+                session.add_all([
+                    CurrencyTotal(currency=currency, amount_minor=amount, transaction_count=count)
+                    for currency, (amount, count) in actual.items()
+                ])
+                session.commit()
+                return {"status": Status.SUCCESS, "drift": drift}
+            except Exception as e:
+                session.rollback()
+                return {"status": Status.FAILURE, "message": f"reconciling currency totals failed due to {e}"}
             
-    def fetch_transactions_by_date(self, date_str: str):
-        tx_date = date.fromisoformat(date_str)
+    def fetch_transactions_by_date(self, date_str: str, stream: bool = False, encoded: bool = False):
+        # a plain range on the column lets the planner prune monthly partitions and use the (date, id) index
+        day_start = datetime.combine(date.fromisoformat(date_str), time.min)
+        stmt = select(*TRANSACTION_COLUMNS).where(Transaction.date >= day_start).where(Transaction.date < day_start + timedelta(days=1)).where(Transaction.deleted == False)
+        if stream:
+            return self._stream(stmt, "failed to stream transactions by date cause:")
         with Session(self.engine) as session:
             try:
-                stmt = select(Transaction).where(func.date(Transaction.date) == tx_date).where(Transaction.deleted == False)
-                return {"status": Status.SUCCESS, "transactions": session.exec(stmt).fetchall()}
+                return {"status": Status.SUCCESS, "transactions": self._present(session, session.exec(stmt).fetchall(), encoded)}
             except Exception as e:
                 return {"status": Status.FAILURE, "message": f"failed to fetch transactions by date cause:{e}"}
 
-    def fetch_transactions_within_amount_range(self, start: float, end: float):
+    def _amount_ranges(self, session: Session, start: Decimal, end: Decimal):
+        # a major-unit range is a different minor-unit range for each currency exponent
+        groups = self.currency_registry.exponent_groups(session)
+        ranges = []
+        for exponent, currencies in groups.items():
+            predicate = Transaction.amount_minor.between(*minor_bounds(start, end, exponent))
+            if len(groups) > 1:
+                predicate = and_(Transaction.currency.in_(currencies), predicate)
+            ranges.append((exponent, predicate))
+        return ranges
+
+    def _amount_between(self, session: Session, start: Decimal, end: Decimal):
+        return or_(false(), *[predicate for _, predicate in self._amount_ranges(session, start, end)])
+
+    def fetch_transactions_within_amount_range(self, start: Decimal, end: Decimal, stream: bool = False, encoded: bool = False):
         with Session(self.engine) as session:
             try:
-                stmt = select(Transaction).where(start <= Transaction.amount).where(Transaction.amount <= end).where(Transaction.deleted == False)
-                return {"status": Status.SUCCESS, "transactions": session.exec(stmt).fetchall()}
+                stmt = select(*TRANSACTION_COLUMNS).where(self._amount_between(session, start, end)).where(Transaction.deleted == False)
+                if stream:
+                    return self._stream(stmt, f"failed to stream transactions with given range {start} - {end} due to:")
+                return {"status": Status.SUCCESS, "transactions": self._present(session, session.exec(stmt).fetchall(), encoded)}
             except Exception as e:
                 return {"status": Status.FAILURE, "message": f"failed to fetch transaction with given range {start} - {end} due to: {e}"}
             
-    def paginated_transactions(self, offset: int, limit: int):
+    def paginated_transactions_by_amount(self, start: Decimal, end: Decimal, cursor: str | None, limit: int, encoded: bool = False):
+        # pages follow the stored minor units, which only differs from the decimal order across currency exponents
+        with Session(self.engine) as session:
+            try:
+                stmt = select(*TRANSACTION_COLUMNS)\
+                        .where(self._amount_between(session, start, end))\
+                        .where(Transaction.deleted == False)
+                if cursor:
+                    last_amount, last_id = decode_cursor(cursor)
+                    stmt = stmt.where(tuple_(Transaction.amount_minor, Transaction.id) > (int(last_amount), UUID(last_id)))
+                stmt = stmt.order_by(Transaction.amount_minor, Transaction.id).limit(limit)
+                transactions = session.exec(stmt).fetchall()
+
+                next_cursor = None
+                if transactions and len(transactions) == limit:
+                    last = transactions[-1]
+                    next_cursor = encode_cursor([last.amount_minor, str(last.id)])
+                return {"status": Status.SUCCESS, "transactions": self._present(session, transactions, encoded), "next_cursor": next_cursor}
+            except Exception as e:
+                return {"status": Status.FAILURE, "message": f"fetching transactions with given range {start} - {end} after cursor {cursor} failed due to {e}"}
+
+    def summarize_amount_range(self, start: Decimal, end: Decimal, buckets: int | None = None):
         with Session(self.engine) as session:
             try:
-                stmt = select(Transaction).offset(offset).limit(limit).where(Transaction.deleted == False)
-                return {"status": Status.SUCCESS, "transactions": session.exec(stmt).fetchall()}
+                start, end = Decimal(start), Decimal(end)
+                count, total = 0, Decimal(0)
+                counts = [0] * (buckets or 0)
+                for exponent, predicate in self._amount_ranges(session, start, end):
+                    in_range = [predicate, Transaction.deleted == False]
+                    range_count, range_total = session.exec(select(func.count(), func.sum(Transaction.amount_minor)).where(*in_range)).one()
+                    count += range_count
+                    total += from_minor(range_total or 0, exponent)
+                    if not buckets or not range_count:
+                        continue
+
+                    lower, upper = float(start.scaleb(exponent)), float(end.scaleb(exponent))
+                    if session.bind.dialect.name == "postgresql" and upper > lower:
+                        bucket = func.width_bucket(Transaction.amount_minor, lower, upper, buckets) - 1
+                    else:
+                        bucket = cast((Transaction.amount_minor - lower) / ((upper - lower) / buckets or 1.0), Integer)
+                    for index, bucket_count in session.exec(select(bucket, func.count()).where(*in_range).group_by(bucket)):
+                        # amounts equal to end fall one past the last bucket
+                        counts[min(index, buckets - 1)] += bucket_count
+
+                response = {"status": Status.SUCCESS, "count": count, "total": total}
+                if buckets:
+                    width = (end - start) / buckets
+                    response["histogram"] = [
+                        {"lower": start + i * width, "upper": start + (i + 1) * width, "count": bucket_count}
+                        for i, bucket_count in enumerate(counts)
+                    ]
+                return response
+            except Exception as e:
+                return {"status": Status.FAILURE, "message": f"summarizing transactions with given range {start} - {end} failed due to {e}"}
+
+    def paginated_transactions(self, offset: int, limit: int, encoded: bool = False):
+        with Session(self.engine) as session:
+            try:
+                stmt = select(*TRANSACTION_COLUMNS)\
+                        .where(Transaction.deleted == False)\
+                        .order_by(Transaction.date, Transaction.id)\
+                        .offset(offset)\
+                        .limit(limit)
+                return {"status": Status.SUCCESS, "transactions": self._present(session, session.exec(stmt).fetchall(), encoded)}
             except Exception as e:
                 return {"status": Status.FAILURE, "message": f"fetching paginated transactions failed due to {e}"}
+
+    def paginated_transactions_by_cursor(self, cursor: str | None, limit: int, encoded: bool = False):
+        with Session(self.engine) as session:
+            try:
+                stmt = select(*TRANSACTION_COLUMNS).where(Transaction.deleted == False)
+                if cursor:
+                    last_date, last_id = decode_cursor(cursor)
+                    stmt = stmt.where(
+                        tuple_(Transaction.date, Transaction.id) > (datetime.fromisoformat(last_date), UUID(last_id))
+                    )
+                stmt = stmt.order_by(Transaction.date, Transaction.id).limit(limit)
+                transactions = session.exec(stmt).fetchall()
+
+                next_cursor = None
+                if transactions and len(transactions) == limit:
+                    last = transactions[-1]
+                    next_cursor = encode_cursor([last.date.isoformat(), str(last.id)])
+                return {"status": Status.SUCCESS, "transactions": self._present(session, transactions, encoded), "next_cursor": next_cursor}
+            except Exception as e:
+                return {"status": Status.FAILURE, "message": f"fetching transactions after cursor {cursor} failed due to {e}"}
             
-    def fetch_transactions_by_user_id(self, user_id: str):
+    def fetch_transactions_by_user_id(self, user_id: str, stream: bool = False, encoded: bool = False):
+        stmt = select(*TRANSACTION_COLUMNS).where(Transaction.user_id == user_id).where(Transaction.deleted == False)
+        if stream:
+            return self._stream(stmt, f"streaming transactions of user {user_id} failed due to")
         with Session(self.engine) as session:
             try:
-                stmt = select(Transaction).where(Transaction.user_id == user_id).where(Transaction.deleted == False)
-                return {"status": Status.SUCCESS, "transactions": session.exec(stmt).fetchall()}
+                return {"status": Status.SUCCESS, "transactions": self._present(session, session.exec(stmt).fetchall(), encoded)}
             except Exception as e:
                 return {"status": Status.FAILURE, "message": f"fetching transactions of user {user_id} failed due to {e}"}
             
+    def rebuild_daily_rollup(self):
+        with Session(self.engine) as session:
+            try:
+                if session.bind.dialect.name == "postgresql":
+                    session.exec(text(f"LOCK TABLE {DailyRollup.__tablename__} IN EXCLUSIVE MODE"))
+
+                session.exec(delete(DailyRollup))
+                day = func.date(Transaction.date)
+                stmt = create(DailyRollup).from_select(
+                    ["day", "user_id", "currency", "total_minor", "transaction_count"],
+                    select(day, Transaction.user_id, Transaction.currency, func.sum(Transaction.amount_minor), func.count())
+                        .where(Transaction.deleted == False)
+                        .group_by(day, Transaction.user_id, Transaction.currency)
+                )
+                rows = session.exec(stmt).rowcount
+                session.commit()
+                return {"status": Status.SUCCESS, "rows": rows}
+            except Exception as e:
+                session.rollback()
+                return {"status": Status.FAILURE, "message": f"rebuilding the daily rollup failed due to {e}"}
+
+    def _stream(self, stmt, failure_message: str):
+        session = Session(self.engine)
+        try:
+            result = session.exec(stmt.execution_options(yield_per=STREAM_CHUNK_SIZE))
+        except Exception as e:
+            session.close()
+            return {"status": Status.FAILURE, "message": f"{failure_message} {e}"}
+
+        def rows():
+            try:
+                for chunk in result.partitions():
+                    yield from self._present(session, chunk)
+            finally:
+                session.close()
+        return {"status": Status.SUCCESS, "transactions": rows()}
+
+    def _present(self, session: Session, transactions, encoded: bool = False):
+        exponents = self.currency_registry.valid_currencies(session, {tx.currency for tx in transactions})
+        if encoded:
+            return encode_transactions(transactions, exponents)
+        return [
+            TransactionResponse.model_construct(
+                id=tx.id,
+                amount=from_minor(tx.amount_minor, exponents[tx.currency]),
+                currency=tx.currency,
+                user_id=tx.user_id,
+                date=tx.date,
+                deleted=tx.deleted
+            ) for tx in transactions
+        ]
+
     def delete_transaction(self, transaction_id: UUID):
         with Session(self.engine) as session:
             try:
-                stmt = update(Transaction).where(Transaction.id == transaction_id).values(deleted=True)
-                session.exec(stmt)  
+                stmt = update(Transaction)\
+                        .where(Transaction.id == transaction_id)\
+                        .where(Transaction.deleted == False)\
+                        .values(deleted=True, deleted_at=datetime.now())\
+                        .returning(Transaction.currency, Transaction.amount_minor, Transaction.user_id, Transaction.date)
+                deleted_rows = session.exec(stmt).all()
+                apply_transaction_deltas(session, [row._mapping for row in deleted_rows], sign=-1)
                 session.commit()
-                return {"status": Status.SUCCESS, "result": f"transaction {transaction_id} is successfully deleted."}
+                return {
+                    "status": Status.SUCCESS,
+                    "result": f"transaction {transaction_id} is successfully deleted.",
+                    "deleted": deleted_rows
+                }
             except Exception as e:
                 return {"status": Status.FAILURE, "message": f"Failed to delete transaction {transaction_id}."}
-            
-    def get_report(self, from_date=None, to_date=None, groups: list[str]=[]):
-        group_by_map = {
-            GroupBy.CURRENCY: Transaction.currency, 
-            GroupBy.DAY: func.date(Transaction.date).label("date"), 
-            GroupBy.USER: Transaction.user_id
-        }
-        groups = [GroupBy[group_by] for group_by in groups ]
 
+    def delete_transactions(self, ids: list[UUID] | None = None, user_id: str | None = None, from_date: date | None = None, to_date: date | None = None):
+        filters = []
+        if ids is not None:
+            filters.append(Transaction.id.in_(ids))
+        if user_id is not None:
+            filters.append(Transaction.user_id == user_id)
+        if from_date:
+            filters.append(Transaction.date >= datetime.combine(from_date, time.min))
+        if to_date:
+            filters.append(Transaction.date < datetime.combine(to_date + timedelta(days=1), time.min))
+        if not filters:
+            return {"status": Status.FAILURE, "message": "deleting transactions needs ids, a user_id or a date range"}
+
+        deleted_rows = []
         with Session(self.engine) as session:
             try:
-                select_column = [func.sum(Transaction.amount).label("total_amount")]
-                group_by_column = []
+                # a chunk per transaction keeps row locks short when a filter matches millions of rows
+                while True:
+                    chunk = select(Transaction.id).where(Transaction.deleted == False).where(*filters).limit(DELETE_CHUNK_ROWS)
+                    # deleted is checked again on the update itself, postgres only re-evaluates the outer where on a
+                    # row another delete locked after the chunk was picked, and that row must not be subtracted twice
+                    stmt = update(Transaction)\
+                            .where(Transaction.id.in_(chunk.scalar_subquery()))\
+                            .where(Transaction.deleted == False)\
+                            .values(deleted=True, deleted_at=datetime.now())\
+                            .returning(Transaction.id, Transaction.currency, Transaction.amount_minor, Transaction.user_id, Transaction.date)\
+                            .execution_options(synchronize_session=False)
+                    rows = session.exec(stmt).all()
+                    apply_transaction_deltas(session, [row._mapping for row in rows], sign=-1)
+                    session.commit()
+                    deleted_rows.extend(rows)
+                    if len(rows) < DELETE_CHUNK_ROWS:
+                        return {"status": Status.SUCCESS, "deleted": deleted_rows}
+            except Exception as e:
+                session.rollback()
+                return {
+                    "status": Status.FAILURE,
+                    "message": f"deleting transactions failed after {len(deleted_rows)} rows due to {e}",
+                    "deleted": deleted_rows
+                }
+            
+    def get_report(self, from_date=None, to_date=None, groups: list[str]=[], currency: str | None = None, top: list[int | None] | None = None, min_total: Decimal | None = None, rolling_days: int | None = None, stream: bool = False):
+        # stream=True hands back flat rows as they are read instead of the nested dict
+        groups = [GroupBy[group_by] for group_by in groups ]
+        if rolling_days and (GroupBy.DAY not in groups or GroupBy.HOUR in groups):
+            return {"status": Status.FAILURE, "message": "rolling windows need DAY in the grouping and cannot be combined with HOUR"}
+
+        session = Session(self.engine)
+        try:
+            target_exponent = self._target_exponent(session, currency) if currency else None
+            stmt = self._report_statement(session, from_date, to_date, groups, currency, top or [], min_total, rolling_days)
+            results = session.exec(stmt.execution_options(yield_per=STREAM_CHUNK_SIZE))
+        except Exception as e:
+            session.close()
+            return {"status": Status.FAILURE, "message": f"Fetching report failed due to {e}"}
+        rows = self._report_rows(session, results, groups, currency, target_exponent, rolling_days)
+
+        if stream:
+            def flat_rows():
+                try:
+                    yield from rows
+                finally:
+                    session.close()
+            return {"status": Status.SUCCESS, "results": flat_rows()}
+
+        try:
+            final_result = {}
+            for row in rows if groups else ():
+                current_level = final_result
+                keys = [row[REPORT_COLUMNS[group]] for group in groups]
+                for key in keys[:-1]:
+                    current_level = current_level.setdefault(key, {})
+                if not rolling_days:
+                    current_level[keys[-1]] = current_level.get(keys[-1], 0) + row["total_amount"]
+                    continue
+                leaf = current_level.setdefault(keys[-1], {"total_amount": 0, "rolling_sum": 0, "rolling_count": 0})
+                for field in ("total_amount", "rolling_sum", "rolling_count"):
+                    leaf[field] += row[field]
+                leaf["rolling_average"] = rolling_average(leaf["rolling_sum"], leaf["rolling_count"])
+            return {"status": Status.SUCCESS, "results": final_result}
+        except Exception as e:
+            return {"status": Status.FAILURE, "message": f"Fetching report failed due to {e}"}
+        finally:
+            session.close()
+
+    def _report_statement(self, session: Session, from_date, to_date, groups: list[GroupBy], currency: str | None, top: list[int | None], min_total: Decimal | None, rolling_days: int | None = None):
+        today = date.today()
+        start = end = None
+        if from_date and to_date:
+            start = date.fromisoformat(from_date)
+            end = date.fromisoformat(to_date)
+        # a rolling window also reads the days leading up to the range, they are dropped once the windows are summed
+        scan_start = start - timedelta(days=rolling_days - 1) if start and rolling_days else start
+
+        if GroupBy.HOUR in groups:
+            # the rollup only keeps days, so hourly buckets read the raw rows of the whole range
+            raw = select(
+                func.date(Transaction.date).label("date"),
+                Transaction.date.label("at"),
+                Transaction.user_id,
+                Transaction.currency,
+                Transaction.amount_minor,
+                literal(1, Integer).label("transaction_count")
+            ).where(Transaction.deleted == False)
+            if start:
+                raw = raw\
+                        .where(Transaction.date >= datetime.combine(scan_start, time.min))\
+                        .where(Transaction.date < datetime.combine(end + timedelta(days=1), time.min))
+            source = raw
+        else:
+            # closed days come from the rollup, only today's rows are read from the raw table
+            closed_days = select(
+                DailyRollup.day.label("date"),
+                DailyRollup.user_id,
+                DailyRollup.currency,
+                DailyRollup.total_minor.label("amount_minor"),
+                DailyRollup.transaction_count
+            ).where(DailyRollup.day < today).where(DailyRollup.transaction_count > 0)
+            current_day = select(
+                func.date(Transaction.date).label("date"),
+                Transaction.user_id,
+                Transaction.currency,
+                Transaction.amount_minor,
+                literal(1, Integer).label("transaction_count")
+            ).where(Transaction.deleted == False).where(Transaction.date >= datetime.combine(today, time.min))
+
+            if start:
+                closed_days = closed_days.where(DailyRollup.day >= scan_start).where(DailyRollup.day <= end)
+                current_day = current_day\
+                        .where(Transaction.date >= datetime.combine(scan_start, time.min))\
+                        .where(Transaction.date < datetime.combine(end + timedelta(days=1), time.min))
+
+            source = union_all(closed_days, current_day)
+
+        rate = None
+        if currency:
+            # every row converts at the latest rate on or before its own day, so days without a published rate
+            # (weekends, holidays) give the same amounts under any grouping. the rate is looked up on the fx_rate
+            # key once per currency and day the report covers and joined back, not once per source row
+            source = source.cte("report_source")
+            days = select(source.c.currency, source.c.date).distinct().subquery()
+            latest_rate = select(FxRate.rate)\
+                    .where(FxRate.base == days.c.currency)\
+                    .where(FxRate.quote == currency)\
+                    .where(FxRate.day <= days.c.date)\
+                    .order_by(FxRate.day.desc())\
+                    .limit(1)\
+                    .scalar_subquery()
+            day_rates = select(days.c.currency, days.c.date, case((days.c.currency == currency, literal(1, Numeric)), else_=latest_rate).label("rate")).subquery()
+            source = select(*source.c, day_rates.c.rate).select_from(source.join(day_rates, and_(
+                day_rates.c.currency == source.c.currency,
+                day_rates.c.date == source.c.date
+            ))).subquery()
+            rate = source.c.rate
+            select_column = [
+                func.sum(source.c.amount_minor * rate).label("converted_minor"),
+                func.count(case((rate.is_(None), 1))).label("missing_rates")
+            ]
+        else:
+            source = source.subquery()
+            # sums stay in minor units per currency and are only combined across exponents as decimals
+            select_column = [func.sum(source.c.amount_minor).label("total_minor")]
+        if rolling_days:
+            select_column.append(func.sum(source.c.transaction_count).label("transaction_count"))
+        ranking = bool(groups) and (any(top) or min_total is not None)
+        if ranking:
+            # every level is ranked by its total in minor units of the finest exponent so currencies with different
+            # exponents compare and sums stay exact, a converted report ranks on the rows the rate table covers
+            scale, rank_exponent = self._common_minor_scale(session, source.c.currency)
+            amount = source.c.amount_minor * scale
+            if rate is not None:
+                amount = amount * rate
+            select_column.append(func.coalesce(func.sum(amount), 0).label("rank_amount"))
+        group_by_column = [self._report_key(session, group, source) for group in groups]
+        if GroupBy.CURRENCY not in groups:
+            group_by_column.append(source.c.currency)
+
+        stmt = select(*select_column, *group_by_column).group_by(*group_by_column)
+        if rolling_days:
+            stmt = self._rolling_window(session, stmt, groups, currency, rolling_days, start)
+        if not ranking:
+            return stmt
+
+        grouped = stmt.subquery()
+        keys = [grouped.c[REPORT_COLUMNS[group]] for group in groups]
+        totalled = select(grouped, *[
+            func.sum(grouped.c.rank_amount).over(partition_by=keys[:i + 1]).label(f"level_total_{i}")
+            for i in range(len(groups))
+        ]).subquery()
+        keys = [totalled.c[REPORT_COLUMNS[group]] for group in groups]
+        ranked = select(totalled, *[
+            func.dense_rank().over(partition_by=keys[:i] or None, order_by=[totalled.c[f"level_total_{i}"].desc(), keys[i]]).label(f"level_rank_{i}")
+            for i in range(len(groups))
+        ]).subquery()
+
+        stmt = select(*ranked.c)
+        for i, limit in enumerate(top[:len(groups)]):
+            if limit:
+                stmt = stmt.where(ranked.c[f"level_rank_{i}"] <= limit)
+        if min_total is not None:
+            # unconverted totals are whole minor units, so the threshold rounds up to one without losing anything
+            threshold = min_total.scaleb(rank_exponent)
+            threshold = literal(threshold, Numeric) if rate is not None else literal(int(threshold.to_integral_value(ROUND_CEILING)), BigInteger)
+            stmt = stmt.where(ranked.c[f"level_total_{len(groups) - 1}"] >= threshold)
+        return stmt.order_by(*[ranked.c[f"level_rank_{i}"] for i in range(len(groups))])
+
+    def _report_key(self, session: Session, group: GroupBy, source):
+        # time buckets truncate to their start, weeks start on monday on both dialects
+        postgres = session.bind.dialect.name == "postgresql"
+        name = REPORT_COLUMNS[group]
+        if group == GroupBy.HOUR:
+            bucket = func.date_trunc(literal_column("'hour'"), source.c.at) if postgres else func.strftime(literal_column("'%Y-%m-%d %H:00:00'"), source.c.at)
+        elif group == GroupBy.WEEK:
+            bucket = cast(func.date_trunc(literal_column("'week'"), source.c.date), Date) if postgres else func.date(source.c.date, literal_column("'weekday 0'"), literal_column("'-6 days'"))
+        elif group == GroupBy.MONTH:
+            bucket = cast(func.date_trunc(literal_column("'month'"), source.c.date), Date) if postgres else func.strftime(literal_column("'%Y-%m-01'"), source.c.date)
+        else:
+            return source.c[name]
+        return bucket.label(name)
+
+    def _rolling_window(self, session: Session, stmt, groups: list[GroupBy], currency: str | None, days: int, start: date | None):
+        # each row also carries the sums of the window of days ending on it, computed in the same query.
+        # windows run per currency over everything grouped apart from the time buckets, and a currency gets a
+        # row on every day its group saw activity so windows still line up when currencies are added together
+        grouped = stmt.cte("report_days")
+        names = [REPORT_COLUMNS[group] for group in groups if group != GroupBy.CURRENCY]
+        partition_names = [REPORT_COLUMNS[group] for group in groups if group not in BUCKET_LABELS and group != GroupBy.CURRENCY]
+        measures = [column for column in grouped.c if column.name not in names and column.name != "currency"]
+        active_days = select(*[grouped.c[name] for name in names]).distinct().subquery()
+        currencies = select(*[grouped.c[name] for name in partition_names], grouped.c.currency).distinct().subquery()
+        grid = active_days.join(currencies, and_(true(), *[active_days.c[name] == currencies.c[name] for name in partition_names]))
+        filled = select(*[active_days.c[name] for name in names], currencies.c.currency, *measures).select_from(grid.outerjoin(grouped, and_(
+            *[grouped.c[name] == active_days.c[name] for name in names],
+            grouped.c.currency == currencies.c.currency
+        ))).subquery()
+
+        if session.bind.dialect.name == "postgresql":
+            day_number = filled.c.date - literal_column("DATE '1970-01-01'", Date)
+        else:
+            day_number = func.julianday(filled.c.date)
+        sums = ["converted_minor", "missing_rates"] if currency else ["total_minor"]
+        windows = {f"rolling_{name}": func.sum(filled.c[name]) for name in sums}
+        windows["rolling_count"] = func.sum(filled.c.transaction_count)
+        partition = [filled.c[name] for name in partition_names] + [filled.c.currency]
+        windowed = select(*filled.c, *[
+            window.over(partition_by=partition, order_by=day_number, range_=(-(days - 1), 0)).label(name)
+            for name, window in windows.items()
+        ]).subquery()
+
+        stmt = select(*windowed.c).where(windowed.c.rolling_count > 0)
+        if start:
+            stmt = stmt.where(windowed.c.date >= start)
+        return stmt
+
+    def _common_minor_scale(self, session: Session, currency_column):
+        groups = self.currency_registry.exponent_groups(session)
+        finest = max([*groups, DEFAULT_EXPONENT])
+        if list(groups) in ([], [finest]):
+            return 1, finest
+        return case(*[(currency_column.in_(currencies), 10 ** (finest - exponent)) for exponent, currencies in groups.items()], else_=10 ** (finest - DEFAULT_EXPONENT)), finest
+
+    def _report_rows(self, session: Session, results, groups: list[GroupBy], currency: str | None, target_exponent: int | None, rolling_days: int | None = None):
+        # one flat row per group and source currency, read a chunk at a time
+        for chunk in results.partitions():
+            exponents = self.currency_registry.valid_currencies(session, {result.currency for result in chunk})
+            for result in chunk:
+                row = {}
                 for group in groups:
-                    select_column.append(group_by_map[group])
-                    group_by_column.append(group_by_map[group])
-
-                stmt = select(*select_column).where(Transaction.deleted == False)
-
-                if from_date and to_date:
-                    start = date.fromisoformat(from_date)
-                    end = date.fromisoformat(to_date)
-                    stmt = stmt\
-                            .where(func.date(Transaction.date) >= start)\
-                            .where(func.date(Transaction.date) <= end)               
-
-                stmt = stmt.group_by(*group_by_column)
-
-                results = session.exec(stmt).all()
-                formatted_results = []
-
-                for result in results:
-                    result_dict = {"total_amount": float(result.total_amount or 0)}
-
-                    if GroupBy.USER in groups:
-                        result_dict["user_id"] = result.user_id if result.user_id else ""
-                    if GroupBy.CURRENCY in groups:
-                        result_dict["currency"] = result.currency if result.currency else ""
-                    if GroupBy.DAY in groups:
-                        result_dict["date"] = str(result.date) if result.date else ""     
-                   
-                    formatted_results.append(result_dict)
-
-                final_result = {}
-                for r in formatted_results:
-                    current_level = final_result
-
-                    for i, group in enumerate(groups):
-                        if GroupBy.USER ==  group:
-                            current_key = r["user_id"]
-                        elif GroupBy.CURRENCY == group:
-                            current_key = r["currency"]
-                        elif GroupBy.DAY == group:
-                            current_key = r["date"]  
-                        else: continue    
-
-                        if i == len(groups)-1:
-                            current_level[current_key] = r["total_amount"]
-                        else:
-                            current_level = current_level.setdefault(current_key, {})    
-                return {"status": Status.SUCCESS, "results": final_result}
-            except Exception as e:
-                return {"status": Status.FAILURE, "message": f"Fetching report failed due to {e}"}
\ No newline at end of file
+                    value = getattr(result, REPORT_COLUMNS[group])
+                    row[REPORT_COLUMNS[group]] = (BUCKET_LABELS[group](value) if group in BUCKET_LABELS else value) if value else ""
+                row.setdefault("currency", result.currency)
+                row["total_amount"] = self._report_amount(result, "", exponents[result.currency], currency, target_exponent)
+                if rolling_days:
+                    row["rolling_sum"] = self._report_amount(result, "rolling_", exponents[result.currency], currency, target_exponent)
+                    row["rolling_count"] = result.rolling_count
+                    row["rolling_average"] = rolling_average(row["rolling_sum"], row["rolling_count"])
+                yield row
+
+    def _report_amount(self, result, prefix: str, exponent: int, currency: str | None, target_exponent: int | None):
+        if not currency:
+            return from_minor(getattr(result, f"{prefix}total_minor") or 0, exponent)
+        if getattr(result, f"{prefix}missing_rates"):
+            raise ValueError(f"no fx rate from {result.currency} to {currency} on or before some of the days reported")
+        # sqlite hands the sum back as a float, postgres as an exact numeric
+        converted = Decimal(str(getattr(result, f"{prefix}converted_minor") or 0))
+        return self._convert(converted, exponent, target_exponent)
@@ -1,12 +1,25 @@
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from unittest import TestCase
 from repository import Repository, Status
-from requests import TransactionRequest
+from requests import TransactionRequest, TransactionResponse
+from decimal import Decimal
 from currency_config import Currency
 from pydantic_core._pydantic_core import ValidationError
 from uuid import uuid4
 from Transaction import Transaction
-from sqlmodel import Session, delete
+from aggregates import CurrencyTotal, DailyRollup
+from sqlmodel import Session, delete, update
+from db_config import start_db_engine
+from sqlalchemy import event
+from fx_rates import FxRate
+import json
+import os
+import tempfile
+
+engine = start_db_engine()
+
+def response(tx):
+    return TransactionResponse(id=tx.id, amount=tx.amount, currency=tx.currency, user_id=tx.user_id, date=tx.date)
 
 class TestRepository(TestCase):
     # @classmethod
@@ -17,11 +30,13 @@ class TestRepository(TestCase):
     #     cls.repository.register_currency(Currency(currency="TEST2", country="United States"))
 
     def setUp(self):
-        self.repository = Repository()
+        self.repository = Repository(engine)
         self.repository.register_currency(Currency(currency="TEST1", country="United Kingdom")) 
         self.repository.register_currency(Currency(currency="TEST2", country="United States"))
         with Session(self.repository.engine) as session:
             session.exec(delete(Transaction))
+            session.exec(delete(CurrencyTotal))
+            session.exec(delete(DailyRollup))
             session.commit()        
 
     # @classmethod
@@ -36,6 +51,8 @@ class TestRepository(TestCase):
         with Session(self.repository.engine) as session:
             session.exec(delete(Transaction))
             session.exec(delete(Currency))
+            session.exec(delete(CurrencyTotal))
+            session.exec(delete(DailyRollup))
             session.commit()
 
     def test_successful_transaction_creation(self):
@@ -43,7 +60,7 @@ class TestRepository(TestCase):
         transactions = [tx_req]
         res = self.repository.create_transactions(transactions)
         self.assertEqual(res["status"], Status.SUCCESS)
-        self.assertEqual(res["message"], f"transactions {transactions} submitted successfully.")
+        self.assertEqual(res["message"], f"{len(transactions)} transactions submitted successfully.")
 
     def test_transaction_with_missing_required_fields(self):
 
@@ -63,6 +80,80 @@ class TestRepository(TestCase):
         self.assertEqual(res["status"], Status.FAILURE)
         self.assertEqual(res["message"], f"transaction failed because there are/is invalid currencies {invalid_currencies}.")
 
+    def test_bulk_create_transactions_reports_rejects(self):
+        transactions = [
+            TransactionRequest(amount=1.0, currency="TEST1", user_id="123"),
+            TransactionRequest(amount=2.0, currency="INVALID", user_id="123"),
+            TransactionRequest(amount=3.0, currency="TEST2", user_id="456")
+        ]
+        res = self.repository.bulk_create_transactions(transactions)
+        self.assertEqual(res["status"], Status.SUCCESS)
+        self.assertEqual(res["inserted"], 2)
+        self.assertEqual(res["rejects"], [(1, "invalid currency INVALID")])
+
+        fetch_res = self.repository.fetch_transactions()
+        self.assertEqual(len(fetch_res["transactions"]), 2)
+
+    def test_validate_transactions_reports_the_rows_an_insert_would_reject(self):
+        transactions = [
+            TransactionRequest(amount=1.0, currency="TEST1", user_id="123"),
+            TransactionRequest(amount=2.0, currency="INVALID", user_id="123"),
+            TransactionRequest(amount=Decimal("3.001"), currency="TEST2", user_id="456")
+        ]
+        res = self.repository.validate_transactions(transactions)
+
+        self.assertEqual(res["status"], Status.SUCCESS)
+        self.assertEqual([index for index, _ in res["rejects"]], [1, 2])
+        self.assertEqual(len(self.repository.fetch_transactions()["transactions"]), 0)
+
+    def test_retried_bulk_batch_is_idempotent(self):
+        transactions = [
+            TransactionRequest(id=uuid4(), amount=Decimal("1.00"), currency="TEST1", user_id="123"),
+            TransactionRequest(id=uuid4(), amount=Decimal("2.00"), currency="TEST1", user_id="123")
+        ]
+        first = self.repository.bulk_create_transactions(transactions)
+        self.assertEqual((first["inserted"], first["duplicates"]), (2, 0))
+
+        retry = [*transactions, TransactionRequest(id=uuid4(), amount=Decimal("4.00"), currency="TEST1", user_id="123")]
+        retry.append(retry[2])
+        res = self.repository.bulk_create_transactions(retry + [TransactionRequest(amount=Decimal("8.00"), currency="INVALID", user_id="123")])
+        self.assertEqual(res["status"], Status.SUCCESS)
+        self.assertEqual(res["results"], ["duplicate", "duplicate", "inserted", "duplicate", "rejected"])
+        self.assertEqual((res["inserted"], res["duplicates"]), (1, 3))
+        self.assertEqual(self.repository.fetch_total_by_currency("TEST1")["amount"], Decimal("7.00"))
+        self.assertEqual(self.repository.reconcile_currency_totals()["drift"], {})
+
+    def test_retried_create_is_idempotent(self):
+        tx = TransactionRequest(id=uuid4(), amount=Decimal("3.00"), currency="TEST1", user_id="123")
+        self.assertEqual(self.repository.create_transactions([tx])["results"], ["inserted"])
+
+        res = self.repository.create_transactions([tx])
+        self.assertEqual(res["status"], Status.SUCCESS)
+        self.assertEqual((res["inserted"], res["duplicates"], res["results"]), (0, 1, ["duplicate"]))
+        self.assertEqual(self.repository.fetch_total_by_currency("TEST1")["amount"], Decimal("3.00"))
+
+    def test_create_transactions_uses_cached_currencies(self):
+        self.repository.create_transactions([TransactionRequest(amount=1.0, currency="TEST1", user_id="123")])
+
+        statements = []
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(self.repository.engine, "before_cursor_execute", capture)
+        try:
+            res = self.repository.create_transactions([TransactionRequest(amount=2.0, currency="TEST2", user_id="123")])
+        finally:
+            event.remove(self.repository.engine, "before_cursor_execute", capture)
+
+        self.assertEqual(res["status"], Status.SUCCESS)
+        self.assertFalse([statement for statement in statements if "FROM currency" in statement])
+
+    def test_currency_registered_elsewhere_is_accepted(self):
+        self.repository.refresh_currencies()
+        Repository(engine).register_currency(Currency(currency="TEST3", country="Some_country"))
+
+        res = self.repository.create_transactions([TransactionRequest(amount=2.0, currency="TEST3", user_id="123")])
+        self.assertEqual(res["status"], Status.SUCCESS)
+
     def test_register_currency(self):
         currency = Currency(currency="TEST3", country="Some_country")
         res = self.repository.register_currency(currency)
@@ -88,14 +179,21 @@ class TestRepository(TestCase):
         self.repository.create_transactions(transactions)
         res = self.repository.fetch_transactions()
 
-        expected_transactions = [
-            Transaction(id=id_one, amount=2.0, currency="TEST1", user_id="123", date=timestamp),
-            Transaction(id=id_two, amount=3.0, currency="TEST1", user_id="253", date=timestamp)
+        self.assertEqual(res["status"], Status.SUCCESS)
+        self.assertIn(response(transactions[0]), res["transactions"])
+        self.assertIn(response(transactions[1]), res["transactions"])
+
+    def test_fetch_transactions_streamed(self):
+        timestamp = datetime.now()
+        transactions = [
+            TransactionRequest(id=uuid4(), amount=i, currency="TEST1", user_id="123", date=timestamp)
+            for i in range(3)
         ]
-        
+        self.repository.create_transactions(transactions)
+
+        res = self.repository.fetch_transactions_by_user_id("123", stream=True)
         self.assertEqual(res["status"], Status.SUCCESS)
-        self.assertIn(expected_transactions[0], res["transactions"])
-        self.assertIn(expected_transactions[1], res["transactions"])
+        self.assertCountEqual(list(res["transactions"]), [response(tx) for tx in transactions])
 
     def test_fetch_total_by_currency(self):
         timestamp = datetime.now()   
@@ -109,7 +207,31 @@ class TestRepository(TestCase):
         self.repository.create_transactions(transactions)
         res = self.repository.fetch_total_by_currency("TEST2")
         self.assertEqual(res["status"], Status.SUCCESS)
-        self.assertEqual(199.0, float(res["amount"]))
+        self.assertEqual(res["amount"], Decimal("199.00"))
+
+    def test_fetch_total_by_currency_excludes_deleted(self):
+        tx1 = TransactionRequest(id=uuid4(), amount=50.0, currency="TEST2", user_id="445")
+        tx2 = TransactionRequest(id=uuid4(), amount=25.0, currency="TEST2", user_id="435")
+        self.repository.create_transactions([tx1, tx2])
+        self.repository.delete_transaction(tx1.id)
+        self.repository.delete_transaction(tx1.id)
+
+        res = self.repository.fetch_total_by_currency("TEST2")
+        self.assertEqual(res["status"], Status.SUCCESS)
+        self.assertEqual(res["amount"], Decimal("25.00"))
+
+    def test_reconcile_currency_totals_repairs_drift(self):
+        self.repository.create_transactions([TransactionRequest(id=uuid4(), amount=10.0, currency="TEST1", user_id="445")])
+        with Session(self.repository.engine) as session:
+            session.exec(update(CurrencyTotal).where(CurrencyTotal.currency == "TEST1").values(amount_minor=9900))
+            session.commit()
+
+        res = self.repository.reconcile_currency_totals()
+        self.assertEqual(res["status"], Status.SUCCESS)
+        self.assertEqual(res["drift"]["TEST1"]["stored_amount_minor"], 9900)
+        self.assertEqual(res["drift"]["TEST1"]["actual_amount_minor"], 1000)
+        self.assertEqual(self.repository.fetch_total_by_currency("TEST1")["amount"], Decimal("10.00"))
+        self.assertEqual(self.repository.reconcile_currency_totals()["drift"], {})
 
     def test_fetch_total_by_date(self):
         timestamp_one = datetime(2025, 5, 5, 9, 0)
@@ -124,7 +246,7 @@ class TestRepository(TestCase):
 
         self.repository.create_transactions(transactions)
         res = self.repository.fetch_transactions_by_date("2024-05-04")
-        expected = [Transaction(id=id_two, amount=99999.0, currency="TEST2", user_id="435", date=timestamp_two)]
+        expected = [response(transactions[1])]
         
         self.assertEqual(res["status"], Status.SUCCESS)
         self.assertCountEqual(res["transactions"], expected)
@@ -141,10 +263,10 @@ class TestRepository(TestCase):
         id_three = uuid4()
         id_four = uuid4()
 
-        tx1 = Transaction(id=id_one, amount=100000.0, currency="TEST4", user_id="445", date=timestamp)
-        tx2 = Transaction(id=id_two, amount=9999999.0, currency="TEST4", user_id="435", date=timestamp)
-        tx3 = Transaction(id=id_three, amount=20000000.0, currency="TEST4", user_id="235", date=timestamp)
-        tx4 = Transaction(id=id_four, amount=40000000.0, currency="TEST4", user_id="333", date=timestamp)
+        tx1 = TransactionRequest(id=id_one, amount=100000.0, currency="TEST4", user_id="445", date=timestamp)
+        tx2 = TransactionRequest(id=id_two, amount=9999999.0, currency="TEST4", user_id="435", date=timestamp)
+        tx3 = TransactionRequest(id=id_three, amount=20000000.0, currency="TEST4", user_id="235", date=timestamp)
+        tx4 = TransactionRequest(id=id_four, amount=40000000.0, currency="TEST4", user_id="333", date=timestamp)
         
         transactions = [
             TransactionRequest(id=id_one, amount=100000.0, currency="TEST4", user_id="445", date=timestamp),
@@ -156,15 +278,71 @@ class TestRepository(TestCase):
         create_res = self.repository.create_transactions(transactions)
         self.assertEqual(create_res["status"], Status.SUCCESS)
 
-        res = self.repository.fetch_transactions_within_amount_range(start=9999999.0, end=50000000.0)
+        res = self.repository.fetch_transactions_within_amount_range(start=Decimal("9999999"), end=Decimal("50000000"))
 
         self.assertEqual(res["status"], Status.SUCCESS)
         self.assertEqual(len(res["transactions"]), 3)
 
-        self.assertNotIn(tx1, res["transactions"])
-        self.assertIn(tx2, res["transactions"])
-        self.assertIn(tx3, res["transactions"])
-        self.assertIn(tx4, res["transactions"])
+        self.assertNotIn(response(tx1), res["transactions"])
+        self.assertIn(response(tx2), res["transactions"])
+        self.assertIn(response(tx3), res["transactions"])
+        self.assertIn(response(tx4), res["transactions"])
+
+    def test_amount_range_spans_currency_exponents(self):
+        self.repository.register_currency(Currency(currency="TEST3", country="Japan", exponent=0))
+        transactions = [
+            TransactionRequest(id=uuid4(), amount=Decimal("10.50"), currency="TEST1", user_id="445"),
+            TransactionRequest(id=uuid4(), amount=Decimal("11"), currency="TEST3", user_id="445"),
+            TransactionRequest(id=uuid4(), amount=Decimal("10"), currency="TEST3", user_id="445")
+        ]
+        self.assertEqual(self.repository.create_transactions(transactions)["status"], Status.SUCCESS)
+
+        res = self.repository.fetch_transactions_within_amount_range(Decimal("10.25"), Decimal("11"))
+        self.assertCountEqual([(tx.currency, tx.amount) for tx in res["transactions"]], [("TEST1", Decimal("10.50")), ("TEST3", Decimal("11"))])
+        self.assertEqual(self.repository.fetch_total_by_currency("TEST3")["amount"], Decimal("21"))
+
+    def test_amount_with_too_many_decimals_is_rejected(self):
+        res = self.repository.bulk_create_transactions([
+            TransactionRequest(amount=Decimal("1.005"), currency="TEST1", user_id="123"),
+            TransactionRequest(amount=Decimal("1.01"), currency="TEST1", user_id="123")
+        ])
+        self.assertEqual(res["inserted"], 1)
+        self.assertEqual(res["rejects"], [(0, "amount 1.005 has more than 2 decimal places")])
+        self.assertEqual(self.repository.fetch_total_by_currency("TEST1")["amount"], Decimal("1.01"))
+
+    def test_paginated_transactions_by_amount(self):
+        transactions = [
+            TransactionRequest(id=uuid4(), amount=amount, currency="TEST1", user_id="445", date=datetime(2025, 5, 1, 9, 0))
+            for amount in (50, 10, 30, 20, 40, 60)
+        ]
+        self.assertEqual(self.repository.create_transactions(transactions)["status"], Status.SUCCESS)
+
+        pages, cursor = [], None
+        while True:
+            page = self.repository.paginated_transactions_by_amount(Decimal(15), Decimal(55), cursor, limit=2)
+            self.assertEqual(page["status"], Status.SUCCESS)
+            pages.append([tx.amount for tx in page["transactions"]])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+
+        self.assertEqual(pages, [[Decimal(20), Decimal(30)], [Decimal(40), Decimal(50)], []])
+
+    def test_summarize_amount_range(self):
+        transactions = [
+            TransactionRequest(amount=Decimal(amount), currency="TEST1", user_id="445", date=datetime(2025, 5, 1, 9, 0))
+            for amount in ("0", "5", "9.99", "10", "25", "40", "41")
+        ]
+        self.assertEqual(self.repository.create_transactions(transactions)["status"], Status.SUCCESS)
+
+        count_only = self.repository.summarize_amount_range(Decimal(0), Decimal(40))
+        self.assertEqual(count_only["count"], 6)
+        self.assertEqual(count_only["total"], Decimal("89.99"))
+        self.assertNotIn("histogram", count_only)
+
+        histogram = self.repository.summarize_amount_range(Decimal(0), Decimal(40), buckets=4)
+        self.assertEqual([bucket["count"] for bucket in histogram["histogram"]], [3, 1, 1, 1])
+        self.assertEqual((histogram["histogram"][1]["lower"], histogram["histogram"][1]["upper"]), (Decimal(10), Decimal(20)))
 
     def test_paginated_transactions(self):
         timestamp = datetime.now()     
@@ -174,10 +352,10 @@ class TestRepository(TestCase):
         id_four = uuid4()    
 
         transactions = [
-            Transaction(id=id_one, amount=1.0, currency="TEST1", user_id="445", date=timestamp),
-            Transaction(id=id_two, amount=2.0, currency="TEST1", user_id="435", date=timestamp),
-            Transaction(id=id_three, amount=3.0, currency="TEST1", user_id="235", date=timestamp),
-            Transaction(id=id_four, amount=4.0, currency="TEST1", user_id="333", date=timestamp)    
+            TransactionRequest(id=id_one, amount=1.0, currency="TEST1", user_id="445", date=timestamp),
+            TransactionRequest(id=id_two, amount=2.0, currency="TEST1", user_id="435", date=timestamp),
+            TransactionRequest(id=id_three, amount=3.0, currency="TEST1", user_id="235", date=timestamp),
+            TransactionRequest(id=id_four, amount=4.0, currency="TEST1", user_id="333", date=timestamp)    
         ]
 
         create_res = self.repository.create_transactions(transactions)
@@ -187,6 +365,37 @@ class TestRepository(TestCase):
         self.assertEqual(res["status"], Status.SUCCESS)
         self.assertEqual(len(res["transactions"]), 2)
 
+    def test_paginated_transactions_by_cursor(self):
+        transactions = [
+            TransactionRequest(id=uuid4(), amount=i, currency="TEST1", user_id="445", date=datetime(2025, 5, i + 1, 9, 0))
+            for i in range(5)
+        ]
+        create_res = self.repository.create_transactions(transactions)
+        self.assertEqual(create_res["status"], Status.SUCCESS)
+
+        first_page = self.repository.paginated_transactions_by_cursor(cursor=None, limit=2)
+        self.assertEqual(first_page["status"], Status.SUCCESS)
+        self.assertListEqual(first_page["transactions"], [response(tx) for tx in transactions[:2]])
+
+        second_page = self.repository.paginated_transactions_by_cursor(cursor=first_page["next_cursor"], limit=2)
+        self.assertListEqual(second_page["transactions"], [response(tx) for tx in transactions[2:4]])
+
+        last_page = self.repository.paginated_transactions_by_cursor(cursor=second_page["next_cursor"], limit=2)
+        self.assertListEqual(last_page["transactions"], [response(tx) for tx in transactions[4:]])
+        self.assertIsNone(last_page["next_cursor"])
+
+    def test_encoded_pages_match_model_pages(self):
+        transactions = [
+            TransactionRequest(id=uuid4(), amount=Decimal(i) / 4, currency="TEST1", user_id="445", date=datetime(2025, 5, i + 1, 9, 0))
+            for i in range(3)
+        ]
+        self.repository.create_transactions(transactions)
+
+        page = self.repository.paginated_transactions_by_cursor(cursor=None, limit=2)
+        encoded = self.repository.paginated_transactions_by_cursor(cursor=None, limit=2, encoded=True)
+        self.assertEqual(encoded["next_cursor"], page["next_cursor"])
+        self.assertEqual(json.loads(encoded["transactions"].body), [json.loads(tx.model_dump_json()) for tx in page["transactions"]])
+
     def test_fetch_transactions_by_user_id(self):
         timestamp = datetime.now()     
         id_one = uuid4()
@@ -194,10 +403,10 @@ class TestRepository(TestCase):
         id_three = uuid4()
         id_four = uuid4()
 
-        tx1 = Transaction(id=id_one, amount=1.0, currency="TEST1", user_id="445", date=timestamp)
-        tx2 = Transaction(id=id_two, amount=2.0, currency="TEST1", user_id="435", date=timestamp)
-        tx3 = Transaction(id=id_three, amount=3.0, currency="TEST1", user_id="333", date=timestamp)
-        tx4 = Transaction(id=id_four, amount=4.0, currency="TEST1", user_id="333", date=timestamp)        
+        tx1 = TransactionRequest(id=id_one, amount=1.0, currency="TEST1", user_id="445", date=timestamp)
+        tx2 = TransactionRequest(id=id_two, amount=2.0, currency="TEST1", user_id="435", date=timestamp)
+        tx3 = TransactionRequest(id=id_three, amount=3.0, currency="TEST1", user_id="333", date=timestamp)
+        tx4 = TransactionRequest(id=id_four, amount=4.0, currency="TEST1", user_id="333", date=timestamp)        
 
         transactions = [tx1,tx2,tx3,tx4]
 
@@ -208,8 +417,8 @@ class TestRepository(TestCase):
 
         self.assertEqual(res["status"], Status.SUCCESS)
         self.assertEqual(len(res["transactions"]), 2)
-        self.assertIn(tx3, res["transactions"])
-        self.assertIn(tx4, res["transactions"])
+        self.assertIn(response(tx3), res["transactions"])
+        self.assertIn(response(tx4), res["transactions"])
 
     def test_delete_transaction(self):
         timestamp = datetime.now()     
@@ -218,10 +427,10 @@ class TestRepository(TestCase):
         id_three = uuid4()
         id_four = uuid4()    
 
-        tx1 = Transaction(id=id_one, amount=1.0, currency="TEST1", user_id="445", date=timestamp)
-        tx2 = Transaction(id=id_two, amount=2.0, currency="TEST1", user_id="435", date=timestamp)
-        tx3 = Transaction(id=id_three, amount=3.0, currency="TEST1", user_id="333", date=timestamp)
-        tx4 = Transaction(id=id_four, amount=4.0, currency="TEST1", user_id="333", date=timestamp)
+        tx1 = TransactionRequest(id=id_one, amount=1.0, currency="TEST1", user_id="445", date=timestamp)
+        tx2 = TransactionRequest(id=id_two, amount=2.0, currency="TEST1", user_id="435", date=timestamp)
+        tx3 = TransactionRequest(id=id_three, amount=3.0, currency="TEST1", user_id="333", date=timestamp)
+        tx4 = TransactionRequest(id=id_four, amount=4.0, currency="TEST1", user_id="333", date=timestamp)
 
         transactions = [tx1,tx2,tx3,tx4]
 
@@ -235,7 +444,23 @@ class TestRepository(TestCase):
         fetch_res = self.repository.fetch_transactions_by_user_id(tx1.user_id)
 
         self.assertEqual(fetch_res["status"], Status.SUCCESS)
-        self.assertNotIn(tx1, fetch_res["transactions"])
+        self.assertNotIn(response(tx1), fetch_res["transactions"])
+
+    def test_delete_transactions_by_ids_and_filter(self):
+        transactions = [
+            TransactionRequest(id=uuid4(), amount=Decimal(amount), currency="TEST1", user_id=user_id, date=datetime(2025, 5, day, 9, 0))
+            for amount, user_id, day in (("1", "445", 1), ("2", "445", 2), ("4", "445", 3), ("8", "435", 2))
+        ]
+        self.repository.create_transactions(transactions)
+
+        res = self.repository.delete_transactions(ids=[transactions[0].id, uuid4()])
+        self.assertEqual([row.id for row in res["deleted"]], [transactions[0].id])
+
+        res = self.repository.delete_transactions(user_id="445", from_date=date(2025, 5, 2), to_date=date(2025, 5, 2))
+        self.assertEqual([row.id for row in res["deleted"]], [transactions[1].id])
+        self.assertEqual(self.repository.fetch_total_by_currency("TEST1")["amount"], Decimal("12.00"))
+        self.assertEqual(self.repository.reconcile_currency_totals()["drift"], {})
+        self.assertEqual(self.repository.delete_transactions()["status"], Status.FAILURE)
 
     def test_get_report_grouped_by_currency(self):  
         ts_one = datetime(2025, 5, 5, 9, 0) 
@@ -248,10 +473,10 @@ class TestRepository(TestCase):
         id_three = uuid4()
         id_four = uuid4()    
 
-        tx1 = Transaction(id=id_one, amount=1.0, currency="TEST1", user_id="445", date=ts_one)
-        tx2 = Transaction(id=id_two, amount=2.0, currency="TEST1", user_id="435", date=ts_two)
-        tx3 = Transaction(id=id_three, amount=3.0, currency="TEST2", user_id="333", date=ts_three)
-        tx4 = Transaction(id=id_four, amount=4.0, currency="TEST2", user_id="333", date=ts_four)
+        tx1 = TransactionRequest(id=id_one, amount=1.0, currency="TEST1", user_id="445", date=ts_one)
+        tx2 = TransactionRequest(id=id_two, amount=2.0, currency="TEST1", user_id="435", date=ts_two)
+        tx3 = TransactionRequest(id=id_three, amount=3.0, currency="TEST2", user_id="333", date=ts_three)
+        tx4 = TransactionRequest(id=id_four, amount=4.0, currency="TEST2", user_id="333", date=ts_four)
         transactions = [tx1,tx2,tx3,tx4]
 
         expected = {"TEST1": 3.0,"TEST2": 4.0}
@@ -263,6 +488,33 @@ class TestRepository(TestCase):
         self.assertEqual(report_res["status"], Status.SUCCESS)
         self.assertDictEqual(report_res["results"], expected)
 
+    def test_get_report_combines_rollup_with_current_day(self):
+        today = datetime.combine(date.today(), datetime.min.time()).replace(hour=1)
+        yesterday = today - timedelta(days=1)
+        tx1 = TransactionRequest(id=uuid4(), amount=1.0, currency="TEST1", user_id="445", date=yesterday)
+        tx2 = TransactionRequest(id=uuid4(), amount=2.0, currency="TEST1", user_id="445", date=today)
+        tx3 = TransactionRequest(id=uuid4(), amount=4.0, currency="TEST1", user_id="435", date=yesterday)
+
+        create_res = self.repository.create_transactions([tx1, tx2, tx3])
+        self.assertEqual(create_res["status"], Status.SUCCESS)
+        self.repository.delete_transaction(tx3.id)
+
+        report_res = self.repository.get_report(groups=["USER", "DAY"])
+        self.assertEqual(report_res["status"], Status.SUCCESS)
+        self.assertDictEqual(report_res["results"], {"445": {str(yesterday.date()): 1.0, str(today.date()): 2.0}})
+
+    def test_rebuild_daily_rollup(self):
+        transactions = [
+            TransactionRequest(id=uuid4(), amount=1.0, currency="TEST1", user_id="445", date=datetime(2025, 5, 5, 9, 0)),
+            TransactionRequest(id=uuid4(), amount=2.0, currency="TEST1", user_id="445", date=datetime(2025, 5, 5, 18, 0))
+        ]
+        self.repository.create_transactions(transactions)
+
+        res = self.repository.rebuild_daily_rollup()
+        self.assertEqual(res["status"], Status.SUCCESS)
+        self.assertEqual(res["rows"], 1)
+        self.assertDictEqual(self.repository.get_report(groups=["DAY"])["results"], {"2025-05-05": 3.0})
+
     def test_get_report_grouped_by_user(self):
         ts_one = datetime(2025, 5, 5, 9, 0) 
         ts_two = datetime(2025, 1, 5, 9, 0) 
@@ -274,10 +526,10 @@ class TestRepository(TestCase):
         id_three = uuid4()
         id_four = uuid4()    
 
-        tx1 = Transaction(id=id_one, amount=1.0, currency="TEST1", user_id="445", date=ts_one)
-        tx2 = Transaction(id=id_two, amount=2.0, currency="TEST1", user_id="435", date=ts_two)
-        tx3 = Transaction(id=id_three, amount=3.0, currency="TEST2", user_id="333", date=ts_three)
-        tx4 = Transaction(id=id_four, amount=4.0, currency="TEST2", user_id="333", date=ts_four)
+        tx1 = TransactionRequest(id=id_one, amount=1.0, currency="TEST1", user_id="445", date=ts_one)
+        tx2 = TransactionRequest(id=id_two, amount=2.0, currency="TEST1", user_id="435", date=ts_two)
+        tx3 = TransactionRequest(id=id_three, amount=3.0, currency="TEST2", user_id="333", date=ts_three)
+        tx4 = TransactionRequest(id=id_four, amount=4.0, currency="TEST2", user_id="333", date=ts_four)
         transactions = [tx1,tx2,tx3,tx4]
 
         expected = {"445": 1.0, "435": 2.0, "333": 7.0}
@@ -300,10 +552,10 @@ class TestRepository(TestCase):
         id_three = uuid4()
         id_four = uuid4()    
 
-        tx1 = Transaction(id=id_one, amount=1.0, currency="TEST1", user_id="445", date=ts_one)
-        tx2 = Transaction(id=id_two, amount=2.0, currency="TEST1", user_id="435", date=ts_two)
-        tx3 = Transaction(id=id_three, amount=3.0, currency="TEST2", user_id="333", date=ts_three)
-        tx4 = Transaction(id=id_four, amount=4.0, currency="TEST2", user_id="333", date=ts_four)
+        tx1 = TransactionRequest(id=id_one, amount=1.0, currency="TEST1", user_id="445", date=ts_one)
+        tx2 = TransactionRequest(id=id_two, amount=2.0, currency="TEST1", user_id="435", date=ts_two)
+        tx3 = TransactionRequest(id=id_three, amount=3.0, currency="TEST2", user_id="333", date=ts_three)
+        tx4 = TransactionRequest(id=id_four, amount=4.0, currency="TEST2", user_id="333", date=ts_four)
         transactions = [tx1,tx2,tx3,tx4]
 
         expected = {"2025-05-05": 1.0, "2025-01-05": 2.0, "2023-01-05": 3.0, "2024-03-03": 4.0}
@@ -326,10 +578,10 @@ class TestRepository(TestCase):
         id_three = uuid4()
         id_four = uuid4()    
 
-        tx1 = Transaction(id=id_one, amount=1.0, currency="TEST1", user_id="445", date=ts_one)
-        tx2 = Transaction(id=id_two, amount=2.0, currency="TEST1", user_id="435", date=ts_two)
-        tx3 = Transaction(id=id_three, amount=3.0, currency="TEST2", user_id="333", date=ts_three)
-        tx4 = Transaction(id=id_four, amount=4.0, currency="TEST2", user_id="333", date=ts_four)
+        tx1 = TransactionRequest(id=id_one, amount=1.0, currency="TEST1", user_id="445", date=ts_one)
+        tx2 = TransactionRequest(id=id_two, amount=2.0, currency="TEST1", user_id="435", date=ts_two)
+        tx3 = TransactionRequest(id=id_three, amount=3.0, currency="TEST2", user_id="333", date=ts_three)
+        tx4 = TransactionRequest(id=id_four, amount=4.0, currency="TEST2", user_id="333", date=ts_four)
         transactions = [tx1,tx2,tx3,tx4]
 
         expected = {
@@ -357,10 +609,10 @@ class TestRepository(TestCase):
         id_three = uuid4()
         id_four = uuid4()    
 
-        tx1 = Transaction(id=id_one, amount=1.0, currency="TEST1", user_id="445", date=ts_one)
-        tx2 = Transaction(id=id_two, amount=2.0, currency="TEST1", user_id="435", date=ts_two)
-        tx3 = Transaction(id=id_three, amount=3.0, currency="TEST2", user_id="333", date=ts_three)
-        tx4 = Transaction(id=id_four, amount=4.0, currency="TEST2", user_id="333", date=ts_four)
+        tx1 = TransactionRequest(id=id_one, amount=1.0, currency="TEST1", user_id="445", date=ts_one)
+        tx2 = TransactionRequest(id=id_two, amount=2.0, currency="TEST1", user_id="435", date=ts_two)
+        tx3 = TransactionRequest(id=id_three, amount=3.0, currency="TEST2", user_id="333", date=ts_three)
+        tx4 = TransactionRequest(id=id_four, amount=4.0, currency="TEST2", user_id="333", date=ts_four)
         transactions = [tx1,tx2,tx3,tx4]
 
         expected = {
@@ -387,10 +639,10 @@ class TestRepository(TestCase):
         id_three = uuid4()
         id_four = uuid4()    
 
-        tx1 = Transaction(id=id_one, amount=1.0, currency="TEST1", user_id="445", date=ts_one)
-        tx2 = Transaction(id=id_two, amount=2.0, currency="TEST1", user_id="435", date=ts_two)
-        tx3 = Transaction(id=id_three, amount=3.0, currency="TEST2", user_id="333", date=ts_three)
-        tx4 = Transaction(id=id_four, amount=4.0, currency="TEST2", user_id="333", date=ts_four)
+        tx1 = TransactionRequest(id=id_one, amount=1.0, currency="TEST1", user_id="445", date=ts_one)
+        tx2 = TransactionRequest(id=id_two, amount=2.0, currency="TEST1", user_id="435", date=ts_two)
+        tx3 = TransactionRequest(id=id_three, amount=3.0, currency="TEST2", user_id="333", date=ts_three)
+        tx4 = TransactionRequest(id=id_four, amount=4.0, currency="TEST2", user_id="333", date=ts_four)
         transactions = [tx1,tx2,tx3,tx4]
 
         expected = {
@@ -405,4 +657,130 @@ class TestRepository(TestCase):
         self.assertEqual(report_res["status"], Status.SUCCESS)
         self.assertDictEqual(report_res["results"], expected)
 
+    def create_report_transactions(self):
+        self.repository.create_transactions([
+            TransactionRequest(amount=Decimal(amount), currency=currency, user_id=user_id, date=datetime(2025, 5, day, 9, 0))
+            for currency, user_id, amount, day in [
+                ("TEST1", "1", "10.00", 5), ("TEST1", "2", "30.00", 5), ("TEST1", "3", "20.00", 6),
+                ("TEST2", "1", "50.00", 5), ("TEST2", "2", "1.00", 6), ("TEST1", "1", "1.00", 6)
+            ]
+        ])
+
+    def test_get_report_keeps_the_top_groups_of_each_level(self):
+        self.create_report_transactions()
+
+        report_res = self.repository.get_report(groups=["CURRENCY", "USER"], top=[None, 2])
+        self.assertEqual(report_res["status"], Status.SUCCESS)
+        self.assertEqual(report_res["results"], {"TEST1": {"2": Decimal("30.00"), "3": Decimal("20.00")}, "TEST2": {"1": Decimal("50.00"), "2": Decimal("1.00")}})
+        self.assertEqual(list(report_res["results"]), ["TEST1", "TEST2"])
+
+        self.assertEqual(self.repository.get_report(groups=["CURRENCY", "USER"], top=[1, 1])["results"], {"TEST1": {"2": Decimal("30.00")}})
+        self.assertEqual(self.repository.get_report(groups=["USER"], top=[1])["results"], {"1": Decimal("61.00")})
+
+    def test_get_report_applies_a_minimum_total(self):
+        self.create_report_transactions()
 
+        report_res = self.repository.get_report(groups=["DAY", "USER"], min_total=Decimal("25"))
+        self.assertEqual(report_res["results"], {"2025-05-05": {"1": Decimal("60.00"), "2": Decimal("30.00")}})
+        # a threshold past the precision of a float still excludes a total exactly below it
+        report_res = self.repository.get_report(groups=["DAY", "USER"], min_total=Decimal("30.000000000000001"))
+        self.assertEqual(report_res["results"], {"2025-05-05": {"1": Decimal("60.00")}})
+
+    def test_get_report_streams_flat_rows(self):
+        self.create_report_transactions()
+
+        report_res = self.repository.get_report(groups=["USER"], top=[1], stream=True)
+        self.assertEqual(report_res["status"], Status.SUCCESS)
+        self.assertEqual(sorted(list(report_res["results"]), key=lambda row: row["currency"]), [
+            {"user_id": "1", "currency": "TEST1", "total_amount": Decimal("11.00")},
+            {"user_id": "1", "currency": "TEST2", "total_amount": Decimal("50.00")}
+        ])
+
+    def test_get_report_groups_by_time_buckets(self):
+        self.create_report_transactions()
+        self.repository.create_transactions([
+            TransactionRequest(amount=Decimal("5.00"), currency="TEST1", user_id="1", date=datetime(2025, 5, 12, 10, 30)),
+            TransactionRequest(amount=Decimal("2.00"), currency="TEST1", user_id="1", date=datetime(2025, 4, 30, 23, 0))
+        ])
+
+        weeks = self.repository.get_report(groups=["WEEK", "CURRENCY"])
+        self.assertEqual(weeks["status"], Status.SUCCESS)
+        self.assertEqual(weeks["results"], {
+            "2025-04-28": {"TEST1": Decimal("2.00")},
+            "2025-05-05": {"TEST1": Decimal("61.00"), "TEST2": Decimal("51.00")},
+            "2025-05-12": {"TEST1": Decimal("5.00")}
+        })
+        self.assertEqual(self.repository.get_report(groups=["MONTH"])["results"], {"2025-04": Decimal("2.00"), "2025-05": Decimal("117.00")})
+        self.assertEqual(self.repository.get_report("2025-05-05", "2025-05-12", groups=["USER", "HOUR"], top=[1, None])["results"], {
+            "1": {"2025-05-05T09:00": Decimal("60.00"), "2025-05-06T09:00": Decimal("1.00"), "2025-05-12T10:00": Decimal("5.00")}
+        })
+
+    def test_get_report_rolling_windows(self):
+        self.create_report_transactions()
+        self.repository.create_transactions([
+            TransactionRequest(amount=Decimal("5.00"), currency="TEST1", user_id="1", date=datetime(2025, 5, 12, 10, 30))
+        ])
+
+        report_res = self.repository.get_report("2025-05-06", "2025-05-12", groups=["USER", "DAY"], rolling_days=2)
+        self.assertEqual(report_res["status"], Status.SUCCESS)
+        self.assertEqual(report_res["results"], {
+            "1": {
+                "2025-05-06": {"total_amount": Decimal("1.00"), "rolling_sum": Decimal("61.00"), "rolling_count": 3, "rolling_average": Decimal("20.33")},
+                "2025-05-12": {"total_amount": Decimal("5.00"), "rolling_sum": Decimal("5.00"), "rolling_count": 1, "rolling_average": Decimal("5.00")}
+            },
+            "2": {"2025-05-06": {"total_amount": Decimal("1.00"), "rolling_sum": Decimal("31.00"), "rolling_count": 2, "rolling_average": Decimal("15.50")}},
+            "3": {"2025-05-06": {"total_amount": Decimal("20.00"), "rolling_sum": Decimal("20.00"), "rolling_count": 1, "rolling_average": Decimal("20.00")}}
+        })
+
+        flat = self.repository.get_report("2025-05-06", "2025-05-06", groups=["DAY"], rolling_days=2, stream=True)["results"]
+        self.assertEqual(sorted(list(flat), key=lambda row: row["currency"]), [
+            {"date": "2025-05-06", "currency": "TEST1", "total_amount": Decimal("21.00"), "rolling_sum": Decimal("61.00"), "rolling_count": 4, "rolling_average": Decimal("15.25")},
+            {"date": "2025-05-06", "currency": "TEST2", "total_amount": Decimal("1.00"), "rolling_sum": Decimal("51.00"), "rolling_count": 2, "rolling_average": Decimal("25.50")}
+        ])
+        self.assertEqual(self.repository.get_report(groups=["USER"], rolling_days=7)["status"], Status.FAILURE)
+
+    def load_rates(self, lines):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as file:
+            file.write("day,base,quote,rate\n" + "\n".join(lines) + "\n")
+        self.addCleanup(os.remove, file.name)
+        def delete_rates():
+            with Session(engine) as session:
+                session.exec(delete(FxRate))
+                session.commit()
+        self.addCleanup(delete_rates)
+        self.assertEqual(self.repository.load_fx_rates(file.name)["status"], Status.SUCCESS)
+
+    def test_get_report_converted_to_one_currency(self):
+        self.repository.register_currency(Currency(currency="TEST3", country="Japan", exponent=0))
+        self.load_rates(["2025-05-05,TEST2,TEST1,0.5", "2025-05-04,TEST1,TEST3,100", "2025-05-05,TEST2,TEST3,50"])
+        self.repository.create_transactions([
+            TransactionRequest(amount=Decimal("10.00"), currency="TEST1", user_id="445", date=datetime(2025, 5, 5, 9, 0)),
+            TransactionRequest(amount=Decimal("4.00"), currency="TEST2", user_id="445", date=datetime(2025, 5, 5, 10, 0)),
+            TransactionRequest(amount=Decimal("150"), currency="TEST3", user_id="435", date=datetime(2025, 5, 6, 9, 0))
+        ])
+
+        report_res = self.repository.get_report(groups=["DAY"], currency="TEST1")
+        self.assertEqual(report_res["status"], Status.SUCCESS)
+        # TEST3 has no rate on the 6th and converts at the inverted rate of the 4th
+        self.assertDictEqual(report_res["results"], {"2025-05-05": Decimal("12.00"), "2025-05-06": Decimal("1.50")})
+        self.assertEqual(self.repository.get_report(groups=["USER"], currency="TEST3")["results"], {"445": Decimal("1200"), "435": Decimal("150")})
+        self.assertEqual(self.repository.fetch_converted_total("TEST1")["amount"], Decimal("13.50"))
+
+    def test_get_report_converts_each_uncovered_day_at_its_own_latest_rate(self):
+        self.load_rates(["2025-05-01,TEST2,TEST1,1.0", "2025-05-03,TEST2,TEST1,2.0"])
+        self.repository.create_transactions([
+            TransactionRequest(amount=Decimal("10.00"), currency="TEST2", user_id="445", date=datetime(2025, 5, 2, 9, 0)),
+            TransactionRequest(amount=Decimal("10.00"), currency="TEST2", user_id="445", date=datetime(2025, 5, 4, 9, 0))
+        ])
+
+        self.assertEqual(self.repository.get_report(groups=["DAY"], currency="TEST1")["results"], {"2025-05-02": Decimal("10.00"), "2025-05-04": Decimal("20.00")})
+        self.assertEqual(self.repository.get_report(groups=["USER"], currency="TEST1")["results"], {"445": Decimal("30.00")})
+        self.assertEqual(self.repository.get_report(groups=["MONTH"], currency="TEST1")["results"], {"2025-05": Decimal("30.00")})
+
+    def test_get_report_without_a_rate_fails(self):
+        self.load_rates(["2025-05-05,TEST2,TEST1,0.5"])
+        self.repository.create_transactions([TransactionRequest(amount=Decimal("4.00"), currency="TEST2", user_id="445", date=datetime(2025, 5, 4, 9, 0))])
+
+        report_res = self.repository.get_report(groups=["DAY"], currency="TEST1")
+        self.assertEqual(report_res["status"], Status.FAILURE)
+        self.assertIn("no fx rate from TEST2 to TEST1", report_res["message"])
@@ -1,15 +1,31 @@
-from pydantic import BaseModel
-from datetime import datetime
+from pydantic import BaseModel, Field
+from datetime import date, datetime
+from decimal import Decimal
 from uuid import UUID
 
 class TransactionRequest(BaseModel):
     id: UUID | None = None
-    amount: float
+    amount: Decimal
     currency: str
     user_id: str
-    date: datetime = datetime.now()
+    date: datetime = Field(default_factory=datetime.now)
 
 class CurrencyRequest(BaseModel):
     id: UUID | None = None
     currency: str
     country: str
+    exponent: int = Field(default=2, ge=0, le=6)
+
+class DeleteTransactionsRequest(BaseModel):
+    ids: list[UUID] | None = Field(default=None, max_length=10000)
+    user_id: str | None = None
+    from_date: date | None = None
+    to_date: date | None = None
+
+class TransactionResponse(BaseModel):
+    id: UUID
+    amount: Decimal
+    currency: str
+    user_id: str
+    date: datetime
+    deleted: bool = False
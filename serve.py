@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import os
+import threading
+import time
+from importlib.util import find_spec
+
+# production entry point: migrates the schema once, then runs the app in several worker processes that share
+# nothing but the listening socket. the app is only imported inside the workers, this process stays light.
+# as the workers share no memory, anything a worker keeps in memory only follows the writes that worker handles:
+# - the read cache is turned off with more than one worker unless CACHE_TTL_SECONDS is set, which accepts reads
+#   up to that many seconds stale on the other workers
+# - COLUMNAR_ANALYTICS is refused with more than one worker unless COLUMNAR_SYNC_SECONDS > 0, the other workers
+#   see a write once their next reload has run
+# FX_RATES_FILE is loaded by the migrate step, partition maintenance and compaction run on a thread of this
+# process (or as their own --maintain-only job), so none of them is repeated by every worker
+
+def worker_count():
+    return int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+
+def event_loop():
+    return "uvloop" if find_spec("uvloop") else "asyncio"
+
+def http_protocol():
+    return "httptools" if find_spec("httptools") else "h11"
+
+def check_workers(parser, workers: int):
+    if workers <= 1:
+        return
+    from columnar import columnar_enabled, sync_seconds
+    if columnar_enabled() and sync_seconds() <= 0:
+        parser.error("COLUMNAR_ANALYTICS with more than one worker needs COLUMNAR_SYNC_SECONDS > 0, otherwise each worker answers from a store that never sees the other workers' writes")
+    if "CACHE_TTL_SECONDS" not in os.environ:
+        os.environ["CACHE_TTL_SECONDS"] = "0"
+        print(f"read cache off with {workers} workers so every worker sees every write, set CACHE_TTL_SECONDS to allow stale reads")
+
+def start_maintenance():
+    from db_config import maintain, maintenance_configured
+    if maintenance_configured():
+        threading.Thread(target=lambda: asyncio.run(maintain()), name="maintenance", daemon=True).start()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate the schema once and serve the API from several worker processes.")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=worker_count())
+    parser.add_argument("--db-url", default=None)
+    parser.add_argument("--skip-migrate", action="store_true", help="leave the schema alone, for deploys that run --migrate-only as a separate step")
+    parser.add_argument("--migrate-only", action="store_true", help="create or update the schema, load FX_RATES_FILE and exit")
+    parser.add_argument("--skip-maintenance", action="store_true", help="leave partitions and compaction alone, for deploys that run --maintain-only as a separate job")
+    parser.add_argument("--maintain-only", action="store_true", help="run partition maintenance and compaction in the foreground without serving, against a migrated schema")
+    parser.add_argument("--graceful-timeout", type=int, default=30, help="seconds a worker gets to finish in-flight requests on shutdown")
+    args = parser.parse_args(argv)
+    if args.db_url:
+        os.environ["DATABASE_URL"] = args.db_url
+    if not args.migrate_only and not args.maintain_only:
+        check_workers(parser, args.workers)
+
+    started = time.perf_counter()
+    if not args.skip_migrate and not args.maintain_only:
+        from db_config import migrate
+        asyncio.run(migrate(fx_rates_file=os.environ.get("FX_RATES_FILE")))
+        print(f"schema migrated in {time.perf_counter() - started:.2f}s")
+    if args.migrate_only:
+        return
+    from db_config import maintain
+    if args.maintain_only:
+        asyncio.run(maintain())
+        return
+
+    # workers inherit the environment, with the schema and rates in place and maintenance running here none of
+    # them repeats that work
+    os.environ["AUTO_MIGRATE"] = "false"
+    os.environ["AUTO_MAINTAIN"] = "false"
+    os.environ.pop("FX_RATES_FILE", None)
+    if not args.skip_maintenance:
+        start_maintenance()
+    import uvicorn
+    loop, http = event_loop(), http_protocol()
+    print(f"starting {args.workers} workers on {args.host}:{args.port} with {loop} and {http}, poll /ready for each worker's startup time")
+    uvicorn.run(
+        "app:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=loop,
+        http=http,
+        timeout_graceful_shutdown=args.graceful_timeout
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import AsyncMock, patch
+from sqlalchemy import create_engine, inspect, text
+import serve
+
+class TestServe(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.url = f"sqlite:///{self.directory.name}/serve.db"
+
+    def test_migrates_once_before_starting_workers(self):
+        with patch.dict(os.environ, {}), patch("uvicorn.run") as run:
+            serve.main(["--workers", "4", "--port", "9000", "--db-url", self.url])
+            self.assertEqual(os.environ["AUTO_MIGRATE"], "false")
+
+        self.assertIn("transaction", inspect(create_engine(self.url)).get_table_names())
+        run.assert_called_once()
+        self.assertEqual(run.call_args.args, ("app:app",))
+        self.assertEqual(run.call_args.kwargs["workers"], 4)
+        self.assertEqual(run.call_args.kwargs["port"], 9000)
+        self.assertEqual(run.call_args.kwargs["loop"], serve.event_loop())
+
+    def test_migrate_only_and_skip_migrate(self):
+        with patch.dict(os.environ, {}), patch("uvicorn.run") as run:
+            serve.main(["--migrate-only", "--db-url", self.url])
+            run.assert_not_called()
+            self.assertIn("transaction", inspect(create_engine(self.url)).get_table_names())
+
+        other = f"sqlite:///{self.directory.name}/other.db"
+        with patch.dict(os.environ, {}), patch("uvicorn.run") as run:
+            serve.main(["--skip-migrate", "--db-url", other])
+            run.assert_called_once()
+        self.assertEqual(inspect(create_engine(other)).get_table_names(), [])
+
+    def test_several_workers_turn_the_read_cache_off(self):
+        with patch.dict(os.environ, {}), patch("uvicorn.run"):
+            serve.main(["--workers", "2", "--skip-migrate", "--db-url", self.url])
+            self.assertEqual(os.environ["CACHE_TTL_SECONDS"], "0")
+        with patch.dict(os.environ, {"CACHE_TTL_SECONDS": "5"}), patch("uvicorn.run"):
+            serve.main(["--workers", "2", "--skip-migrate", "--db-url", self.url])
+            self.assertEqual(os.environ["CACHE_TTL_SECONDS"], "5")
+        with patch.dict(os.environ, {}), patch("uvicorn.run"):
+            serve.main(["--workers", "1", "--skip-migrate", "--db-url", self.url])
+            self.assertNotIn("CACHE_TTL_SECONDS", os.environ)
+
+    def test_refuses_a_columnar_store_per_worker_that_never_reloads(self):
+        with patch.dict(os.environ, {"COLUMNAR_ANALYTICS": "true"}), patch("uvicorn.run") as run, patch("sys.stderr"):
+            with self.assertRaises(SystemExit):
+                serve.main(["--workers", "2", "--skip-migrate", "--db-url", self.url])
+            run.assert_not_called()
+        with patch.dict(os.environ, {"COLUMNAR_ANALYTICS": "true", "COLUMNAR_SYNC_SECONDS": "60"}), patch("uvicorn.run") as run:
+            serve.main(["--workers", "2", "--skip-migrate", "--db-url", self.url])
+            run.assert_called_once()
+
+    def test_migrate_step_loads_fx_rates_and_workers_skip_them(self):
+        path = f"{self.directory.name}/rates.csv"
+        with open(path, "w") as file:
+            file.write("day,base,quote,rate\n2024-01-01,EUR,USD,1.1\n")
+        with patch.dict(os.environ, {"FX_RATES_FILE": path}), patch("uvicorn.run"):
+            serve.main(["--workers", "1", "--db-url", self.url])
+            self.assertNotIn("FX_RATES_FILE", os.environ)
+
+        with create_engine(self.url).connect() as connection:
+            self.assertEqual(connection.execute(text("select count(*) from fx_rate")).scalar(), 2)
+
+    def test_maintenance_runs_once_outside_the_workers(self):
+        with patch.dict(os.environ, {}), patch("uvicorn.run"), patch("serve.start_maintenance") as start:
+            serve.main(["--workers", "2", "--db-url", self.url])
+            self.assertEqual(os.environ["AUTO_MAINTAIN"], "false")
+        start.assert_called_once()
+
+        with patch.dict(os.environ, {}), patch("uvicorn.run"), patch("serve.start_maintenance") as start:
+            serve.main(["--workers", "2", "--skip-maintenance", "--db-url", self.url])
+        start.assert_not_called()
+
+        with patch.dict(os.environ, {}), patch("uvicorn.run") as run, patch("db_config.maintain", new_callable=AsyncMock) as maintain:
+            serve.main(["--maintain-only", "--skip-migrate", "--db-url", self.url])
+        maintain.assert_awaited_once()
+        run.assert_not_called()
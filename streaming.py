@@ -0,0 +1,39 @@
+from typing import Literal
+from fastapi.responses import StreamingResponse
+from encoding import dumps
+
+ROWS_PER_CHUNK = 500
+StreamFormat = Literal["json", "ndjson"]
+
+def model_json(item) -> str:
+    return item.model_dump_json()
+
+def row_json(row: dict) -> str:
+    return dumps(row).decode()
+
+async def ndjson(transactions, encode=model_json):
+    chunk = []
+    async for transaction in transactions:
+        chunk.append(encode(transaction))
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield ("\n".join(chunk) + "\n").encode()
+            chunk = []
+    if chunk:
+        yield ("\n".join(chunk) + "\n").encode()
+
+async def json_array(transactions, key: str = "transactions", encode=model_json):
+    yield f'{{"{key}":['.encode()
+    chunk, separator = [], ""
+    async for transaction in transactions:
+        chunk.append(encode(transaction))
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield (separator + ",".join(chunk)).encode()
+            chunk, separator = [], ","
+    if chunk:
+        yield (separator + ",".join(chunk)).encode()
+    yield b"]}"
+
+def streaming_response(transactions, format: StreamFormat, key: str = "transactions", encode=model_json):
+    if format == "ndjson":
+        return StreamingResponse(ndjson(transactions, encode), media_type="application/x-ndjson")
+    return StreamingResponse(json_array(transactions, key, encode), media_type="application/json")
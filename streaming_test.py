@@ -0,0 +1,37 @@
+import json
+from datetime import datetime
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+from uuid import uuid4
+import streaming
+from streaming import ndjson, json_array
+from decimal import Decimal
+from requests import TransactionResponse
+
+async def rows(transactions):
+    for transaction in transactions:
+        yield transaction
+
+async def body(chunks):
+    return b"".join([chunk async for chunk in chunks])
+
+class TestStreaming(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.transactions = [
+            TransactionResponse(id=uuid4(), amount=Decimal(i).quantize(Decimal("0.01")), currency="TEST1", user_id="123", date=datetime(2025, 5, 5, 9, 0))
+            for i in range(5)
+        ]
+
+    async def test_json_array_is_valid_json_across_chunks(self):
+        with patch.object(streaming, "ROWS_PER_CHUNK", 2):
+            decoded = json.loads(await body(json_array(rows(self.transactions))))
+
+        self.assertEqual(len(decoded["transactions"]), 5)
+        self.assertEqual(decoded["transactions"][0]["id"], str(self.transactions[0].id))
+
+    async def test_json_array_of_no_rows(self):
+        self.assertEqual(json.loads(await body(json_array(rows([])))), {"transactions": []})
+
+    async def test_ndjson_emits_one_line_per_row(self):
+        lines = (await body(ndjson(rows(self.transactions)))).decode().splitlines()
+        self.assertEqual([json.loads(line)["amount"] for line in lines], ["0.00", "1.00", "2.00", "3.00", "4.00"])
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import os
+import time
+from uuid import uuid4
+from repository import Status
+
+MAX_RETRY_SECONDS = 5.0
+log = logging.getLogger("write_behind")
+
+def write_behind_enabled():
+    return os.environ.get("WRITE_BEHIND", "").lower() in ("1", "true", "yes")
+
+class QueueFull(Exception):
+    pass
+
+class QueueClosed(Exception):
+    pass
+
+class WriteBehindQueue:
+    # accepted transactions wait here and are committed together, one bulk insert per batch_rows rows
+    # or per flush_ms milliseconds, whichever comes first
+    def __init__(self, repository, max_rows: int = 10000, batch_rows: int = 500, flush_ms: float = 20, retries: int = 5, retry_ms: float = 100):
+        self.repository = repository
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_ms / 1000
+        self.retries = retries
+        self.retry_seconds = retry_ms / 1000
+        self.queue = asyncio.Queue(maxsize=max_rows)
+        self.closed = False
+        self.runner = None
+        self.batches = 0
+        self.committed = 0
+        self.rejected = 0
+        self.refused = 0
+        self.retried_batches = 0
+        self.failed_batches = 0
+        self.last_flush_ms = 0.0
+
+    @classmethod
+    def from_environment(cls, repository):
+        return cls(
+            repository,
+            max_rows=int(os.environ.get("WRITE_BEHIND_MAX_ROWS", 10000)),
+            batch_rows=int(os.environ.get("WRITE_BEHIND_BATCH_ROWS", 500)),
+            flush_ms=float(os.environ.get("WRITE_BEHIND_FLUSH_MS", 20)),
+            retries=int(os.environ.get("WRITE_BEHIND_RETRIES", 5)),
+            retry_ms=float(os.environ.get("WRITE_BEHIND_RETRY_MS", 100))
+        )
+
+    def start(self):
+        self.runner = asyncio.create_task(self.run())
+        return self.runner
+
+    def submit(self, transaction):
+        # returns a future that resolves once the batch holding the transaction is committed
+        if self.closed:
+            raise QueueClosed("the write-behind queue is draining")
+        if transaction.id is None:
+            transaction.id = uuid4()
+        committed = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((transaction, committed))
+        except asyncio.QueueFull:
+            self.refused += 1
+            raise QueueFull(f"the write-behind queue holds {self.queue.maxsize} transactions, retry later")
+        return committed
+
+    async def run(self):
+        while True:
+            batch = [await self.queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_rows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.flush(batch)
+
+    async def flush(self, batch):
+        started = time.perf_counter()
+        transactions = [transaction for transaction, _ in batch]
+        try:
+            response = await self.commit(transactions)
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+        self.batches += 1
+
+        if response["status"] == Status.FAILURE:
+            # these were already answered 202, so every dropped id is logged for replay
+            self.failed_batches += 1
+            self.rejected += len(batch)
+            log.error(
+                "write-behind dropped %d accepted transactions after %d attempts, %s: %s",
+                len(batch), self.retries + 1, response["message"], " ".join(str(transaction.id) for transaction in transactions)
+            )
+            outcomes = [response] * len(batch)
+        else:
+            rejects = dict(response["rejects"])
+            self.rejected += len(rejects)
+            if rejects:
+                log.error(
+                    "write-behind rejected %d accepted transactions: %s",
+                    len(rejects), " ".join(f"{transactions[index].id} ({message})" for index, message in rejects.items())
+                )
+            self.committed += response["inserted"]
+            # a duplicate was already committed by an earlier attempt, which is a success for the caller
+            outcomes = [
+                {"status": Status.FAILURE, "message": rejects[index]} if index in rejects else {"status": Status.SUCCESS, "result": result}
+                for index, result in enumerate(response["results"])
+            ]
+        for (_, committed), outcome in zip(batch, outcomes):
+            if not committed.done():
+                committed.set_result(outcome)
+
+    async def commit(self, transactions):
+        # a failed batch is retried whole with backoff while new work backs up into the queue, inserts are
+        # idempotent on the id so rows an earlier attempt did commit come back as duplicates
+        delay = self.retry_seconds
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.repository.bulk_create_transactions(transactions)
+            except Exception as e:
+                response = {"status": Status.FAILURE, "message": f"write-behind flush failed due to {e}"}
+            if response["status"] == Status.SUCCESS or attempt == self.retries:
+                return response
+            self.retried_batches += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_SECONDS)
+
+    async def drain(self):
+        # refuse new work, commit everything already accepted, then stop the flusher
+        self.closed = True
+        if self.runner is None:
+            self.start()
+        await self.queue.join()
+        self.runner.cancel()
+        try:
+            await self.runner
+        except asyncio.CancelledError:
+            pass
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "max_rows": self.queue.maxsize,
+            "batch_rows": self.batch_rows,
+            "flush_ms": self.flush_seconds * 1000,
+            "batches": self.batches,
+            "committed": self.committed,
+            "rejected": self.rejected,
+            "refused": self.refused,
+            "retried_batches": self.retried_batches,
+            "failed_batches": self.failed_batches,
+            "last_flush_ms": self.last_flush_ms,
+            "closed": self.closed
+        }
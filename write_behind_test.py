@@ -0,0 +1,106 @@
+import asyncio
+from decimal import Decimal
+from unittest import IsolatedAsyncioTestCase
+from repository import Status
+from requests import TransactionRequest
+from write_behind import QueueClosed, QueueFull, WriteBehindQueue
+
+class FakeRepository:
+    def __init__(self):
+        self.batches = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.failures = 0
+
+    async def bulk_create_transactions(self, transactions):
+        await self.gate.wait()
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database is down")
+        self.batches.append(list(transactions))
+        rejects = [(i, f"invalid currency {tx.currency}") for i, tx in enumerate(transactions) if tx.currency == "INVALID"]
+        results = ["rejected" if tx.currency == "INVALID" else "inserted" for tx in transactions]
+        return {"status": Status.SUCCESS, "inserted": len(transactions) - len(rejects), "duplicates": 0, "rejects": rejects, "results": results}
+
+def transaction(currency="TEST1"):
+    return TransactionRequest(amount=Decimal("1.00"), currency=currency, user_id="1")
+
+class TestWriteBehindQueue(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.repository = FakeRepository()
+        self.queue = WriteBehindQueue(self.repository, max_rows=10, batch_rows=3, flush_ms=10, retries=2, retry_ms=1)
+
+    async def asyncTearDown(self):
+        self.repository.gate.set()
+        await self.queue.drain()
+
+    async def test_commits_in_groups_of_batch_rows(self):
+        futures = [self.queue.submit(transaction()) for _ in range(7)]
+        self.queue.start()
+        results = await asyncio.gather(*futures)
+
+        self.assertEqual([len(batch) for batch in self.repository.batches], [3, 3, 1])
+        self.assertTrue(all(result["status"] == Status.SUCCESS for result in results))
+        self.assertEqual(self.queue.stats()["committed"], 7)
+
+    async def test_assigns_ids_and_reports_rejected_rows(self):
+        self.queue.start()
+        accepted, rejected = transaction(), transaction("INVALID")
+        results = await asyncio.gather(self.queue.submit(accepted), self.queue.submit(rejected))
+
+        self.assertIsNotNone(accepted.id)
+        self.assertEqual(results[0], {"status": Status.SUCCESS, "result": "inserted"})
+        self.assertEqual(results[1], {"status": Status.FAILURE, "message": "invalid currency INVALID"})
+
+    async def test_retries_failed_batches(self):
+        self.repository.failures = 2
+        self.queue.start()
+        result = await self.queue.submit(transaction())
+
+        self.assertEqual(result, {"status": Status.SUCCESS, "result": "inserted"})
+        self.assertEqual(self.queue.stats()["retried_batches"], 2)
+        self.assertEqual(self.queue.stats()["failed_batches"], 0)
+
+    async def test_logs_the_ids_of_dropped_transactions(self):
+        self.repository.failures = 3
+        self.queue.start()
+        dropped = transaction()
+        with self.assertLogs("write_behind") as logs:
+            result = await self.queue.submit(dropped)
+
+        self.assertEqual(result["status"], Status.FAILURE)
+        self.assertIn("after 3 attempts", logs.output[0])
+        self.assertIn(str(dropped.id), logs.output[0])
+        self.assertEqual(self.queue.stats()["failed_batches"], 1)
+
+    async def test_logs_the_ids_of_rejected_rows(self):
+        self.queue.start()
+        rejected = transaction("INVALID")
+        with self.assertLogs("write_behind") as logs:
+            await asyncio.gather(self.queue.submit(transaction()), self.queue.submit(rejected))
+
+        self.assertIn(f"{rejected.id} (invalid currency INVALID)", logs.output[0])
+        self.assertEqual(self.queue.stats()["rejected"], 1)
+
+    async def test_refuses_work_when_full(self):
+        for _ in range(10):
+            self.queue.submit(transaction())
+        with self.assertRaises(QueueFull):
+            self.queue.submit(transaction())
+        self.assertEqual(self.queue.stats()["refused"], 1)
+
+    async def test_drain_commits_accepted_rows_and_refuses_new_ones(self):
+        self.repository.gate.clear()
+        self.queue.start()
+        futures = [self.queue.submit(transaction()) for _ in range(5)]
+        drained = asyncio.create_task(self.queue.drain())
+        await asyncio.sleep(0.05)
+
+        with self.assertRaises(QueueClosed):
+            self.queue.submit(transaction())
+        self.assertFalse(drained.done())
+        self.repository.gate.set()
+        await drained
+
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertEqual(sum(len(batch) for batch in self.repository.batches), 5)